@@ -1,24 +1,17 @@
 from kstat_interface.backend_apps.drivers.tb6612_motor_driver import TB6612
 from time import sleep, time
-import kstat_interface.backend_apps.drivers.KStat_0_1_driver as KStat
-from serial import Serial
-from sched import scheduler
-from multiprocessing import Process
 from redisworks import Root
-from ast import literal_eval
+from copy import deepcopy
 from kstat_interface.dash_apps.app import write_config
-from kstat_interface.backend_apps.hg_au_electrode_plating import hg_au_electrode_plating
-from kstat_interface.backend_apps.hg_au_electrode_testing import hg_au_electrode_testing
-from kstat_interface.backend_apps.single_cv import single_cv
-from kstat_interface.backend_apps.single_dpv import single_dpv
-from kstat_interface.backend_apps.single_lsv import single_lsv
-from kstat_interface.backend_apps.single_swv import single_swv
+from kstat_interface.config_store import read_changes, update_config_dict, ConfigListener
+from kstat_interface.backend_apps.worker import MeasurementWorker
+from kstat_interface.job_queue import requeue_running
 from kstat_interface import redis_config
 import RPi.GPIO as GPIO
-from multiprocessing import Process
+import os
 
-# Serial address of KStat at specific USB port
-KStat_path = '/dev/serial/by-path/platform-3f980000.usb-usb-0:1.5:1.0'
+# Serial address of KStat at specific USB port, KSTAT_PATH can point to a virtual KStat instead
+KStat_path = os.environ.get('KSTAT_PATH', '/dev/serial/by-path/platform-3f980000.usb-usb-0:1.5:1.0')
 
 # set control components to be enabled/disabled correctly in case program exited incorrectly before
 def initialize_components():
@@ -26,6 +19,7 @@ def initialize_components():
                   {'component':'stirr_switch','attribute':'disabled','value':False},
                   {'component':'start_button','attribute':'disabled','value':False},
                   {'component':'stop_button','attribute':'disabled','value':True},
+                  {'component':'job_queue_button','attribute':'disabled','value':False},
                   ])
 
 # start redisworks server and store initial config
@@ -40,18 +34,14 @@ def initialize_motor():
     motor = TB6612()
     motor.standby(False)
 
-# set up KStat potentiostat
-def initialize_KStat():
-    global ser
-    ser = Serial(KStat_path, 9600, timeout = 1)
-    ADSbuffer = 1
-    sample_rate = "1KHz"
-    PGA_gain = 2
-    iv_gain = "POT_GAIN_300K"
-    KStat.abort(ser)
-    KStat.setupADC(ser, ADSbuffer, sample_rate, PGA_gain)
-    KStat.setGain(ser, iv_gain)
-    KStat.idle(ser,0)
+# start measurement worker, it sets up and owns the connection to the KStat potentiostat
+worker = None
+def initialize_worker():
+    global worker
+    if worker is not None:
+        worker.stop()
+    worker = MeasurementWorker(KStat_path, motor)
+    worker.start()
 
 stored_stamp = ''
 if __name__ == '__main__':
@@ -59,18 +49,21 @@ if __name__ == '__main__':
         try:
             initialize_redis()
             initialize_motor()
-            initialize_KStat()
+            initialize_worker()
             initialize_components()
-            updated_timestamp=str(time())
-            # main loop: check for updates on root server and execute commands from front end
+            # a queued job interrupted by a restart is run again when the queue is started
+            requeue_running(root.red)
+            # the config is loaded completely in the first loop, afterwards only the changed fields are read
+            listener = ConfigListener(root.red)
+            applied_change, config = None, {}
+            # main loop: wait for updates on root server and execute commands from front end
             while True:
                 try:
-                    root.flush()
-                    updates_timestamp = str(root.update_timestamp)
-                    if updates_timestamp != updated_timestamp:
+                    change, changes = read_changes(root.red, applied_change)
+                    if change != applied_change:
                         
-                        updated_timestamp = updates_timestamp
-                        config = literal_eval(str(root.config))
+                        applied_change = change
+                        update_config_dict(config, changes)
                         
                         if config['purge_switch']['on']:
                             motor.activate('A')
@@ -86,40 +79,43 @@ if __name__ == '__main__':
                             write_config([{'component':'start_button','attribute':'triggered','value':False},
                                             {'component':'stop_button','attribute':'disabled','value':False},
                                             {'component':'start_button','attribute':'disabled','value':True}])
-                            measurement_config=config 
                             
-                            # find which program was selected and execute the corresponding script
-                            if config['program_selection']['value'] == 'hg_au_electrode_plating':
-                                measurement = Process(target=hg_au_electrode_plating,args=(measurement_config,motor,ser))
-                            elif config['program_selection']['value'] == 'hg_au_electrode_testing':
-                                measurement = Process(target=hg_au_electrode_testing,args=(measurement_config,motor,ser))
-                            elif config['program_selection']['value'] == 'single_cv':
-                                measurement = Process(target=single_cv,args=(measurement_config,motor,ser))
-                            elif config['program_selection']['value'] == 'single_dpv':
-                                measurement = Process(target=single_dpv,args=(measurement_config,motor,ser))
-                            elif config['program_selection']['value'] == 'single_lsv':
-                                measurement = Process(target=single_lsv,args=(measurement_config,motor,ser))
-                            elif config['program_selection']['value'] == 'single_swv':
-                                measurement = Process(target=single_swv,args=(measurement_config,motor,ser))
-                                
-                            measurement.start()
+                            # the selected program is executed by the measurement worker
+                            worker.submit(config['program_selection']['value'], deepcopy(config))
+                            
+                        if config['job_queue_button']['triggered']:
+                            print('start job queue')
+                            write_config([{'component':'job_queue_button','attribute':'triggered','value':False},
+                                            {'component':'job_queue_button','attribute':'disabled','value':True},
+                                            {'component':'stop_button','attribute':'disabled','value':False},
+                                            {'component':'start_button','attribute':'disabled','value':True}])
+                            
+                            # the worker runs the queued jobs back to back until the queue is empty or stopped
+                            worker.submit_queue()
                             
                         if config['stop_button']['triggered']:
+                            # the worker aborts the measurement, saves the data received so far
+                            # and restores purging/stirring and user controls
                             print('stop', config['program_selection']['value'])
-                            write_config([{'component':'purge_switch','attribute':'on','value':measurement_config['purge_switch']['on']},
-                                            {'component':'purge_switch','attribute':'disabled','value':False},
-                                            {'component':'stirr_switch','attribute':'on','value':measurement_config['stirr_switch']['on']},
-                                            {'component':'stirr_switch','attribute':'disabled','value':False},
-                                            {'component':'start_button','attribute':'disabled','value':False},
-                                            {'component':'stop_button','attribute':'disabled','value':True},
-                                            {'component':'stop_button','attribute':'triggered','value':False},
-                                            {'component':'scan_progress_label','attribute':'children','value':'Cancelled'}])
-                            measurement.terminate()
-                            KStat.abort(ser)
-                            KStat.idle(ser,0)
+                            write_config([{'component':'stop_button','attribute':'disabled','value':True},
+                                            {'component':'stop_button','attribute':'triggered','value':False}])
+                            worker.cancel()
+                    
+                    for program, result in worker.reports():
+                        print(program, result)
+                    
+                    # the worker ends if the KStat couldn't be initialized, it is started again
+                    # and the controls are enabled (jobs submitted in the meantime are dropped)
+                    if not worker.process.is_alive():
+                        print('Measurement worker stopped, restarting')
+                        sleep(1)
+                        initialize_worker()
+                        initialize_components()
                             
                 except Exception as e:
                     print(e)
+                # block until the next change is notified, the timeout catches missed notifications
+                listener.wait(1)
         except Exception as e:
             print(e)
             sleep(1)
\ No newline at end of file
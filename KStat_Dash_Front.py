@@ -21,6 +21,10 @@ import json
 import kstat_interface.dash_apps.main_app as main_app
 from kstat_interface.dash_apps.app import app
 from kstat_interface import redis_config
+from kstat_interface import config_store
+from kstat_interface import scan_catalog, directory_index
+from kstat_interface.dash_apps.file_management import push_scan_options
+from kstat_interface.status import status_fields
 from subprocess import call
 from socket import gethostname
 import pathlib
@@ -68,6 +72,11 @@ def initialize_directories():
     except:
         print('initialize working directory')
         root.working_directory = root.data_directory
+    # index scans added, changed or removed while the interface wasn't running
+    indexed, removed = scan_catalog.rebuild(str(root.data_directory))
+    print('Scan catalog: {} scans indexed, {} removed'.format(indexed, removed))
+    # keep the directory listings up to date while the interface is running
+    directory_index.start(str(root.data_directory), push_scan_options)
     
 def clearDirectory(dir):
     for filename in os.listdir(dir):
@@ -90,10 +99,6 @@ dark_theme={
 initial_config={
     'purge_switch':{'on':False,'disabled':False},
     'stirr_switch':{'on':False,'disabled':False},
-    'scan_progress':{'value':0},
-    'scan_progress_label':{'children':''},
-    'series_progress':{'value':70},
-    'series_progress_label':{'children':''},
     'stirr_speed_slider':{'value':1000},
     'cleaning_potential_input':{'value':-900},
     'deposition_potential_input':{'value':-100},
@@ -119,9 +124,16 @@ initial_config={
     'plating_time_input':{'value':180},
     'comment_input':{'value':''},
     'n_electrode_tests_input':{'value':20},
+    'electrode_test_tolerance_input':{'value':0},
+    'n_additions_input':{'value':3},
+    'addition_concentration_input':{'value':1},
+    'addition_prompt':{'is_open':False},
+    'addition_prompt_message':{'children':''},
+    'addition_continue_button':{'triggered':False},
     'start_button':{'disabled':False,'triggered':False},
     'stop_button':{'disabled':True,'triggered':False},
     'popup_measurement_id':{'value':''},
+    'job_queue_button':{'disabled':False,'triggered':False},
     'upload_button':{'disabled':False},
     'download_button':{'disabled':False},
     'change_directory_button':{'disabled':False},
@@ -135,33 +147,29 @@ initial_config={
     'baseline_polynomial_input':{'value':4},
     'peak_width_input':{'value':20},
     'scan_selector':{'options':[],'value':''},
+    'batch_analysis_button':{'disabled':False},
+    'batch_analysis_result':{'children':''},
+    'batch_analysis_download':{'href':'','children':''},
     }
 
 def initialize_config():
-    
+    # config stored as a single dictionary by previous versions is migrated to the config store
+    old_config = None
     try:
-        config=literal_eval(str(root.config))
-        purge_switch = config['start_button']
+        root.flush()
+        old_config=literal_eval(str(root.config))
     except Exception as e:
-        print('initializing config', e)
-        root.config = initial_config
-    for component in initial_config.keys():
-        try:
-            root_config_component = root.config[component]
-            for parameter in initial_config[component].keys():
-                try:
-                    root_config_component_parameter = root.config[component][parameter]
-                except:
-                    config=literal_eval(str(root.config))
-                    config[component][parameter] = initial_config[component][parameter]
-                    root.config=config
-                    print('initializing', component, parameter)
-        except:
-            config=literal_eval(str(root.config))
-            config[component]=initial_config[component]
-            root.config=config
-            print('initializing', component)
-    root.flush()
+        pass
+    config_store.initialize_config(root.red, initial_config, old_config)
+    if old_config is not None:
+        root.red.delete('root.config')
+    # progress bars were part of the config in previous versions, now they use the status channel
+    root.red.delete(*[config_store.key_prefix + component for component in status_fields])
+    # batch analyses don't continue after a restart and the user downloads are removed
+    config_store.write_config(root.red, [{'component':'batch_analysis_button','attribute':'disabled','value':False},
+                                         {'component':'batch_analysis_result','attribute':'children','value':''},
+                                         {'component':'batch_analysis_download','attribute':'href','value':''},
+                                         {'component':'batch_analysis_download','attribute':'children','value':''}])
     
 def setup_layout():
     return html.Div(
@@ -223,7 +231,8 @@ if __name__ == '__main__':
             initialize_config()
 
             app.layout = setup_layout()
-            app.run_server(debug=False, host='{}.local'.format(gethostname()), port=8080)
+            # every browser keeps a request open for the pushed changes (see dash_apps/push.py)
+            app.run_server(debug=False, host='{}.local'.format(gethostname()), port=8080, threaded=True)
         except Exception as e:
             print(e)
             sleep(1)
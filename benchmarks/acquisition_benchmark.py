@@ -0,0 +1,58 @@
+# Control backend for the KStat electrochemical analyzer GUI
+# Benchmark of complete measurements (command handshake, data transfer, decoding and saving)
+# against the virtual KStat on a pseudo-terminal
+# run from the repository root: python3 -m benchmarks.acquisition_benchmark [sample rate in Hz]
+
+import os, sys, tempfile
+from time import perf_counter
+from multiprocessing import Process
+from serial import Serial
+import kstat_interface.backend_apps.drivers.KStat_0_1_driver as KStat
+from kstat_interface.backend_apps.drivers.virtual_kstat import VirtualKStat
+
+PGA_gain = 2
+iv_gain = "POT_GAIN_300K"
+
+def start_device(sample_rate, time_scale):
+    device = VirtualKStat(sample_rate=sample_rate, time_scale=time_scale, seed=0)
+    path = device.open()
+    process = Process(target=device.serve_forever, daemon=True)
+    process.start()
+    ser = Serial(path, 9600, timeout=1)
+    KStat.abort(ser)
+    KStat.setupADC(ser, 1, "1KHz", PGA_gain)
+    KStat.setGain(ser, iv_gain)
+    return ser, process
+
+def run_cv(ser, folder, n_scans=2, slope=500):
+    KStat.cyclicVoltammetry(ser, PGA_gain, iv_gain, 0, 0, 0, 0, -1000, 0, 0,
+                            n_scans, slope, '', file=os.path.join(folder, 'CV'))
+    # 2 V per scan
+    return n_scans*2000/slope
+
+def run_swv(ser, folder, frequency=100):
+    KStat.squarewaveVoltammetry(ser, PGA_gain, iv_gain, 0, 0, 0, 0, 0, -1500, 2, 25,
+                                frequency, 1, '', file=os.path.join(folder, 'SWV'))
+    return 750/frequency
+
+def measure(ser, experiment):
+    with tempfile.TemporaryDirectory() as folder:
+        t = perf_counter()
+        nominal = experiment(ser, folder)
+        return perf_counter() - t, nominal
+
+if __name__ == '__main__':
+    sample_rate = float(sys.argv[1]) if len(sys.argv) > 1 else 30000
+    print('Sample rate {:.0f} Hz'.format(sample_rate))
+    for time_scale, description in ((1, 'real time'), (0, 'maximum transfer rate')):
+        ser, process = start_device(sample_rate, time_scale)
+        print('\nVirtual KStat, {}:'.format(description))
+        for name, experiment in (('CV', run_cv), ('SWV', run_swv)):
+            elapsed, nominal = measure(ser, experiment)
+            if time_scale:
+                print('{:<4} {:8.2f} s (scan time {:.2f} s, overhead {:.2f} s)'.format(
+                      name, elapsed, nominal, elapsed - nominal))
+            else:
+                print('{:<4} {:8.2f} s'.format(name, elapsed))
+        ser.close()
+        process.terminate()
@@ -0,0 +1,130 @@
+# Control backend for the KStat electrochemical analyzer GUI
+# Benchmark of the decoding of voltammetric data frames:
+# per-frame decoding (regex + struct + ADCtoA for every point) vs. batch decoding with numpy
+# run from the repository root: python3 -m benchmarks.decode_benchmark
+
+import re, struct, sys
+from time import perf_counter
+import numpy as np
+import kstat_interface.backend_apps.drivers.KStat_0_1_driver as KStat
+
+PGA_gain = 2
+iv_gain = "POT_GAIN_300K"
+
+def generate_stream(frame, n_points, n_scans, bad_fraction=0.001, seed=0):
+    # synthetic data stream in the format sent by the KStat
+    rng = np.random.default_rng(seed)
+    frames = np.zeros(n_points, dtype=frame)
+    frames['header'] = 0x0a42
+    frames['terminator'] = 10
+    frames['potential'] = np.linspace(10000, 50000, n_points).astype(np.uint16)
+    for field in frame.names[2:-1]:
+        frames[field] = rng.integers(-2**22, 2**22, n_points)
+        bad = rng.random(n_points) < bad_fraction
+        frames[field][bad] = rng.integers(-16, 16, bad.sum())
+    scan = frames.tobytes() + b'S\n'
+    return scan*n_scans + b'@DONE\n'
+
+def per_frame_cv(response):
+    # decoding as done before the batch decoder, one frame at a time
+    pattern = re.compile(b'(B\n[\s\S]{6}\n*)|(S\n)|(@DONE\n)')
+    scans = [[]]
+    for x in re.finditer(pattern, response):
+        element = x.group()
+        if element == b'S\n':
+            scans.append([])
+        else:
+            scans[-1].append(element)
+    result = []
+    for scan in scans[:-1]:
+        potential = []
+        current = []
+        for element in scan:
+            if (re.findall(re.compile(b'[\xf0-\xff]\xff\xff\xff\n'), element) == \
+            re.findall(re.compile(b'[\x00-\x0f]\x00\x00\x00\n'), element) == []):
+                v, fi = struct.unpack('<xxHix', element)
+                potential.append(KStat.DACtomV(v))
+                current.append(per_frame_ADCtoA(fi, PGA_gain, iv_gain))
+        result.append({'potential':potential[3:], 'current':current[3:]})
+    return result
+
+def per_frame_swv(response):
+    pattern = re.compile(b'(B\n[\s\S]{10}\n*)|(S\n)|(@DONE\n)')
+    scans = [[]]
+    for x in re.finditer(pattern, response):
+        element = x.group()
+        if element == b'S\n':
+            scans.append([])
+        else:
+            scans[-1].append(element)
+    result = []
+    for scan in scans:
+        potential = []
+        forwardcurrent = []
+        backwardcurrent = []
+        for element in scan:
+            try:
+                v, fi1, fi2 = struct.unpack('<xxHiix', element)
+                potential.append(KStat.DACtomV(v))
+                forwardcurrent.append(per_frame_ADCtoA(fi1, PGA_gain, iv_gain))
+                backwardcurrent.append(per_frame_ADCtoA(fi2, PGA_gain, iv_gain))
+            except:
+                pass
+        forwardcurrent = forwardcurrent[3:]
+        backwardcurrent = backwardcurrent[3:]
+        fbcurrent = [forwardcurrent[j]-backwardcurrent[j] for j in range(len(forwardcurrent))]
+        result.append({'potential':potential[3:], 'fbcurrent':fbcurrent})
+    return result
+
+def per_frame_ADCtoA(ADC, PGA_gain, iv_gain):
+    iv_gains = {"POT_GAIN_0":0, "POT_GAIN_100":100, "POT_GAIN_3K":3000,
+                "POT_GAIN_30K":30000, "POT_GAIN_300K":300000,
+                "POT_GAIN_3M":3000000, "POT_GAIN_30M":30000000,
+                "POT_GAIN_100M":100000000}
+    return (ADC/(PGA_gain/2))*(2/iv_gains[iv_gain]/8388607)
+
+def batch_cv(response):
+    parser = KStat.FrameParser(KStat.CV_FRAME)
+    result = []
+    for i in range(0, len(response), 2500):
+        for scan in parser.feed(response[i:i+2500]):
+            result.append(KStat.decodeCyclicVoltammetry(scan, PGA_gain, iv_gain))
+    return result
+
+def batch_swv(response):
+    parser = KStat.FrameParser(KStat.SWV_FRAME)
+    scans = []
+    for i in range(0, len(response), 2500):
+        scans += parser.feed(response[i:i+2500])
+    scans.append(parser.finish())
+    return [KStat.decodeSquarewaveVoltammetry(scan, PGA_gain, iv_gain) for scan in scans]
+
+def timed(function, response, repeats):
+    best = None
+    for i in range(repeats):
+        start = perf_counter()
+        result = function(response)
+        duration = perf_counter() - start
+        if best is None or duration < best:
+            best = duration
+    return best, result
+
+def main(n_points=300000, n_scans=3, repeats=3):
+    print('{} scans of {} points each'.format(n_scans, n_points))
+    for label, frame, per_frame, batch, column in (
+            ('CV/LSV', KStat.CV_FRAME, per_frame_cv, batch_cv, 'current'),
+            ('SWV/DPV', KStat.SWV_FRAME, per_frame_swv, batch_swv, 'fbcurrent')):
+        response = generate_stream(frame, n_points, n_scans)
+        t_old, old = timed(per_frame, response, repeats)
+        t_new, new = timed(batch, response, repeats)
+        identical = len(old) == len(new) and all(
+            np.allclose(a['potential'], b['potential']) and np.allclose(a[column], b[column], rtol=1e-12, atol=0)
+            for a, b in zip(old, new))
+        print('{:8s} per frame: {:8.3f} s   batch: {:8.3f} s   speedup: {:6.1f}x   identical results: {}'.format(
+            label, t_old, t_new, t_old/t_new, identical))
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        main(n_points=int(sys.argv[1]))
+    else:
+        main()
@@ -0,0 +1,80 @@
+# Control backend for the KStat electrochemical analyzer GUI
+# Benchmark of the automatic peak detection of the voltammogram:
+# peakutils (baseline, indexes, Gaussian interpolation and snapping with argmin per peak) vs.
+# the vectorized engine of kstat_interface/peaks.py, with the default peak settings of the interface
+# scans of a data directory are used if one is given, cyclic voltammograms of the virtual KStat otherwise
+# run from the repository root: python3 -m benchmarks.peak_benchmark [data directory]
+# requires peakutils: pip3 install peakutils
+
+import sys, warnings
+from time import perf_counter
+import numpy as np
+import peakutils as pu
+from kstat_interface import scan_store, peaks
+from kstat_interface.backend_apps.drivers.virtual_kstat import redox_current
+
+# defaults of the interface (KStat_Dash_Front.py)
+threshold = 300/1e12
+distance = 100
+width = 20
+polynomial = 4
+
+def timed(function, repeat=5):
+    times = []
+    for i in range(repeat):
+        t = perf_counter()
+        result = function()
+        times.append(perf_counter() - t)
+    return min(times), result
+
+def virtual_scans(n_scans=5, n_points=8000):
+    # cyclic voltammograms -1600 mV -> 0 mV -> -1600 mV with the currents of the virtual KStat
+    rng = np.random.default_rng(0)
+    mV = np.concatenate([np.linspace(-1600, 0, n_points//2), np.linspace(0, -1600, n_points//2)])
+    direction = np.sign(np.gradient(mV))
+    for i in range(n_scans):
+        current = 2e-8*direction + redox_current(mV, direction) + 2e-10*rng.standard_normal(n_points)
+        yield 'virtual{}'.format(i), mV, current
+
+def directory_scans(directory):
+    for path in scan_store.list_scans(directory):
+        scan = scan_store.open_scan(path)
+        if 'current' in scan:
+            yield scan_store.scan_name(path), np.asarray(scan['potential']), np.asarray(scan['current'])
+
+def settings(x, y):
+    # as in plotting.peak_analysis
+    mv_step = abs(x[0] - x[9])/10
+    scale_factor = -1 if np.mean(y) < 0 else 1
+    return int(distance/mv_step), int(width/mv_step), y*scale_factor
+
+def with_peakutils(x, y, base=None):
+    peak_dist, peak_width, y = settings(x, y)
+    if base is None:
+        base = pu.baseline(y, polynomial)
+    found = pu.peak.indexes(y - base, thres=threshold, min_dist=peak_dist, thres_abs=True)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        positions = pu.peak.interpolate(x, y - base, ind=found, width=peak_width)
+    return np.array([np.abs(x - position).argmin() for position in positions], dtype=np.int64)
+
+def with_engine(x, y, base=None):
+    peak_dist, peak_width, y = settings(x, y)
+    if base is None:
+        base = peaks.polynomial_baseline(y, polynomial)
+    return peaks.analyze(x, y, threshold, peak_dist, peak_width, base)[0]
+
+if __name__ == '__main__':
+    scans = directory_scans(sys.argv[1]) if len(sys.argv) > 1 else virtual_scans()
+    print('{:20s} {:>7s} {:>12s} {:>12s} {:>14s} {:>6s}'.format(
+          'scan', 'points', 'peakutils', 'engine', 'slider update', 'peaks'))
+    for name, x, y in scans:
+        if len(x) < 10:
+            continue
+        t_pu, found_pu = timed(lambda: with_peakutils(x, y), 3)
+        t_engine, found = timed(lambda: with_engine(x, y))
+        # peak parameter changes reuse the cached baseline
+        base = peaks.polynomial_baseline(settings(x, y)[2], polynomial)
+        t_slider, found = timed(lambda: with_engine(x, y, base))
+        print('{:20s} {:7d} {:9.1f} ms {:9.1f} ms {:11.1f} ms {:3d}/{:<3d}'.format(
+              name[:20], len(x), t_pu*1000, t_engine*1000, t_slider*1000, len(found), len(found_pu)))
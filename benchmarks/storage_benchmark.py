@@ -0,0 +1,75 @@
+# Control backend for the KStat electrochemical analyzer GUI
+# Benchmark of reading a scan for plotting and adding a derived column (e.g. the filtered current):
+# csv files (pd.read_csv / df.to_csv) vs. the binary columnar scan format (scan_store)
+# and reprocessing a directory of scans stored as raw codes with new calibration constants
+# run from the repository root: python3 -m benchmarks.storage_benchmark [number of points]
+
+import os, sys, tempfile
+from time import perf_counter
+import numpy as np
+import pandas as pd
+from kstat_interface import scan_store, calibration
+
+def timed(function, repeat=5):
+    times = []
+    for i in range(repeat):
+        t = perf_counter()
+        function()
+        times.append(perf_counter() - t)
+    return min(times)
+
+def csv_read(file):
+    df = pd.read_csv(file)
+    return df.potential.values, df.current.values
+
+def scan_read(path):
+    scan = scan_store.open_scan(path)
+    return scan['potential'], scan['current']
+
+def csv_add_column(file, values):
+    df = pd.read_csv(file)
+    df['derived'] = values
+    df.to_csv(file, index=False)
+
+def scan_add_column(path, values):
+    scan_store.open_scan(path).add_column('derived', values)
+
+def raw_scans(folder, n_scans, n_points, rng):
+    # scans as saved by the KStat driver
+    metadata = calibration.conversion_metadata(2, 'POT_GAIN_300K')
+    for i in range(n_scans):
+        scan_store.write_scan(os.path.join(folder, 'raw' + str(i)),
+                              {'raw_potential':np.linspace(20000, 32768, n_points).astype(np.uint16),
+                               'raw_current':rng.integers(-2**20, 2**20, n_points).astype(np.int32)}, metadata)
+
+def reprocess_read(folder, new_calibration):
+    # reprocess and read every scan with the new constants
+    scan_store.reprocess(folder, new_calibration)
+    for path in scan_store.list_scans(folder):
+        scan = scan_store.open_scan(path)
+        scan['potential'], scan['current']
+
+if __name__ == '__main__':
+    n_points = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rng = np.random.default_rng(0)
+    columns = {'potential':np.linspace(-1000, 0, n_points), 'current':rng.normal(0, 1e-6, n_points)}
+    with tempfile.TemporaryDirectory() as folder:
+        base = os.path.join(folder, 'scan')
+        pd.DataFrame(columns).to_csv(base + '.csv', index=False)
+        path = scan_store.write_scan(base, columns)
+        print('{} points: csv {:.1f} kB, binary {:.1f} kB'.format(n_points,
+              os.path.getsize(base + '.csv')/1000,
+              sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))/1000))
+        print('read          csv {:8.2f} ms   binary {:8.2f} ms'.format(
+              timed(lambda: csv_read(base + '.csv'))*1000, timed(lambda: scan_read(path))*1000))
+        derived = rng.normal(0, 1e-6, n_points)
+        print('add column    csv {:8.2f} ms   binary {:8.2f} ms'.format(
+              timed(lambda: csv_add_column(base + '.csv', derived))*1000,
+              timed(lambda: scan_add_column(path, derived))*1000))
+    n_scans = 200
+    with tempfile.TemporaryDirectory() as folder:
+        raw_scans(folder, n_scans, n_points, rng)
+        new_calibration = dict(calibration.default_calibration, use_trims=True)
+        print('reprocess {} raw scans: {:.2f} s (read with new calibration {:.2f} s)'.format(n_scans,
+              timed(lambda: scan_store.reprocess(folder, new_calibration), 1),
+              timed(lambda: reprocess_read(folder, new_calibration), 1)))
@@ -1,11 +1,15 @@
 import sys, struct, time, re
+from functools import lru_cache
 from serial import Serial
-import pandas as pd
+import numpy as np
 import matplotlib
 # for headless use
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 from datetime import datetime
+from ...scan_store import write_scan, raw_prefix
+from ... import calibration, scan_catalog
+from ...sample_rates import adc_code
 
 def mVtoDAC(mV):
     #convert milivolts to DAC indices
@@ -19,13 +23,19 @@ def DACtomV(DAC):
     #convert DAC indices to milivolts
     return (DAC-32768)*(4096/65536)
 
+iv_gains = {"POT_GAIN_0":0, "POT_GAIN_100":100, "POT_GAIN_3K":3000,
+            "POT_GAIN_30K":30000, "POT_GAIN_300K":300000,
+            "POT_GAIN_3M":3000000, "POT_GAIN_30M":30000000,
+            "POT_GAIN_100M":100000000}
+
+@lru_cache()
+def currentScale(PGA_gain, iv_gain):
+    #factor to convert ADC values to current for a combination of gains
+    return (2/(PGA_gain/2))/iv_gains[iv_gain]/8388607
+
 def ADCtoA(ADC, PGA_gain, iv_gain):
-    #convert ADC values to current
-    iv_gains = {"POT_GAIN_0":0, "POT_GAIN_100":100, "POT_GAIN_3K":3000,
-                "POT_GAIN_30K":30000, "POT_GAIN_300K":300000,
-                "POT_GAIN_3M":3000000, "POT_GAIN_30M":30000000,
-                "POT_GAIN_100M":100000000}
-    return (ADC/(PGA_gain/2))*(2/iv_gains[iv_gain]/8388607)
+    #convert ADC values to current (works on single values and numpy arrays)
+    return ADC*currentScale(PGA_gain, iv_gain)
 
 def ADCtomV(ADC, PGA_gain):
     #convert ADC values to voltage (for potentiometry)
@@ -71,6 +81,9 @@ def abort(ser):
     for i in range(3):
         ser.readline()
 
+#EEPROM settings of the connected KStat, saved with the conversion metadata of every scan
+settings = {}
+
 def readSettings(ser):
     #Reads EEPROM settings and returns values as a dictionary
     sendCommand(ser, b"SR\r\n")
@@ -84,6 +97,8 @@ def readSettings(ser):
                 k,v = c.decode().split('.')
                 v = int(v)
                 D[k] = v
+    settings.clear()
+    settings.update(D)
     return D
 
 def writeSettings(ser, max5443_offset = 0, tcs_enabled = 1, tcs_clear_threshold = 10000,
@@ -121,11 +136,7 @@ def setupADC(ser, ADSbuffer, Samplingrate, PGA_gain):
     #               "60Hz", "100Hz", "500Hz", "1KHz", "2KHz", "3.75KHz", "7.5KHz", "15KHz",
     #               "30KHz"]
     commands = []
-    Samplingrates = {"2.5Hz":"3", "5Hz":"13", "10Hz":"23", "15Hz":"33",
-                     "25Hz":"43", "30Hz":"53", "50Hz":"63", "60Hz":"72",
-                     "100Hz":"82", "500Hz":"92", "1KHz":"A1", "2KHz":"B0",
-                     "3.75KHz":"C0", "7.5KHz":"D0", "15KHz":"E0", "30KHz":"E0"}
-    Samplingrate = Samplingrates[Samplingrate]
+    Samplingrate = adc_code(Samplingrate)
     commands.append('EA')
     commands.append(str(PGA_gain))
     commands.append(str(Samplingrate))
@@ -184,6 +195,179 @@ def setPlotRange(start, v1, v2):
     return x1, x2
 
 
+# data frames of voltammetric experiments: b'B\n' + payload + b'\n'
+# CV/LSV payload: DAC potential (uint16), ADC current (int32)
+# SWV/DPV payload: DAC potential (uint16), ADC forward and backward current (int32)
+# scans are separated by b'S\n', the end of the experiment is marked by b'@DONE\n'
+CV_FRAME = np.dtype([('header','<u2'), ('potential','<u2'), ('current','<i4'),
+                     ('terminator','u1')])
+SWV_FRAME = np.dtype([('header','<u2'), ('potential','<u2'), ('forwardcurrent','<i4'),
+                      ('backwardcurrent','<i4'), ('terminator','u1')])
+_frame_header = 0x0a42 # b'B\n' read as little endian uint16
+
+class FrameParser():
+    """
+    incremental parser for the data stream of voltammetric experiments
+    feed it every chunk read from the serial port, incomplete frames are kept until the next chunk
+    """
+
+    def __init__(self, frame, on_points=None):
+        self.frame = frame
+        self.frame_length = frame.itemsize
+        # optional callback on_points(scan_index, frames) for every batch of decoded frames
+        self.on_points = on_points
+        self.buffer = bytearray()
+        self.scan = []
+        self.n_scans = 0
+        self.done = False
+        # frames with a header but without terminator, bytes were lost in the transmission
+        self.invalid_frames = 0
+
+    def feed(self, chunk):
+        """
+        decode all complete frames in chunk (plus leftovers of previous chunks)
+        returns the list of scans completed by this chunk, every scan a structured array of frames
+        """
+        
+        self.buffer += chunk
+        buffer = self.buffer
+        size = len(buffer)
+        completed = []
+        pos = 0
+        while pos < size and not self.done:
+            if buffer.startswith(b'B\n', pos):
+                n = (size - pos) // self.frame_length
+                if n == 0:
+                    break # frame not completely received yet
+                if buffer[pos+self.frame_length-1] != 10:
+                    self.invalid_frames += 1
+                    pos += 1 # not a valid frame, skip
+                    continue
+                # decode the whole run of consecutive frames at once
+                frames = np.frombuffer(buffer[pos:pos+n*self.frame_length], dtype=self.frame)
+                valid = (frames['header'] == _frame_header) & (frames['terminator'] == 10)
+                if not valid.all():
+                    n = int(valid.argmin())
+                    frames = frames[:n]
+                self._add_frames(frames)
+                pos += n*self.frame_length
+            elif buffer.startswith(b'S\n', pos):
+                completed.append(self._join_scan())
+                self.n_scans += 1
+                pos += 2
+            elif buffer.startswith(b'@DONE\n', pos):
+                self.done = True
+                pos += 6
+            elif b'@DONE\n'.startswith(buffer[pos:pos+6]) or buffer[pos:] in (b'B', b'S'):
+                break # beginning of a frame that is not completely received yet
+            else:
+                # skip everything that is not part of a frame
+                match = _frame_start.search(buffer, pos+1)
+                pos = match.start() if match else size
+        del buffer[:pos]
+        return completed
+
+    def finish(self):
+        """
+        return the frames received after the last scan separator
+        """
+        
+        return self._join_scan()
+
+    def _add_frames(self, frames):
+        self.scan.append(frames)
+        if self.on_points is not None:
+            self.on_points(self.n_scans, frames)
+
+    def _join_scan(self):
+        if self.scan:
+            scan = np.concatenate(self.scan)
+        else:
+            scan = np.empty(0, dtype=self.frame)
+        self.scan = []
+        return scan
+
+_frame_start = re.compile(b'[BS@]')
+
+def readExperiment(ser, parser, cancel=None):
+    #read the data stream of an experiment until '@DONE', yields the scans completed by every chunk
+    #when cancel (Event) is set the KStat is told to abort, it finishes the data stream with '@DONE'
+    aborted = False
+    while not parser.done:
+        if cancel is not None and cancel.is_set() and not aborted:
+            print('Aborting experiment')
+            ser.write(b'a')
+            aborted = True
+        chunk = ser.read(ser.in_waiting or 1)
+        if aborted and chunk == b'':
+            parser.done = True # KStat didn't respond to abort
+        yield parser.feed(chunk)
+    if aborted:
+        # discard messages following the abort
+        time.sleep(0.1)
+        ser.reset_input_buffer()
+
+def decodeCyclicVoltammetry(frames, PGA_gain, iv_gain):
+    #convert a scan of CV/LSV frames to potential [mV] and current [A] in one step
+    #DStat sometimes generates bad data points, excluding current range -16 to +16:
+    current = frames['current']
+    frames = frames[(current < -16) | (current > 15)]
+    frames = frames[3:] # first datapoints are usually faulty
+    return {'potential': DACtomV(frames['potential'].astype(np.float64)),
+            'current': ADCtoA(frames['current'], PGA_gain, iv_gain),
+            'raw': rawColumns(frames, PGA_gain, iv_gain)}
+
+def decodeSquarewaveVoltammetry(frames, PGA_gain, iv_gain):
+    #convert a scan of SWV/DPV frames to potential [mV] and currents [A] in one step
+    frames = frames[3:] # first datapoints are usually faulty
+    forwardcurrent = ADCtoA(frames['forwardcurrent'], PGA_gain, iv_gain)
+    backwardcurrent = ADCtoA(frames['backwardcurrent'], PGA_gain, iv_gain)
+    return {'potential': DACtomV(frames['potential'].astype(np.float64)),
+            'forwardcurrent': forwardcurrent,
+            'backwardcurrent': backwardcurrent,
+            'fbcurrent': forwardcurrent - backwardcurrent,
+            'raw': rawColumns(frames, PGA_gain, iv_gain)}
+
+def rawColumns(frames, PGA_gain, iv_gain):
+    #raw DAC/ADC codes of the (filtered) frames with the metadata needed to convert them
+    #scans are saved as raw codes and converted when they are read (see kstat_interface/calibration.py)
+    columns = {raw_prefix + name: np.array(frames[name], dtype=np.uint16 if name == 'potential' else np.int32)
+               for name in frames.dtype.names if name not in ('header', 'terminator')}
+    return columns, calibration.conversion_metadata(PGA_gain, iv_gain, dict(settings))
+
+def saveScan(scan, filename):
+    #write the raw codes of a decoded scan to filename.scan
+    #the path is kept in scan['path'], e.g. to add the saved scans to the scan selector
+    columns, metadata = scan['raw']
+    path = write_scan(filename, columns, metadata)
+    scan['path'] = path
+    try:
+        scan_catalog.index_scan(path)
+    except Exception as e:
+        print("Couldn't add scan to catalog.", e)
+
+def liveCallback(live, PGA_gain, iv_gain):
+    #wrap live(scan_index, potential, current) to be called with every batch of frames during the measurement
+    #bad data points are excluded and the first datapoints of every scan are skipped like in the saved data
+    if live is None:
+        return None
+    received = {}
+    def on_points(scan_index, frames):
+        if 'current' in frames.dtype.names:
+            current = frames['current']
+            frames = frames[(current < -16) | (current > 15)]
+        skip = max(0, 3 - received.get(scan_index, 0))
+        received[scan_index] = received.get(scan_index, 0) + len(frames)
+        frames = frames[skip:]
+        if 'current' in frames.dtype.names:
+            current = ADCtoA(frames['current'], PGA_gain, iv_gain)
+        else:
+            current = ADCtoA(frames['forwardcurrent'] - frames['backwardcurrent'].astype(np.float64), PGA_gain, iv_gain)
+        if len(frames):
+            live(scan_index, DACtomV(frames['potential'].astype(np.float64)).tolist(), current.tolist())
+    return on_points
+
+
 def potentiometry(ser, PGA_gain, measurement_time = 0, mode = 1):
     #function for potentiometry experiment.
     #sampling rate is forced to 10 Hz because line by line readout is required for potentiometry (fast sampling can max out the serial buffer)
@@ -238,7 +422,7 @@ def catchPotentiometry(ser, PGA_gain):
 def differentialPulseVoltammetry(ser, PGA_gain, iv_gain, t_preconditioning1,
                                  t_preconditioning2, v_preconditioning1, v_preconditioning2,
                                  start, stop, step_size, pulse_height, period, width, sample_rate,
-                                 file='DPV', comment='', plotting=False):
+                                 file='DPV', comment='', plotting=False, live=None, cancel=None):
     #Run differnetial pulse voltammetry experiment and return results
     #PGA_gain = [1,2,4,8,16,32,64]
     #iv_gain = ["POT_GAIN_0", "POT_GAIN_100", "POT_GAIN_3K", "POT_GAIN_30K",
@@ -286,13 +470,13 @@ def differentialPulseVoltammetry(ser, PGA_gain, iv_gain, t_preconditioning1,
     
     sendCommand(ser, bytes(" ".join(commands), encoding='ascii'))
     
-    return catchSquarewaveVoltammetry(ser, PGA_gain, iv_gain, file, plotting)
+    return catchSquarewaveVoltammetry(ser, PGA_gain, iv_gain, file, plotting, live, cancel)
 
 
 def squarewaveVoltammetry(ser, PGA_gain, iv_gain, t_preconditioning1,
                           t_preconditioning2, v_preconditioning1, v_preconditioning2,
                           start, stop, step_size, pulse_height, frequency, scans, sample_rate,
-                          file='SWV', comment='', plotting=False):
+                          file='SWV', comment='', plotting=False, live=None, cancel=None):
     #Run squarewave voltammetry experiment and return results
     #PGA_gain = [1,2,4,8,16,32,64]
     #iv_gain = ["POT_GAIN_0", "POT_GAIN_100", "POT_GAIN_3K", "POT_GAIN_30K",
@@ -340,102 +524,60 @@ def squarewaveVoltammetry(ser, PGA_gain, iv_gain, t_preconditioning1,
     
     sendCommand(ser, bytes(" ".join(commands), encoding='ascii'))
     
-    return catchSquarewaveVoltammetry(ser, PGA_gain, iv_gain, file, plotting)
+    return catchSquarewaveVoltammetry(ser, PGA_gain, iv_gain, file, plotting, live, cancel)
 
-def catchSquarewaveVoltammetry(ser, PGA_gain, iv_gain, file, plotting):
+def catchSquarewaveVoltammetry(ser, PGA_gain, iv_gain, file, plotting, live=None, cancel=None):
     #save and return lines produced by squarewave voltammetry experiment
-
-    response = bytearray()   
-    while True:
-        line = ser.read(2500)
-        response += line
-        if b'@DONE\n' in line:
-            print('Data received')
-            break
-        
-    #pattern of data line:
-    pattern = re.compile(b'(B\n[\s\S]{10}\n*)|(S\n)|(@DONE\n)')
-    lines = []
-    for x in re.finditer(pattern, response):
-        lines.append(x.group())
-    scans = [[]]
-    index = 0
-    for element in lines:
-        #detecting scans and initializing lists for data:
-        if element == b'S\n':
-            index += 1
-            scans.append([])
+    #data frames are decoded as they arrive, scans are separated by 'S' frames
+    #live(scan_index, potential, current) is called with batches of points during the measurement
+    #the experiment is aborted when cancel (Event) is set, data received until then are saved
+    parser = FrameParser(SWV_FRAME, liveCallback(live, PGA_gain, iv_gain))
+    scans = []
+    for completed in readExperiment(ser, parser, cancel):
+        scans += completed
+    print('Data received')
+    #incomplete frames shift the data of the following frames, nothing is saved
+    if parser.invalid_frames:
+        print("Error: Data transmission failed")
+        return []
+    #data received after the last separator is a scan as well
+    scans.append(parser.finish())
+    n_scans = len(scans) - 1
+
+    result = []
+    for i in range(len(scans)):
+        result.append(decodeSquarewaveVoltammetry(scans[i], PGA_gain, iv_gain))
+
+        #writing data to file
+        if n_scans > 1:
+            filename = file + '-scan' + str(i)
         else:
-            scans[index].append(element)
-    n_scans = index
-    
-    if not b'@DONE\n' in scans[-1]:
-        return "Error: Data transmission failed"
-    else:
-        result = []
-        for i in range(len(scans)):
-            scan = scans[i]
-            result.append({})
-            potential = []
-            forwardcurrent = []
-            backwardcurrent = []  
-            raw = []
-            for element in scan:
-                #DStat sometimes generates bad data points, excluding current range -16 to +16:
-                #if (re.findall(re.compile(b'[\xf0-\xff]\xff\xff\xff\n'), element) == \
-                #re.findall(re.compile(b'[\x00-\x0f]\x00\x00\x00\n'), element) == []):
-                try:
-                    v, fi1, fi2 = struct.unpack('<xxHiix', element)
-                    potential.append(DACtomV(v))
-                    forwardcurrent.append(ADCtoA(fi1, PGA_gain, iv_gain))
-                    backwardcurrent.append(ADCtoA(fi2, PGA_gain, iv_gain))
-                except:
-                    pass
-            potential = potential[3:] # first datapoints are usually faulty
-            forwardcurrent = forwardcurrent[3:]
-            backwardcurrent = backwardcurrent[3:]
+            filename = file
             
-            #subtract backward from forward current
-            fbcurrent = []
-            for j in range(len(forwardcurrent)):
-                fbcurrent.append(forwardcurrent[j]-backwardcurrent[j])
-                
-            result[i]['potential'] = potential
-            result[i]['forwardcurrent'] = forwardcurrent
-            result[i]['backwardcurrent'] = backwardcurrent
-            result[i]['fbcurrent'] = fbcurrent
+        saveScan(result[i], filename)
+        if plotting:
+            fig = plt.figure(figsize=(6,4))
+            plt.plot(result[i]['potential'], result[i]['fbcurrent'], 'b-')
+            plt.gca().invert_xaxis()
+            plt.gca().invert_yaxis()
+            plt.xlabel('Potential [mV]')
+            plt.ylabel('Forward - Backward Current [A]')
+            plt.title(filename)
+            fig.savefig((filename+'.png'), dpi=150)
+            
+            plt.clf()
+                           
+            plt.close()
 
-            #writing data to file
-            if n_scans > 1:
-                filename = file + '-scan' + str(i)
-            else:
-                filename = file
-                
-            out = pd.DataFrame(result[i])
-            out.to_csv((filename+'.csv'), index = False)
-            if plotting:
-                fig = plt.figure(figsize=(6,4))
-                plt.plot(result[i]['potential'], result[i]['fbcurrent'], 'b-')
-                plt.gca().invert_xaxis()
-                plt.gca().invert_yaxis()
-                plt.xlabel('Potential [mV]')
-                plt.ylabel('Forward - Backward Current [A]')
-                plt.title(filename)
-                fig.savefig((filename+'.png'), dpi=150)
-                
-                plt.clf()
-                               
-                plt.close()
-    
-        print('Scans: ', n_scans + 1)
-        print("Processing complete")
-        return result
+    print('Scans: ', n_scans + 1)
+    print("Processing complete")
+    return result
 
 
 
 def linearSweepVoltammetry(ser, PGA_gain, iv_gain, t_preconditioning1, t_preconditioning2,
                            v_preconditioning1, v_preconditioning2, start, stop, slope, sample_rate,
-                           file='LSV', comment='', plotting=False):
+                           file='LSV', comment='', plotting=False, live=None, cancel=None):
     #Run linear sweep voltammetry experiment and return results
     #PGA_gain = [1,2,4,8,16,32,64]
     #iv_gain = ["POT_GAIN_0", "POT_GAIN_100", "POT_GAIN_3K", "POT_GAIN_30K",
@@ -477,13 +619,16 @@ def linearSweepVoltammetry(ser, PGA_gain, iv_gain, t_preconditioning1, t_precond
     sendCommand(ser, bytes(" ".join(commands), encoding='ascii'))
 
     #Data are returned in same format as for cyclic voltammetry
-    return catchCyclicVoltammetry(ser, PGA_gain, iv_gain, file, plotting)
+    return catchCyclicVoltammetry(ser, PGA_gain, iv_gain, file, plotting, live=live, cancel=cancel)
 
 
 def cyclicVoltammetry(ser, PGA_gain, iv_gain, t_preconditioning1, t_preconditioning2,
                       v_preconditioning1, v_preconditioning2, v1, v2,
-                      start, n_scans, slope, sample_rate, file = 'CV', comment='', plotting=False):
+                      start, n_scans, slope, sample_rate, file = 'CV', comment='', plotting=False, live=None, cancel=None,
+                      save=True):
     #Run cyclic voltammetry experiment and return results
+    #save = False: scans are only returned, not written to file (the parameters file is written anyway),
+    #e.g. to save a selected scan later with saveCyclicVoltammetry
     #PGA_gain = [1,2,4,8,16,32,64]
     #iv_gain = ["POT_GAIN_0", "POT_GAIN_100", "POT_GAIN_3K", "POT_GAIN_30K",
     #       "POT_GAIN_300K", "POT_GAIN_3M", "POT_GAIN_30M", "POT_GAIN_100M"]
@@ -524,81 +669,49 @@ def cyclicVoltammetry(ser, PGA_gain, iv_gain, t_preconditioning1, t_precondition
     commands.append('\r\n')
     sendCommand(ser, bytes(" ".join(commands), encoding='ascii'))
     
-    return catchCyclicVoltammetry(ser, PGA_gain, iv_gain, file, plotting, n_scans)
+    return catchCyclicVoltammetry(ser, PGA_gain, iv_gain, file, plotting, n_scans, live, cancel, save)
 
 
 
-def catchCyclicVoltammetry(ser, PGA_gain, iv_gain, file, plotting, n_scans=1):
+def catchCyclicVoltammetry(ser, PGA_gain, iv_gain, file, plotting, n_scans=1, live=None, cancel=None, save=True):
     #save and return lines produced by cyclic voltammetry experiment
-
-    response = bytearray()   
-    while True:
-        line = ser.read(2500)
-        #print(line)
-        response += line
-        if b'@DONE\n' in line:
-            print('Data received')
-            break
-    #print(response)
-        
-    #pattern of data line:
-    pattern = re.compile(b'(B\n[\s\S]{6}\n*)|(S\n)|(@DONE\n)')
-    lines = []
-    for x in re.finditer(pattern, response):
-        lines.append(x.group())
-    scans = [[]]
-    index = 0
-    for element in lines:
-        #detecting scans and initializing lists for data:
-        if element == b'S\n':
-            index += 1
-            scans.append([])
-        else:
-            scans[index].append(element)
-    
-    #print(scans)
-    if not b'@DONE\n' in scans[-1]:
-        print("Error: Data transmission failed")
-        return "Error: Data transmission failed"
-    else:
-        result = []
-        for i in range(len(scans)-1):
-            scan = scans[i]
-            result.append({})
-            potential = []
-            current = []
-            raw = []
-            for element in scan:
-                #DStat sometimes generates bad data points, excluding current range -16 to +16:
-                if (re.findall(re.compile(b'[\xf0-\xff]\xff\xff\xff\n'), element) == \
-                re.findall(re.compile(b'[\x00-\x0f]\x00\x00\x00\n'), element) == []):
-                    v, fi = struct.unpack('<xxHix', element)
-                    potential.append(DACtomV(v))
-                    current.append(ADCtoA(fi, PGA_gain, iv_gain))
-            potential = potential[3:] # first datapoints are usually faulty
-            current = current[3:]
-            result[i]['potential'] = potential
-            result[i]['current'] = current
+    #every scan is processed and written to file as soon as its 'S' frame arrives
+    #live(scan_index, potential, current) is called with batches of points during the measurement
+    #the experiment is aborted when cancel (Event) is set, the incomplete scan is saved as well
+    parser = FrameParser(CV_FRAME, liveCallback(live, PGA_gain, iv_gain))
+    result = []
+    for completed in readExperiment(ser, parser, cancel):
+        if cancel is not None and cancel.is_set() and parser.done:
+            partial = parser.finish()
+            if len(partial):
+                completed.append(partial)
+        for scan in completed:
+            i = len(result)
+            result.append(decodeCyclicVoltammetry(scan, PGA_gain, iv_gain))
 
             #writing data to file
             if n_scans > 1:
                 filename = file + '-scan' + str(i)
             else:
                 filename = file
-            out = pd.DataFrame(result[i])
-            out.to_csv((filename+'.csv'), index = False)
-            if plotting:
-                fig = plt.figure(figsize=(6,4))
-                plt.plot(result[i]['potential'], result[i]['current'], 'b-')
-                plt.gca().invert_xaxis()
-                plt.gca().invert_yaxis()
-                plt.xlabel('Potential [mV]')
-                plt.ylabel('Current [A]')
-                plt.title(filename)
-                fig.savefig((filename+'.png'), dpi=150)
-                plt.close()
-
-    
-        print('Scans: ', len(result))
-        print("processing complete")
-        return result
+            if save:
+                saveCyclicVoltammetry(result[i], filename, plotting)
+    print('Data received')
+
+    print('Scans: ', len(result))
+    print("processing complete")
+    return result
+
+def saveCyclicVoltammetry(scan, filename, plotting=False):
+    #write a decoded CV/LSV scan to filename.scan (and plot to filename.png)
+    saveScan(scan, filename)
+    if plotting:
+        fig = plt.figure(figsize=(6,4))
+        plt.plot(scan['potential'], scan['current'], 'b-')
+        plt.gca().invert_xaxis()
+        plt.gca().invert_yaxis()
+        plt.xlabel('Potential [mV]')
+        plt.ylabel('Current [A]')
+        plt.title(filename)
+        fig.savefig((filename+'.png'), dpi=150)
+        plt.close()
@@ -0,0 +1,293 @@
+# Simulated KStat potentiostat on a pseudo-terminal for testing and benchmarking without hardware
+# speaks the serial protocol used by KStat_0_1_driver (command handshake, ADC/gain settings,
+# EEPROM settings, idle, abort and the EC/EL/ED/ES/EP experiments) and generates voltammetric data
+#
+# start from the repository root:
+#   python3 -m kstat_interface.backend_apps.drivers.virtual_kstat --link /tmp/kstat
+# and point the backend to the device:
+#   KSTAT_PATH=/tmp/kstat python3 KStat_Dash_Back.py
+
+import os, sys, tty, select, struct, argparse
+from time import time, sleep
+import numpy as np
+from . import KStat_0_1_driver as KStat
+from ...sample_rates import code_frequency
+pot_gains = ['POT_GAIN_0', 'POT_GAIN_100', 'POT_GAIN_3K', 'POT_GAIN_30K',
+             'POT_GAIN_300K', 'POT_GAIN_3M', 'POT_GAIN_30M', 'POT_GAIN_100M']
+default_settings = {'max5443_offset':0, 'tcs_enabled':1, 'tcs_clear_threshold':10000,
+                    'r100_trim':0, 'r3k_trim':0, 'r30k_trim':0, 'r300k_trim':0, 'r3M_trim':0,
+                    'r30M_trim':0, 'r100M_trim':0, 'eis_cal1':3000, 'eis_cal2':3000000,
+                    'dac_units_true':1}
+
+class Aborted(Exception):
+    pass
+
+class VirtualKStat():
+    """
+    simulated KStat, data are written to the master side of a pseudo-terminal
+    sample_rate: fixed sample rate in Hz for CV/LSV instead of the one set with setupADC
+    scan_points: fixed number of data points per scan instead of the one given by the parameters
+    time_scale: 1 runs experiments in real time, 0 sends data as fast as possible
+    bad_point_rate: fraction of data points with the bad current values the KStat sometimes sends
+    """
+
+    def __init__(self, sample_rate=None, scan_points=None, time_scale=1.0,
+                 bad_point_rate=0.001, mains_frequency=50, seed=None):
+        self.sample_rate = sample_rate
+        self.scan_points = scan_points
+        self.time_scale = time_scale
+        self.bad_point_rate = bad_point_rate
+        self.mains_frequency = mains_frequency
+        self.rng = np.random.default_rng(seed)
+        self.adc_rate = 1000.0
+        self.pga_gain = 2
+        self.iv_gain = 'POT_GAIN_300K'
+        self.settings = dict(default_settings)
+        self.input = bytearray()
+        self.master = None
+        self.slave = None
+
+    def open(self, link=None):
+        """
+        create the pseudo-terminal, returns the path of the serial device
+        """
+
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        path = os.ttyname(self.slave)
+        if link is not None:
+            if os.path.lexists(link):
+                os.remove(link)
+            os.symlink(path, link)
+            path = link
+        return path
+
+    def serve_forever(self):
+        while True:
+            self.input = self.input.lstrip(b'\r\n ')
+            if self.input.startswith(b'a'):
+                # abort outside of an experiment
+                self.input = self.input[1:]
+                self.write(b'#INFO: No experiment running\n#INFO: Abort\n@DONE\n')
+            elif self.input.startswith(b'!') and b'\n' in self.input:
+                line, _, rest = self.input.partition(b'\n')
+                self.input = rest
+                self.handle(bytes(line))
+            elif self.input and not self.input.startswith(b'!'):
+                # discard unexpected input
+                self.input = self.input[1:]
+            else:
+                self.input += os.read(self.master, 4096)
+
+    ##############################################################
+    # serial communication
+    ##############################################################
+
+    def write(self, data):
+        view = memoryview(data)
+        while len(view):
+            written = os.write(self.master, view[:4096])
+            view = view[written:]
+
+    def check_abort(self):
+        # abort signal ('a') sent during an experiment
+        while select.select([self.master], [], [], 0)[0]:
+            self.input += os.read(self.master, 4096)
+        if b'a' in self.input:
+            self.input = bytearray(self.input[self.input.index(b'a')+1:])
+            raise Aborted()
+
+    def wait(self, seconds):
+        end = time() + seconds*self.time_scale
+        while True:
+            self.check_abort()
+            remaining = end - time()
+            if remaining <= 0:
+                return
+            sleep(min(remaining, 0.05))
+
+    def handle(self, line):
+        # command handshake: !n -> @ACK n -> command -> @RCV n
+        try:
+            length = int(line.strip()[1:])
+        except ValueError:
+            return
+        self.write('@ACK {}\n'.format(length).encode())
+        cmd = self.read_exactly(length + 2)
+        self.write('@RCV {}\n'.format(length).encode())
+        args = cmd.decode('ascii').split()
+        if args:
+            self.command(args)
+
+    def read_exactly(self, n):
+        while len(self.input) < n:
+            self.input += os.read(self.master, 4096)
+        data = bytes(self.input[:n])
+        self.input = bytearray(self.input[n:])
+        return data
+
+    ##############################################################
+    # commands
+    ##############################################################
+
+    def command(self, args):
+        cmd, args = args[0], args[1:]
+        if cmd == 'EA':
+            self.pga_gain = int(args[0])
+            self.adc_rate = code_frequency(args[1]) or self.adc_rate
+            self.write('#A: {} {} {}\n#INFO: ADC settings updated\n@DONE\n'.format(*args).encode())
+        elif cmd == 'EG':
+            self.iv_gain = pot_gains[int(args[0])]
+            self.write('#G: {}\n#INFO: Gain\n{}\n@DONE\n'.format(args[0], self.iv_gain).encode())
+        elif cmd == 'EM':
+            pass # idle at potential, no response
+        elif cmd == 'SR':
+            values = ':'.join('{}.{}'.format(k, v) for k, v in self.settings.items())
+            lines = ['#INFO: EEPROM settings'] * 15 + [':' + values, '#INFO', '@DONE']
+            self.write(('\n'.join(lines) + '\n').encode())
+        elif cmd == 'SW':
+            for key, value in zip(default_settings, args):
+                self.settings[key] = int(value)
+            self.write(b'#INFO: Settings written\n@DONE\n')
+        elif cmd in ('EC', 'EL', 'ED', 'ES', 'EP'):
+            try:
+                getattr(self, 'experiment_' + cmd)(*[int(float(a)) for a in args])
+                self.write(b'@DONE\n')
+            except Aborted:
+                self.write(b'#INFO: Experiment aborted\n@DONE\n\n')
+        else:
+            self.write(b'#ERR: Command not recognized\n')
+
+    def experiment_EC(self, t1, t2, v_pre1, v_pre2, v1, v2, start, n_scans, slope):
+        self.wait(t1 + t2)
+        path = [start, v1, v2, start]
+        for scan in range(n_scans):
+            self.send_sweep(path, relative_mV(slope))
+            self.write(b'S\n')
+
+    def experiment_EL(self, t1, t2, v_pre1, v_pre2, start, stop, slope):
+        self.wait(t1 + t2)
+        self.send_sweep([start, stop], relative_mV(slope))
+        self.write(b'S\n')
+
+    def experiment_ED(self, t1, t2, v_pre1, v_pre2, start, stop, step, pulse, period, width):
+        self.wait(t1 + t2)
+        self.send_pulses(start, stop, relative_mV(step), relative_mV(pulse), 1000/period)
+
+    def experiment_ES(self, t1, t2, v_pre1, v_pre2, start, stop, step, pulse, frequency, n_scans):
+        self.wait(t1 + t2)
+        for scan in range(n_scans):
+            if scan > 0:
+                self.write(b'S\n')
+            self.send_pulses(start, stop, relative_mV(step), relative_mV(pulse), frequency)
+
+    def experiment_EP(self, measurement_time, mode):
+        start = time()
+        n = 0
+        while measurement_time == 0 or n < measurement_time*5:
+            self.wait(0.2)
+            t = (time() - start)
+            voltage = 150 + 2*np.sin(t/10) + self.rng.normal(0, 0.2)
+            code = int(voltage*(self.pga_gain/2)*8388607/2000)
+            self.write(b'B\n' + struct.pack('<HHi', int(t), int((t % 1)*1000), code) + b'\n')
+            n += 1
+
+    ##############################################################
+    # data generation
+    ##############################################################
+
+    def send_sweep(self, path, slope):
+        # linear sweeps between the potentials in path (DAC units) with slope in mV/s
+        potential = []
+        for a, b in zip(path[:-1], path[1:]):
+            length = abs(KStat.DACtomV(b) - KStat.DACtomV(a))
+            n = max(int(length/slope*self.rate()), 1) if length > 0 else 0
+            potential.append(np.linspace(a, b, n, endpoint=False))
+        potential = np.concatenate(potential)
+        if self.scan_points is not None:
+            potential = np.interp(np.linspace(0, len(potential), self.scan_points, endpoint=False),
+                                  np.arange(len(potential)), potential)
+        direction = np.sign(np.gradient(potential))
+        mV = KStat.DACtomV(potential)
+        current = 2e-8*direction + redox_current(mV, direction)
+        frames = np.zeros(len(potential), dtype=KStat.CV_FRAME)
+        frames['potential'] = potential
+        frames['current'] = self.adc_codes(current, self.rate())
+        self.send_frames(frames, self.rate())
+
+    def send_pulses(self, start, stop, step, pulse, frequency):
+        # one data point (forward and backward current) per potential step
+        n = max(int(abs(KStat.DACtomV(stop) - KStat.DACtomV(start))/step), 1)
+        if self.scan_points is not None:
+            n = self.scan_points
+        potential = np.linspace(start, stop, n)
+        mV = KStat.DACtomV(potential)
+        difference = redox_current(mV, np.full(n, np.sign(pulse)))*pulse/50
+        background = 1e-8 + 1e-11*mV
+        frames = np.zeros(n, dtype=KStat.SWV_FRAME)
+        frames['potential'] = potential
+        frames['forwardcurrent'] = self.adc_codes(background + difference/2, frequency)
+        frames['backwardcurrent'] = self.adc_codes(background - difference/2, frequency)
+        self.send_frames(frames, frequency)
+
+    def adc_codes(self, current, rate):
+        # convert currents to ADC codes including noise, mains hum and bad points
+        t = np.arange(len(current))/rate
+        current = current + 2e-10*self.rng.standard_normal(len(current))
+        current = current + 5e-10*np.sin(2*np.pi*self.mains_frequency*t)
+        codes = np.round(current/KStat.currentScale(self.pga_gain, self.iv_gain))
+        codes = np.clip(codes, -8388607, 8388607).astype(np.int32)
+        codes[:3] = self.rng.integers(-8388607, 8388607, min(3, len(codes))) # first points are faulty
+        bad = self.rng.random(len(codes)) < self.bad_point_rate
+        codes[bad] = self.rng.integers(-16, 16, bad.sum())
+        return codes
+
+    def send_frames(self, frames, rate):
+        frames['header'] = 0x0a42
+        frames['terminator'] = 10
+        data = frames.tobytes()
+        size = frames.dtype.itemsize
+        # send in blocks of about 10 ms of data
+        block = max(int(rate/100), 1)*size
+        start = time()
+        for i in range(0, len(data), block):
+            self.check_abort()
+            if self.time_scale > 0:
+                due = start + (i/size)/rate*self.time_scale
+                if due > time():
+                    sleep(due - time())
+            self.write(data[i:i+block])
+
+    def rate(self):
+        if self.sample_rate is not None:
+            return self.sample_rate
+        return self.adc_rate
+
+def relative_mV(DAC):
+    # convert relative DAC steps (slope, step size, pulse height) to millivolts
+    return DAC*(4096/65536)
+
+def redox_current(mV, direction):
+    # two reversible redox couples: reduction peaks on negative sweeps, oxidation peaks on positive sweeps
+    current = np.zeros(len(mV))
+    for E0, height in ((-400, 1.5e-7), (-1200, 3e-7)):
+        shift = np.where(direction < 0, -30, 30)
+        current += direction*height*np.exp(-((mV - E0 - shift)/60)**2)
+    return current
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Simulated KStat potentiostat on a pseudo-terminal')
+    parser.add_argument('--link', help='create a symbolic link to the serial device at this path')
+    parser.add_argument('--sample-rate', type=float, help='fixed sample rate in Hz (default: as set by the ADC command)')
+    parser.add_argument('--scan-points', type=int, help='fixed number of data points per scan')
+    parser.add_argument('--time-scale', type=float, default=1.0, help='1 for real time, 0 for maximum speed')
+    parser.add_argument('--bad-point-rate', type=float, default=0.001)
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args(argv)
+    device = VirtualKStat(args.sample_rate, args.scan_points, args.time_scale, args.bad_point_rate, seed=args.seed)
+    print('Virtual KStat at', device.open(args.link))
+    sys.stdout.flush()
+    device.serve_forever()
+
+if __name__ == '__main__':
+    main()
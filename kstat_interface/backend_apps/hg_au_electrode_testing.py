@@ -4,73 +4,152 @@
 # nico.froehberg@gmx.de
 
 from time import time, sleep
-from ..dash_apps.app import write_config, make_scan_progress, controls_disabled
+from ..dash_apps.app import write_config, set_status, controls_disabled
 from .drivers import KStat_0_1_driver as KStat
 from serial import Serial
-from sched import scheduler
-from multiprocessing import Process
-from threading import Thread
 from redisworks import Root
-from ast import literal_eval
-from glob import glob
-from os import remove
+from collections import deque
+import numpy as np
 from .. import redis_config
+from ..scan_catalog import delete_scan
 from .single_cv import cv_measurement
 
 redis_host,redis_port = redis_config.get_config()
 root = Root(host=redis_host, port=redis_port, db=0)
 
-def hg_au_electrode_testing(config, motor, ser):
+def hg_au_electrode_testing(config, motor, ser, cancel=None):
     # disable user controls 
     controls_disabled(True)
-    write_config([{'component':'scan_progress','attribute':'value','value':0}])
+    set_status(scan_progress=0)
     
+    # with a tolerance the series stops as soon as the electrode response converged
+    if config['electrode_test_tolerance_input']['value']:
+        adaptive_electrode_testing(config, motor, ser, cancel)
+    else:
+        fixed_electrode_testing(config, motor, ser, cancel)
+
+    KStat.idle(ser,0)
+    
+    # reenable user controls
+    write_config([{'component':'purge_switch','attribute':'on','value':config['purge_switch']['on']},                    
+                  {'component':'stirr_switch','attribute':'on','value':config['stirr_switch']['on']}])
+    controls_disabled(False)
+
+def fixed_electrode_testing(config, motor, ser, cancel=None):
+    # n_electrode_tests test scans, every scan is saved and replaced by the next one
     id = config['popup_measurement_id']['value']
     n_tests = config['n_electrode_tests_input']['value']
     
     
-    file_options = config['scan_selector']['options']
     # all but the last test scan are executed, shown, then deleted
     for i in range(n_tests-1):
+        if cancel is not None and cancel.is_set():
+            break
         file = root.working_directory + id + '_test' + str(i+1)
         prog = (i/n_tests)*100
-        write_config([{'component':'series_progress','attribute':'value','value':prog},
-                      {'component':'series_progress_label','attribute':'children','value':'Test {}/{}'.format(i+1,n_tests)}])
+        set_status(series_progress=prog, series_progress_label='Test {}/{}'.format(i+1,n_tests))
         
-        cv_measurement(config, motor, ser, file)
+        cv_measurement(config, motor, ser, file, cancel)
         
-        if i == 0:
-            file_options.append({'label':id + '_test' + str(i+1),'value':file+'.csv'})
-        else:
-            file_options[-1]={'label':id + '_test' + str(i+1),'value':file+'.csv'}
-        write_config([{'component':'scan_selector','attribute':'options','value':file_options},
-                      {'component':'scan_selector','attribute':'value','value':file+'.csv'}])
+        # the option of the previous test is replaced
+        write_config([{'component':'scan_selector','attribute':'options','operation':'remove_option',
+                       'value':{'label':'','value':root.working_directory + id + '_test' + str(i) + '.scan'}},
+                      {'component':'scan_selector','attribute':'options','operation':'append_option',
+                       'value':{'label':id + '_test' + str(i+1),'value':file+'.scan'}},
+                      {'component':'scan_selector','attribute':'value','value':file+'.scan'}])
         # delete previous scan
         if i > 0:
-            files = glob('{}/*'.format(root.working_directory))
-            for scan in files:
-                if (id + '_test' + str(i)) in scan:
-                    remove(scan)
+            delete_scan(root.working_directory + id + '_test' + str(i))
   
-    prog = ((n_tests-1)/n_tests)*100
+    # the last test is kept, after cancelling the last completed test is kept instead
+    if cancel is None or not cancel.is_set():
+        prog = ((n_tests-1)/n_tests)*100
+        file = root.working_directory + id
+        set_status(series_progress=prog, series_progress_label='Test {}/{}'.format(n_tests,n_tests))
+        
+        cv_measurement(config, motor, ser, file, cancel)
+        
+        set_status(series_progress=100)
+        delete_scan(root.working_directory + id + '_test' + str(n_tests-1))
+        write_config([{'component':'scan_selector','attribute':'options','operation':'remove_option',
+                       'value':{'label':'','value':root.working_directory + id + '_test' + str(n_tests-1) + '.scan'}},
+                      {'component':'scan_selector','attribute':'options','operation':'append_option','value':{'label':id,'value':file+'.scan'}},
+                      {'component':'scan_selector','attribute':'value','value':file+'.scan'}])
+
+class ConvergenceMonitor():
+    """
+    compares every test scan with the previous one: peak height, peak position and the whole scan
+    tolerance: maximum relative change [%] (peak position relative to the potential range of the scan)
+    window: number of consecutive comparisons within the tolerance required for convergence
+    only the previous scan and the last window comparisons are kept
+    """
+
+    def __init__(self, tolerance, window=3):
+        self.tolerance = tolerance/100
+        self.window = window
+        self.previous = None
+        self.within = deque(maxlen=window)
+        self.changes = None
+
+    def add(self, scan):
+        # returns True if the electrode response converged
+        current = np.asarray(scan['current'])
+        potential = np.asarray(scan['potential'])
+        if len(current) == 0:
+            return False
+        peak = np.argmax(np.abs(current))
+        features = (abs(current[peak]), potential[peak], np.ptp(potential), current)
+        if self.previous is not None:
+            self.changes = compare_scans(self.previous, features)
+            self.within.append(max(self.changes) <= self.tolerance)
+        self.previous = features
+        return len(self.within) == self.window and all(self.within)
+
+def compare_scans(previous, features):
+    # relative changes of peak height, peak position and scan between two test scans
+    height0, position0, range0, current0 = previous
+    height, position, potential_range, current = features
+    height_change = abs(height - height0)/max(height0, 1e-15)
+    position_change = abs(position - position0)/max(potential_range, 1)
+    # scans can differ by a few points (bad data points are removed),
+    # the previous scan is resampled to the length of the current one
+    resampled = np.interp(np.linspace(0, 1, len(current)), np.linspace(0, 1, len(current0)), current0)
+    rms = np.sqrt(np.mean(resampled**2))
+    scan_change = np.sqrt(np.mean((current - resampled)**2))/max(rms, 1e-15)
+    return height_change, position_change, scan_change
+
+def adaptive_electrode_testing(config, motor, ser, cancel=None):
+    # test scans are repeated until the response converged, at most n_electrode_tests scans
+    # the scans are only kept in memory, just the last one is saved
+    id = config['popup_measurement_id']['value']
+    n_tests = config['n_electrode_tests_input']['value']
+    monitor = ConvergenceMonitor(config['electrode_test_tolerance_input']['value'])
     file = root.working_directory + id
-    write_config([{'component':'series_progress','attribute':'value','value':prog},
-                  {'component':'series_progress_label','attribute':'children','value':'Test {}/{}'.format(n_tests,n_tests)}])
-    
-    cv_measurement(config, motor, ser, file)
     
-    write_config([{'component':'series_progress','attribute':'value','value':100}])
-    files = glob('{}/*'.format(root.working_directory))
-    for scan in files:
-        if (id + '_test' + str(n_tests-1)) in scan:
-            remove(scan)
-
-    KStat.idle(ser,0)
+    last_scan = None
+    n_done = 0
+    for i in range(n_tests):
+        if cancel is not None and cancel.is_set():
+            break
+        label = 'Test {}/{}'.format(i+1,n_tests)
+        if monitor.changes is not None:
+            label += ' (change {:.1f} %)'.format(max(monitor.changes)*100)
+        set_status(series_progress=(i/n_tests)*100, series_progress_label=label)
+        
+        result = cv_measurement(config, motor, ser, file, cancel, save=False)
+        if len(result) == 0:
+            continue
+        last_scan = result[-1]
+        n_done = i+1
+        if cancel is not None and cancel.is_set():
+            break
+        if monitor.add(last_scan):
+            print('Electrode response converged after', n_done, 'test scans')
+            break
     
-    # reenable user controls
-    file_options[-1]={'label':id,'value':file+'.csv'}
-    write_config([{'component':'purge_switch','attribute':'on','value':config['purge_switch']['on']},                    
-                  {'component':'stirr_switch','attribute':'on','value':config['stirr_switch']['on']},
-                  {'component':'scan_selector','attribute':'options','value':file_options},
-                  {'component':'scan_selector','attribute':'value','value':file+'.csv'}])
-    controls_disabled(False)
\ No newline at end of file
+    # the last test is kept, after cancelling the last (partial) test
+    if last_scan is not None:
+        KStat.saveCyclicVoltammetry(last_scan, file, plotting=True)
+        set_status(series_progress=100, series_progress_label='Tests: {}'.format(n_done))
+        write_config([{'component':'scan_selector','attribute':'options','operation':'append_option','value':{'label':id,'value':file+'.scan'}},
+                      {'component':'scan_selector','attribute':'value','value':file+'.scan'}])
\ No newline at end of file
@@ -0,0 +1,178 @@
+# Control backend for the KStat electrochemical analyzer GUI
+# Standard addition: the sample is measured once without and then after every addition of the standard,
+# the user is asked to add the standard before each of these measurements
+# the decoded scans are kept in memory, so the calibration is evaluated as soon as the last scan finished:
+# peaks are detected like in the voltammogram (noise filter, baseline and peak settings of the interface),
+# the concentration of the sample is the x-intercept of the linear regression of the height of the highest
+# peak against added concentration
+
+import numpy as np
+from ..dash_apps.app import write_config, set_status, controls_disabled, scan_options
+from ..config_store import read_config_value, ConfigListener
+from .drivers import KStat_0_1_driver as KStat
+from redisworks import Root
+from .. import redis_config
+from .. import peaks
+from ..noise_filter import notch_filter
+from .single_cv import cv_measurement
+from .single_lsv import lsv_measurement
+from .single_dpv import dpv_measurement
+from .single_swv import swv_measurement
+
+redis_host,redis_port = redis_config.get_config()
+root = Root(host=redis_host, port=redis_port, db=0)
+
+# measurement function and current evaluated for every technique
+techniques = {
+    'cv':(cv_measurement, 'current'),
+    'lsv':(lsv_measurement, 'current'),
+    'dpv':(dpv_measurement, 'fbcurrent'),
+    'swv':(swv_measurement, 'fbcurrent'),
+    }
+
+def standard_addition_cv(config, motor, ser, cancel=None):
+    standard_addition('cv', config, motor, ser, cancel)
+
+def standard_addition_lsv(config, motor, ser, cancel=None):
+    standard_addition('lsv', config, motor, ser, cancel)
+
+def standard_addition_dpv(config, motor, ser, cancel=None):
+    standard_addition('dpv', config, motor, ser, cancel)
+
+def standard_addition_swv(config, motor, ser, cancel=None):
+    standard_addition('swv', config, motor, ser, cancel)
+
+def standard_addition(technique, config, motor, ser, cancel=None):
+    controls_disabled(True)
+    set_status(scan_progress=0)
+
+    measurement, current = techniques[technique]
+    id = config['popup_measurement_id']['value']
+    n_additions = config['n_additions_input']['value']
+    concentration = config['addition_concentration_input']['value']
+
+    scans = []
+    added = []
+    for i in range(n_additions + 1):
+        set_status(series_progress=i/(n_additions + 1)*100,
+                   series_progress_label='Addition {}/{}'.format(i, n_additions))
+        if i > 0 and not wait_for_addition(i, n_additions, cancel):
+            break
+        if cancel is not None and cancel.is_set():
+            break
+        name = id + '_add' + str(i)
+        file = root.working_directory + name
+        result = measurement(config, motor, ser, file, cancel)
+        if cancel is not None and cancel.is_set():
+            break
+        if not result:
+            # failed measurement, the regression uses the other additions
+            print('Standard addition: no data for addition', i)
+            continue
+        # the last scan of a measurement is evaluated
+        scans.append(result[-1])
+        added.append(i*concentration)
+        write_config(scan_options(result))
+
+    KStat.idle(ser,0)
+
+    if len(scans) > 1:
+        evaluation = evaluate_standard_addition(scans, added, current, peak_settings(config, current))
+        save_evaluation(root.working_directory + id, evaluation)
+        print('Standard addition:', evaluation['concentration'], 'R2', evaluation['r2'])
+        set_status(series_progress=100,
+                   series_progress_label='c = {:.4g} (R² {:.3f})'.format(evaluation['concentration'], evaluation['r2']))
+
+    write_config([{'component':'purge_switch','attribute':'on','value':config['purge_switch']['on']},
+                  {'component':'stirr_switch','attribute':'on','value':config['stirr_switch']['on']},
+                  {'component':'addition_prompt','attribute':'is_open','value':False}])
+    controls_disabled(False)
+
+def wait_for_addition(i, n_additions, cancel=None):
+    """
+    show the addition prompt and wait until the user confirms the addition
+    returns False if the measurement was cancelled in the meantime
+    """
+
+    listener = ConfigListener(root.red)
+    write_config([{'component':'addition_continue_button','attribute':'triggered','value':False},
+                  {'component':'addition_prompt_message','attribute':'children',
+                   'value':'Add standard addition {}/{}, then continue.'.format(i, n_additions)},
+                  {'component':'addition_prompt','attribute':'is_open','value':True}])
+    set_status(scan_progress=0, scan_progress_label='Waiting for addition')
+    try:
+        while cancel is None or not cancel.is_set():
+            if read_config_value(root.red, 'addition_continue_button', 'triggered'):
+                write_config([{'component':'addition_continue_button','attribute':'triggered','value':False},
+                              {'component':'addition_prompt','attribute':'is_open','value':False}])
+                return True
+            listener.wait(0.5)
+    finally:
+        listener.close()
+    return False
+
+def peak_settings(config, current):
+    # settings of the automatic peak detection of the voltammogram (plotting.py)
+    settings = {'baseline_polynomial':config['baseline_polynomial_input']['value'],
+                'peak_threshold':config['peak_threshold_input']['value']/config['peak_threshold_range']['value'],
+                'peak_distance':config['peak_distance_input']['value'],
+                'peak_width':config['peak_width_input']['value'],
+                'noise_frequency':None}
+    # only the current of cyclic and linear sweep voltammetry is noise filtered
+    if current == 'current' and config['noise_filter_button']['children'] == 'Noise Filter On':
+        settings['noise_frequency'] = config['noise_frequency_input']['value']
+        settings['samplerate'] = config['samplefreq_input']['value']
+    return settings
+
+def evaluate_standard_addition(scans, added, current, settings):
+    """
+    scans: decoded scans {'potential','<current>'} in the order of the additions
+    added: added concentration for every scan
+    settings: peak detection settings (see peak_settings)
+    returns peak potentials and heights, slope, intercept, r2 and the concentration of the sample
+    scans without a peak are left out of the regression (nan)
+    """
+
+    potentials = np.full(len(scans), np.nan)
+    heights = np.full(len(scans), np.nan)
+    for i, scan in enumerate(scans):
+        x = np.asarray(scan['potential'], dtype=np.float64)
+        y = np.asarray(scan[current], dtype=np.float64)
+        if len(x) < 10:
+            continue
+        if settings['noise_frequency']:
+            y = notch_filter(y, settings['samplerate'], settings['noise_frequency'])
+        # highest peak above the baseline
+        indices, peak_heights, base, scale_factor = peaks.detect(x, y, settings)
+        if len(indices):
+            highest = np.argmax(peak_heights)
+            potentials[i] = x[indices[highest]]
+            heights[i] = peak_heights[highest]
+
+    # linear regression of all peak heights in one least squares fit
+    added = np.asarray(added, dtype=np.float64)
+    used = np.isfinite(heights)
+    slope = intercept = r2 = float('nan')
+    if used.sum() > 1:
+        A = np.column_stack([added[used], np.ones(used.sum())])
+        (slope, intercept), residuals, rank, sv = np.linalg.lstsq(A, heights[used], rcond=None)
+        fit = A @ np.array([slope, intercept])
+        ss_total = np.sum((heights[used] - heights[used].mean())**2)
+        r2 = 1 - np.sum((heights[used] - fit)**2)/ss_total if ss_total > 0 else 0.0
+    return {'added':added,
+            'peak_potential':potentials,
+            'peak_height':heights,
+            'slope':slope,
+            'intercept':intercept,
+            'r2':r2,
+            'concentration':intercept/slope if slope != 0 else float('nan')}
+
+def save_evaluation(file, evaluation):
+    with open(file + '-standard_addition.csv', 'w') as f:
+        f.write('added,peak_potential,peak_height\n')
+        for row in zip(evaluation['added'], evaluation['peak_potential'], evaluation['peak_height']):
+            f.write('{},{},{}\n'.format(*row))
+    with open(file + '-standard_addition.txt', 'w') as f:
+        f.write(('Standard Addition Evaluation\nslope =\t\t\t{}\nintercept =\t\t{}\nR2 =\t\t\t{}\n'
+                 'concentration =\t\t{}\n').format(evaluation['slope'], evaluation['intercept'],
+                                                    evaluation['r2'], evaluation['concentration']))
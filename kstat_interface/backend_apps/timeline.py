@@ -0,0 +1,93 @@
+# Control backend for the KStat electrochemical analyzer GUI
+# Timeline of the phases of a measurement program (purging, cleaning, deposition, scan, ...)
+# a single ticker thread starts the actions of every phase and updates progress bar and label
+# based on a monotonic clock, so the timing doesn't drift and the number of events doesn't grow
+# with the duration of the phases
+
+from time import monotonic
+from threading import Thread, Event
+from ..dash_apps.app import set_status
+
+class Phase():
+    """
+    label: shown on the progress bar during the phase
+    duration: seconds, phases with a duration of 0 are skipped
+    start, end: list of actions (function, args) executed at the start/end of the phase
+    """
+
+    def __init__(self, label, duration, start=(), end=()):
+        self.label = label
+        self.duration = duration
+        self.start = start
+        self.end = end
+        self.done = Event()
+
+class Timeline():
+    """
+    runs phases one after another, the progress bar shows the progress of the current phase
+    tick: interval of progress updates in seconds
+    cancel: Event to stop the timeline early (checked every tick), end actions of the current phase are executed
+    """
+
+    def __init__(self, phases, tick=0.25, cancel=None):
+        self.phases = phases
+        self.tick = tick
+        self.cancel = cancel
+        self.stopped = Event()
+        self.thread = None
+
+    def start(self):
+        # run the timeline in a separate thread, e.g. parallel to a KStat measurement
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        t0 = monotonic()
+        offset = 0
+        for phase in self.phases:
+            if phase.duration > 0 and not self.is_stopped():
+                set_status(scan_progress_label=phase.label, scan_progress=0)
+                run_actions(phase.start)
+                self.run_phase(phase, t0 + offset)
+                run_actions(phase.end)
+                offset += phase.duration
+            phase.done.set()
+
+    def run_phase(self, phase, phase_start):
+        phase_end = phase_start + phase.duration
+        while not self.is_stopped():
+            now = monotonic()
+            if now >= phase_end:
+                set_status(scan_progress=100)
+                return
+            set_status(scan_progress=(now - phase_start)/phase.duration*100)
+            # ticks are scheduled relative to the start of the phase instead of the previous tick
+            next_tick = min(phase_start + (int((now - phase_start)/self.tick) + 1)*self.tick, phase_end)
+            self.stopped.wait(max(next_tick - monotonic(), 0))
+
+    def is_stopped(self):
+        return self.stopped.is_set() or (self.cancel is not None and self.cancel.is_set())
+
+    def wait_after(self, label):
+        """
+        block until the phase with this label is over
+        """
+
+        for phase in self.phases:
+            if phase.label == label:
+                phase.done.wait()
+                return
+
+    def finish(self):
+        """
+        stop the timeline (e.g. when a scan finished before its estimated duration) and fill the progress bar
+        """
+
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        set_status(scan_progress=100)
+
+def run_actions(actions):
+    for function, args in actions:
+        function(*args)
@@ -0,0 +1,172 @@
+# Control backend for the KStat electrochemical analyzer GUI
+# Measurement worker: a long-lived process that owns the serial connection to the KStat
+# and runs the measurement programs it receives through a job queue one after another
+# measurements are cancelled cooperatively: the program aborts the KStat experiment, saves the data
+# received so far and cleans up, instead of being terminated in the middle of a file or serial exchange
+# the jobs of the job queue in redis (see job_queue.py) are taken by the worker itself as soon as the
+# previous job finished, so the KStat isn't idle between the measurements of a series
+
+from multiprocessing import Process, Queue, Event
+from queue import Empty
+from serial import Serial
+from .drivers import KStat_0_1_driver as KStat
+from ..dash_apps.app import root, write_config, controls_disabled, set_status
+from ..config_store import read_config
+from .. import job_queue
+from .hg_au_electrode_plating import hg_au_electrode_plating
+from .hg_au_electrode_testing import hg_au_electrode_testing
+from .single_cv import single_cv
+from .single_dpv import single_dpv
+from .single_lsv import single_lsv
+from .single_swv import single_swv
+from .standard_addition import standard_addition_cv, standard_addition_dpv, standard_addition_lsv, standard_addition_swv
+
+# programs that can be run by the worker, called as program(config, motor, ser, cancel)
+# the name job_queue runs the jobs waiting in the job queue
+programs = {
+    'hg_au_electrode_plating':hg_au_electrode_plating,
+    'hg_au_electrode_testing':hg_au_electrode_testing,
+    'single_cv':single_cv,
+    'single_dpv':single_dpv,
+    'single_lsv':single_lsv,
+    'single_swv':single_swv,
+    'standard_addition_cv':standard_addition_cv,
+    'standard_addition_dpv':standard_addition_dpv,
+    'standard_addition_lsv':standard_addition_lsv,
+    'standard_addition_swv':standard_addition_swv,
+    }
+
+def initialize_KStat(KStat_path):
+    # set up KStat potentiostat
+    ser = Serial(KStat_path, 9600, timeout = 1)
+    ADSbuffer = 1
+    sample_rate = "1KHz"
+    PGA_gain = 2
+    iv_gain = "POT_GAIN_300K"
+    KStat.abort(ser)
+    KStat.setupADC(ser, ADSbuffer, sample_rate, PGA_gain)
+    KStat.setGain(ser, iv_gain)
+    # EEPROM trims are saved with the conversion metadata of the scans
+    try:
+        KStat.readSettings(ser)
+    except Exception as e:
+        print("Couldn't read KStat settings.", e)
+    KStat.idle(ser,0)
+    return ser
+
+class MeasurementWorker():
+    """
+    start() forks the worker process, jobs are submitted with submit(program, config)
+    submit_queue() runs the jobs of the job queue until it is empty or cancelled
+    cancel() stops the running job, reports about finished jobs are collected with reports()
+    """
+
+    def __init__(self, KStat_path, motor):
+        self.KStat_path = KStat_path
+        self.motor = motor
+        self.jobs = Queue()
+        self.results = Queue()
+        self.cancel_event = Event()
+        self.process = None
+
+    def start(self):
+        self.process = Process(target=self.run, daemon=True)
+        self.process.start()
+
+    def stop(self):
+        self.jobs.put(None)
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.terminate()
+
+    # the cancel event is cleared when a job is submitted, so a stop pressed before the worker
+    # takes the job still cancels it
+    def submit(self, program, config):
+        self.cancel_event.clear()
+        self.jobs.put((program, config))
+
+    def submit_queue(self):
+        self.cancel_event.clear()
+        self.jobs.put(('job_queue', None))
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def reports(self):
+        """
+        returns list of (program, result) for all jobs finished since the last call,
+        result is 'finished', 'cancelled' or the error message
+        (jobs of the job queue are reported as job_queue:<measurement id>,
+        a failed connection to the KStat as initialize, the worker process ends then)
+        """
+
+        reports = []
+        while True:
+            try:
+                reports.append(self.results.get_nowait())
+            except Empty:
+                return reports
+
+    def run(self):
+        # executed in the worker process
+        try:
+            ser = initialize_KStat(self.KStat_path)
+        except Exception as e:
+            print("Couldn't initialize KStat.", e)
+            self.results.put(('initialize', str(e)))
+            return
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            program, config = job
+            if program == 'job_queue':
+                self.run_queue(ser)
+            else:
+                self.results.put((program, self.run_program(ser, program, config)))
+        ser.close()
+
+    def run_program(self, ser, program, config):
+        try:
+            programs[program](config, self.motor, ser, self.cancel_event)
+            if self.cancel_event.is_set():
+                set_status(scan_progress_label='Cancelled')
+                return 'cancelled'
+            return 'finished'
+        except Exception as e:
+            print('Measurement failed:', program, e)
+            # bring KStat and user controls back into a defined state
+            try:
+                KStat.abort(ser)
+                ser.reset_input_buffer()
+                KStat.idle(ser,0)
+            except Exception as e:
+                print(e)
+            write_config([{'component':'purge_switch','attribute':'on','value':config['purge_switch']['on']},
+                          {'component':'stirr_switch','attribute':'on','value':config['stirr_switch']['on']}])
+            controls_disabled(False)
+            return str(e)
+
+    def run_queue(self, ser):
+        # cancelling stops the running job and the queue, the remaining jobs stay in the queue
+        n_done = 0
+        while not self.cancel_event.is_set():
+            job = job_queue.pop_job(root.red)
+            if job is None:
+                break
+            n_jobs = n_done + 1 + len(job_queue.list_jobs(root.red))
+            set_status(series_progress=n_done/n_jobs*100,
+                       series_progress_label='Job {} of {}: {}'.format(n_done + 1, n_jobs, job['measurement_id']))
+            # the settings of the method are shown in the interface while the job is running
+            write_config(job['changes'] + [{'component':'popup_measurement_id','attribute':'value','value':job['measurement_id']}])
+            config = read_config(root.red)
+            program = config['program_selection']['value']
+            if program in programs:
+                result = self.run_program(ser, program, config)
+            else:
+                result = 'unknown program ' + str(program)
+            job_queue.finish_job(root.red)
+            self.results.put(('job_queue:' + job['measurement_id'], result))
+            n_done += 1
+        set_status(series_progress=100 if n_done else 0, series_progress_label='')
+        controls_disabled(False)
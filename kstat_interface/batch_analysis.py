@@ -0,0 +1,143 @@
+# Batch peak analysis of all scans in a directory and its subdirectories
+# every scan is analyzed like the voltammogram of the interface (noise filter for cyclic and linear
+# sweep voltammetry, baseline, automatic peak detection of kstat_interface/peaks.py) in a pool of worker
+# processes and the peaks of all scans are written to one summary table (peak_summary.csv)
+# results are kept in the scan catalog with a signature of the scan files and the settings, so
+# repeated analyses only process new or changed scans
+# run from the repository root: python3 -m kstat_interface.batch_analysis <directory> [options]
+
+import os, json, hashlib, argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from time import perf_counter
+from . import scan_store, scan_catalog, peaks
+from .noise_filter import notch_filter
+from .derived_cache import data_files
+
+summary_file = 'peak_summary.csv'
+summary_header = 'ID,Directory,Technique,Time,Peak Potential [mV],Peak Current [A],\n'
+# techniques with one current column, which is noise filtered
+filtered_techniques = ('Cyclic Voltammetry', 'Linear Sweep Voltammetry')
+# settings of the interface (KStat_Dash_Front.py), noise_frequency None: no noise filter
+default_settings = {'noise_frequency':None, 'baseline_polynomial':4, 'peak_threshold':300/1e12,
+                    'peak_distance':100, 'peak_width':20}
+default_workers = min(4, os.cpu_count() or 1)
+
+def signature(entry, settings):
+    # changes if the data, parameters or settings of a scan change
+    files = data_files(entry['path']) + [scan_store.parameters_file(entry['path'])]
+    stats = [(os.path.basename(f), os.stat(f).st_mtime_ns, os.stat(f).st_size) for f in files if os.path.exists(f)]
+    return hashlib.sha1(json.dumps([stats, settings], sort_keys=True).encode()).hexdigest()
+
+def analyze_scan(path, technique, samplerate, settings):
+    """
+    peaks of one scan as [[potential [mV], height [A]], ...] (run in the worker processes)
+    """
+
+    scan = scan_store.open_scan(path)
+    x = scan['potential']
+    if len(x) < 10:
+        return []
+    if technique in filtered_techniques:
+        y = scan['current']
+        if settings['noise_frequency']:
+            y = notch_filter(y, samplerate, settings['noise_frequency'])
+    else:
+        y = scan['fbcurrent']
+    indices, heights, base, scale_factor = peaks.detect(x, y, settings)
+    return [[float(x[i]), float(height)] for i, height in zip(indices, heights)]
+
+def write_summary(target, directory, entries, results):
+    lines = [summary_header]
+    for entry in entries:
+        if entry['base'] not in results:
+            continue
+        folder = os.path.relpath(entry['directory'], directory)
+        folder = '' if folder == '.' else folder
+        time = datetime.fromtimestamp(entry['timestamp']).strftime('%Y-%m-%d %H:%M:%S') if entry['timestamp'] else ''
+        row = '{},{},{},{},'.format(entry['name'], folder, entry['technique'], time)
+        if not results[entry['base']]:
+            lines.append(row + ',,\n')
+        for potential, height in results[entry['base']]:
+            lines.append(row + '{:.0f},{:.2E},\n'.format(potential, height))
+    tmp = target + '.tmp'
+    with open(tmp, 'w') as f:
+        f.writelines(lines)
+    os.replace(tmp, target)
+
+def run(directory, settings=None, workers=default_workers, summary=None, progress=None):
+    """
+    analyze all scans in directory and its subdirectories and write the summary table
+    (peak_summary.csv in directory by default), progress(done, total) is called for every analyzed scan
+    returns the counts of scans, analyzed (new or changed), unchanged and failed scans and peaks
+    """
+
+    settings = dict(default_settings, **(settings or {}))
+    directory = scan_catalog.folder(directory)
+    entries = sorted(scan_catalog.search(directory, recursive=True), key=lambda e: (e['directory'], e['name']))
+    known = scan_catalog.read_analyses(entry['base'] for entry in entries)
+    results = {}
+    pending = []
+    for entry in entries:
+        entry_signature = signature(entry, settings)
+        if entry['base'] in known and known[entry['base']][0] == entry_signature:
+            results[entry['base']] = json.loads(known[entry['base']][1])
+        else:
+            pending.append((entry, entry_signature))
+    counts = {'scans':len(entries), 'analyzed':0, 'unchanged':len(results), 'failed':0}
+    if pending:
+        analyses = []
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(analyze_scan, entry['path'], entry['technique'],
+                                       entry['parameters'].get('Samplerate', [None])[0], settings):(entry, entry_signature)
+                       for entry, entry_signature in pending}
+            for done, future in enumerate(as_completed(futures), 1):
+                entry, entry_signature = futures[future]
+                try:
+                    results[entry['base']] = future.result()
+                    analyses.append((entry['base'], entry_signature, json.dumps(results[entry['base']])))
+                    counts['analyzed'] += 1
+                except Exception as e:
+                    print("Couldn't analyze scan", entry['path'], e)
+                    counts['failed'] += 1
+                if progress is not None:
+                    progress(done, len(pending))
+        scan_catalog.save_analyses(analyses)
+    counts['peaks'] = sum(len(result) for result in results.values())
+    write_summary(summary or os.path.join(directory, summary_file), directory, entries, results)
+    return counts
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Automatic peak detection of all scans in a directory')
+    parser.add_argument('directory')
+    parser.add_argument('--workers', type=int, default=default_workers, help='worker processes')
+    parser.add_argument('--noise-frequency', type=float, help='mains frequency [Hz] removed by the noise filter')
+    parser.add_argument('--polynomial', type=int, default=default_settings['baseline_polynomial'],
+                        help='degree of the baseline polynomial')
+    parser.add_argument('--threshold', type=float, default=default_settings['peak_threshold'],
+                        help='minimum peak current [A] (baseline removed)')
+    parser.add_argument('--distance', type=float, default=default_settings['peak_distance'],
+                        help='minimum distance between peaks [mV]')
+    parser.add_argument('--width', type=float, default=default_settings['peak_width'],
+                        help='potential range [mV] around a peak used to fit its position')
+    parser.add_argument('--summary', help='summary table (default: peak_summary.csv in the directory)')
+    args = parser.parse_args(argv)
+    # the catalog keeps absolute paths
+    args.directory = os.path.abspath(args.directory)
+    if not os.path.isdir(args.directory):
+        parser.error('not a directory: ' + args.directory)
+    settings = {'noise_frequency':args.noise_frequency, 'baseline_polynomial':args.polynomial,
+                'peak_threshold':args.threshold, 'peak_distance':args.distance, 'peak_width':args.width}
+    t = perf_counter()
+    # scans added or changed since the catalog was updated
+    scan_catalog.rebuild(args.directory)
+    summary = args.summary or os.path.join(args.directory, summary_file)
+    # read by the interface to show the progress (scan_parameters.py)
+    progress = lambda done, total: print('Progress: {}/{}'.format(done, total), flush=True)
+    counts = run(args.directory, settings, args.workers, summary, progress)
+    print('{scans} scans: {analyzed} analyzed, {unchanged} unchanged, {failed} failed, {peaks} peaks'.format(**counts) +
+          ' in {:.1f} s'.format(perf_counter() - t))
+    print('Summary: ' + summary)
+
+if __name__ == '__main__':
+    main()
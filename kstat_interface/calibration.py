@@ -0,0 +1,77 @@
+# Conversion of raw KStat data (DAC potential codes, ADC current codes) to mV and A
+# scans are saved with the raw codes and the conversion metadata (gains, EEPROM settings, calibration),
+# the conversion is done when the data are read, so scans can be reprocessed with new calibration
+# constants by changing their metadata only
+# reprocess a data directory: python3 -m kstat_interface.calibration <directory> [calibration.json]
+
+import json, sys
+import numpy as np
+
+# calibration constants, a calibration json file can override any of them
+default_calibration = {
+    # nominal resistance [Ohm] of the current-voltage converter gains
+    'iv_gains':{"POT_GAIN_0":0, "POT_GAIN_100":100, "POT_GAIN_3K":3000,
+                "POT_GAIN_30K":30000, "POT_GAIN_300K":300000,
+                "POT_GAIN_3M":3000000, "POT_GAIN_30M":30000000,
+                "POT_GAIN_100M":100000000},
+    # EEPROM trim [Ohm] added to the resistance of each gain if use_trims is set
+    'trims':{"POT_GAIN_100":'r100_trim', "POT_GAIN_3K":'r3k_trim', "POT_GAIN_30K":'r30k_trim',
+             "POT_GAIN_300K":'r300k_trim', "POT_GAIN_3M":'r3M_trim', "POT_GAIN_30M":'r30M_trim',
+             "POT_GAIN_100M":'r100M_trim'},
+    'use_trims':False,
+    # ADC: full scale code and reference voltage [V] at PGA gain 2
+    'adc_full_scale':8388607,
+    'adc_reference':2,
+    # DAC: code of 0 mV and mV per code
+    'dac_zero':32768,
+    'dac_mV_per_code':4096/65536,
+    }
+
+# columns calculated from other converted columns
+derived_columns = {'fbcurrent':('forwardcurrent', 'backwardcurrent')}
+potential_columns = ('potential',)
+current_columns = ('current', 'forwardcurrent', 'backwardcurrent')
+
+def conversion_metadata(PGA_gain, iv_gain, settings=None, calibration=None):
+    """
+    metadata saved with the raw codes of a scan
+    """
+
+    return {'PGA_gain':PGA_gain, 'iv_gain':iv_gain, 'settings':settings or {},
+            'calibration':calibration or default_calibration}
+
+def current_scale(metadata):
+    # factor to convert ADC codes to current [A]
+    calibration = dict(default_calibration, **metadata.get('calibration', {}))
+    iv_gain = metadata['iv_gain']
+    resistance = calibration['iv_gains'][iv_gain]
+    if calibration['use_trims'] and iv_gain in calibration['trims']:
+        resistance += metadata.get('settings', {}).get(calibration['trims'][iv_gain], 0)
+    return (calibration['adc_reference']/(metadata['PGA_gain']/2))/resistance/calibration['adc_full_scale']
+
+def convert(column, codes, metadata):
+    """
+    convert the raw codes of a column (potential, current, forwardcurrent, backwardcurrent)
+    """
+
+    if column in potential_columns:
+        calibration = dict(default_calibration, **metadata.get('calibration', {}))
+        return (codes.astype(np.float64) - calibration['dac_zero'])*calibration['dac_mV_per_code']
+    if column in current_columns:
+        return codes*current_scale(metadata)
+    raise KeyError(column)
+
+def load_calibration(file):
+    with open(file) as f:
+        return dict(default_calibration, **json.load(f))
+
+if __name__ == '__main__':
+    from time import perf_counter
+    from .scan_store import reprocess
+    if len(sys.argv) < 2:
+        print('usage: python3 -m kstat_interface.calibration <directory> [calibration.json]')
+        sys.exit(1)
+    calibration = load_calibration(sys.argv[2]) if len(sys.argv) > 2 else default_calibration
+    t = perf_counter()
+    n = reprocess(sys.argv[1], calibration)
+    print('{} scans reprocessed in {:.2f} s'.format(n, perf_counter() - t))
@@ -0,0 +1,207 @@
+# Storage of the interface configuration in redis
+# every component is stored as a hash config:<component> with one json encoded field per attribute,
+# every write adds an entry with the changed fields to the stream config_changes, so readers can
+# fetch only the fields that changed since the last entry they have seen
+# the id of every change entry is published on the channel config_notify, so readers can wait for
+# changes instead of polling
+# writes are executed by a lua script on the server, so concurrent writes from the backend,
+# measurement processes and the frontend are applied atomically one after the other without locks
+
+import json
+
+key_prefix = 'config:'
+changes_key = 'config_changes'
+notify_channel = 'config_notify'
+# number of change entries kept, readers that fell further behind load the whole config
+max_changes = 1000
+
+def _text(value):
+    if isinstance(value, bytes):
+        return value.decode()
+    return value
+
+# KEYS: change stream, one config hash per change
+# ARGV: maximum length of the change stream, notification channel, then for every change:
+#       component.attribute, attribute, operation, json encoded value
+# operations: set = set the value
+#             append_option, remove_option = add/remove an option {'label','value'} of a list of options,
+#             options are identified by their value, so appending an existing option replaces it
+_write_script = """
+-- XADD with an automatic id requires effects replication on redis < 5
+if redis.replicate_commands then redis.replicate_commands() end
+local changed = {}
+for i = 2, #KEYS do
+    local field, attribute, operation, value = unpack(ARGV, 4*i-5, 4*i-2)
+    if operation ~= 'set' then
+        local option = cjson.decode(value)
+        local options = cjson.decode(redis.call('HGET', KEYS[i], attribute) or '[]')
+        local kept = {}
+        for _, o in ipairs(options) do
+            if o['value'] ~= option['value'] then
+                table.insert(kept, o)
+            end
+        end
+        if operation == 'append_option' then
+            table.insert(kept, option)
+        end
+        -- empty tables are encoded as objects by cjson
+        if #kept == 0 then
+            value = '[]'
+        else
+            value = cjson.encode(kept)
+        end
+    end
+    redis.call('HSET', KEYS[i], attribute, value)
+    table.insert(changed, field)
+    table.insert(changed, '')
+end
+local change = redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[1], '*', unpack(changed))
+redis.call('PUBLISH', ARGV[2], change)
+return change
+"""
+_write = None
+
+def write_config(red, change_list):
+    """
+    write changes to the config atomically
+    change_list: list of changes {'component','attribute','value'} with optional 'operation'
+    ('set', 'append_option' or 'remove_option', see _write_script)
+    returns the id of the change entry
+    """
+
+    global _write
+    if _write is None:
+        _write = red.register_script(_write_script)
+    keys = [changes_key]
+    args = [max_changes, notify_channel]
+    for change in change_list:
+        keys.append(key_prefix + change['component'])
+        args += [change['component'] + '.' + change['attribute'], change['attribute'],
+                 change.get('operation', 'set'), json.dumps(change['value'])]
+    return _text(_write(keys=keys, args=args, client=red))
+
+def read_config(red, components=None):
+    """
+    load the config as dictionary {component:{attribute:value}}
+    components: list of components to load, all components if None
+    """
+
+    if components is None:
+        components = [_text(key)[len(key_prefix):] for key in red.scan_iter(match=key_prefix + '*')]
+    pipe = red.pipeline(transaction=False)
+    for component in components:
+        pipe.hgetall(key_prefix + component)
+    config = {}
+    for component, fields in zip(components, pipe.execute()):
+        config[component] = {_text(k):json.loads(v) for k, v in fields.items()}
+    return config
+
+def read_config_value(red, component, attribute):
+    value = red.hget(key_prefix + component, attribute)
+    if value is None:
+        raise KeyError(component + '.' + attribute)
+    return json.loads(value)
+
+def last_change(red):
+    """
+    id of the latest change of the config, None if the config was never changed
+    """
+
+    entries = red.xrevrange(changes_key, count=1)
+    if entries:
+        return _text(entries[0][0])
+    return None
+
+def read_changes(red, since):
+    """
+    load the fields changed after the change entry since
+    returns (id of the latest change, {component:{attribute:value}})
+    the complete config is returned if since is None or older than the kept change entries
+    """
+
+    if since is None:
+        return last_change(red), read_config(red)
+    # the entry since is included in the range, if it was trimmed from the stream changes may be missing
+    entries = red.xrange(changes_key, min=since)
+    if not entries or _text(entries[0][0]) != since:
+        return last_change(red), read_config(red)
+    entries = entries[1:]
+    if not entries:
+        return since, {}
+    fields = []
+    for entry_id, changed in entries:
+        for field in changed:
+            field = _text(field)
+            if field not in fields:
+                fields.append(field)
+    pipe = red.pipeline(transaction=False)
+    for field in fields:
+        component, attribute = field.split('.', 1)
+        pipe.hget(key_prefix + component, attribute)
+    config = {}
+    for field, value in zip(fields, pipe.execute()):
+        component, attribute = field.split('.', 1)
+        if value is not None:
+            config.setdefault(component, {})[attribute] = json.loads(value)
+    return _text(entries[-1][0]), config
+
+class ConfigListener():
+    """
+    subscription to the notifications of config changes
+    subscribe before reading the config so no change is missed in between
+    """
+
+    def __init__(self, red):
+        self.pubsub = red.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.subscribe(notify_channel)
+
+    def wait(self, timeout):
+        """
+        wait up to timeout seconds for a change
+        returns the id of the latest change notified, None if there was no change
+        """
+
+        change = None
+        message = self.pubsub.get_message(timeout=timeout)
+        while message is not None:
+            if message['type'] == 'message':
+                change = _text(message['data'])
+            # collect notifications that arrived in the meantime
+            message = self.pubsub.get_message(timeout=0)
+        return change
+
+    def listen(self):
+        # generator of the ids of all changes
+        for message in self.pubsub.listen():
+            if message['type'] == 'message':
+                yield _text(message['data'])
+
+    def close(self):
+        self.pubsub.close()
+
+def update_config_dict(config, changes):
+    # apply changes loaded with read_changes to a config dictionary
+    for component, fields in changes.items():
+        config.setdefault(component, {}).update(fields)
+    return config
+
+def initialize_config(red, initial_config, old_config=None):
+    """
+    add missing components and attributes of initial_config to the stored config
+    old_config: config in the previous format (single redisworks dictionary), migrated if no config is stored
+    """
+
+    stored = read_config(red)
+    if not stored and old_config:
+        print('migrating config')
+        stored = old_config
+        write_config(red, [{'component':c, 'attribute':a, 'value':v}
+                           for c, fields in old_config.items() for a, v in fields.items()])
+    missing = []
+    for component, fields in initial_config.items():
+        for attribute, value in fields.items():
+            if attribute not in stored.get(component, {}):
+                print('initializing', component, attribute)
+                missing.append({'component':component, 'attribute':attribute, 'value':value})
+    if missing:
+        write_config(red, missing)
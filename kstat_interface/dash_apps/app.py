@@ -15,6 +15,9 @@ from dash import no_update
 from glob import glob
 from redisworks import Root
 from .. import redis_config
+from .. import config_store
+from ..status import StatusPublisher
+from ..scan_store import scan_name
 from time import time,sleep
 
 redis_host,redis_port = redis_config.get_config()
@@ -45,28 +48,38 @@ app.index_string = '''
 
 # update individual paramaeters of config file
 # pass arguments as list of changes where every change is a dictionary
-# {'component','attribute','value'}
-from ast import literal_eval
+# {'component','attribute','value'}, lists of options can be changed with
+# {'component','attribute','operation':'append_option'/'remove_option','value':option}
+# only the changed fields are written atomically (see config_store), so concurrent writes don't
+# need to be retried, failed writes (lost connection) are retried a few times with short delays
+def write_config(change_list: list, retries=5):
+    for attempt in range(retries):
+        try:
+            return config_store.write_config(root.red, change_list)
+        except Exception as e:
+            print(e)
+            print("Couldn't write config, trying again.")
+            sleep(0.02*2**attempt)
+    return config_store.write_config(root.red, change_list)
 
-def write_config(change_list: list):
+# progress bars and their labels are sent through the status channel (see status.py)
+# e.g. set_status(scan_progress=50, scan_progress_label='Scan')
+status = StatusPublisher(root.red)
+def set_status(**fields):
     try:
-        root.flush()
-        config=literal_eval(str(root.config))
-        for element in change_list:
-            config[element['component']][element['attribute']] = element['value']
-        root.config = config
-        root.update_timestamp = time()
-        root.flush()
+        status.set(**fields)
     except Exception as e:
-        print(e)
-        print("Couldn't write config, trying again.")
-        sleep(1)
-        return write_config(change_list)
+        print("Couldn't send status.", e)
 
-# function for updating progress bar
-def make_scan_progress(t,max_t):
-    prog = (t/max_t)*100
-    write_config([{'component':'scan_progress','attribute':'value','value':prog}])
+# config changes adding the scans saved by a measurement (decoded scans with 'path') to the scan selector,
+# the last one is selected, nothing is added if no scan was saved (e.g. cancelled before the scan)
+def scan_options(scans):
+    paths = [scan['path'] for scan in scans if 'path' in scan]
+    changes = [{'component':'scan_selector','attribute':'options','operation':'append_option',
+                'value':{'label':scan_name(path),'value':path}} for path in paths]
+    if paths:
+        changes.append({'component':'scan_selector','attribute':'value','value':paths[-1]})
+    return changes
 
 # disable buttons for purging/stirring & file management during measurements
 def controls_disabled(off):
@@ -80,4 +93,5 @@ def controls_disabled(off):
                   {'component':'download_button','attribute':'disabled','value':off},
                   {'component':'start_button','attribute':'disabled','value':off},
                   {'component':'stop_button','attribute':'disabled','value':on},
+                  {'component':'job_queue_button','attribute':'disabled','value':off},
                   {'component':'change_directory_button','attribute':'disabled','value':off},])
@@ -0,0 +1,47 @@
+// Server push of changes to the interface (Server-Sent Events, see push.py)
+// every event clicks the hidden button of its channel, which triggers the Dash callback reading the change
+// the state button is clicked when the connection opens or fails to switch the polling fallback off or on
+(function() {
+    window.kstat_push = {connected: false};
+
+    function click(id) {
+        var button = document.getElementById(id);
+        if (button) {
+            button.click();
+        }
+    }
+
+    function connect() {
+        var source = new EventSource('/events');
+        source.onopen = function() {
+            window.kstat_push.connected = true;
+            click('push_state');
+        };
+        // the browser reconnects by itself, polling is used until then
+        source.onerror = function() {
+            if (window.kstat_push.connected) {
+                window.kstat_push.connected = false;
+                click('push_state');
+            }
+        };
+        ['config', 'status', 'live', 'jobs'].forEach(function(channel) {
+            source.addEventListener(channel, function() {
+                click('push_' + channel);
+            });
+        });
+    }
+
+    // the layout is rendered by Dash after the page loaded
+    function wait_for_layout() {
+        if (!window.EventSource) {
+            return;
+        }
+        if (document.getElementById('push_state')) {
+            connect();
+        } else {
+            setTimeout(wait_for_layout, 200);
+        }
+    }
+
+    window.addEventListener('load', wait_for_layout);
+})();
@@ -18,6 +18,7 @@ from dash import no_update
 from glob import glob
 from redisworks import Root
 from .. import redis_config
+from .. import scan_store, directory_index
 from .app import app, write_config
 
 redis_host,redis_port = redis_config.get_config()
@@ -189,15 +190,6 @@ def directory_and_scan_selection():
             )    
         ])
 
-@app.callback(
-    Output('voltammogram_graph_file6','data'),
-    [Input('theme_switch','on')])
-def change_plot_theme(on):
-    if on != None:
-        return time()
-    else:
-        raise PreventUpdate
-
 @app.callback(
     [Output('scan_selector_value_update_acknowledged','data'),
      Output('voltammogram_graph_file','data'),
@@ -233,7 +225,7 @@ def update_dropdowns(update_dirs,update_files,initialize_files,new_dir,delete_fi
     trigger_id = ctx.triggered[0]['prop_id'].split('.')[0]
     
     root.flush()
-    directory_list = glob('{}*/'.format(root.working_directory))
+    directory_list = directory_index.list_directories(str(root.working_directory))
 	#don't allow user to go higher than the base data directory
     print(root.working_directory,root.data_directory)
     if root.working_directory != root.data_directory:
@@ -248,20 +240,38 @@ def update_dropdowns(update_dirs,update_files,initialize_files,new_dir,delete_fi
         directory_options.append({'label':label,'value':directory})
     directory_options.sort(key=label_sort)
     
-	#generate list of csv files for scan selector
-    file_list = glob('{}*.csv'.format(root.working_directory))
+	#generate list of scans for scan selector
+    file_list = directory_index.list_scans(str(root.working_directory))
     file_options = []
     for file in file_list:
-        label=file.replace(str(root.working_directory),'').replace('.csv','')
+        label=scan_store.scan_name(file)
         file_options.append({'label':label,'value':file})
     file_options.sort(key=label_sort)
     
-    write_config([{'component':'scan_selector','attribute':'options','value':file_options}])
+    # the scan selector gets the whole list when the working directory changed or the page was loaded,
+    # added and deleted scans are sent one by one by push_scan_options
+    if trigger_id in ['working_directory_update','files_initialization']:
+        write_config([{'component':'scan_selector','attribute':'options','value':file_options}])
     
     label=str(root.working_directory).replace(str(root.parent_directory),'').strip('/')
     
     return[directory_options, file_options, label]
 
+# called by the directory index for scans added to or removed from a directory,
+# only the changed options of the scan selector are written if it shows that directory
+def push_scan_options(directory, added, removed):
+    root.flush()
+    if directory != str(root.working_directory):
+        return
+    changes = []
+    for file in removed:
+        changes.append({'component':'scan_selector','attribute':'options','operation':'remove_option',
+                        'value':{'label':scan_store.scan_name(file),'value':file}})
+    for file in added:
+        changes.append({'component':'scan_selector','attribute':'options','operation':'append_option',
+                        'value':{'label':scan_store.scan_name(file),'value':file}})
+    write_config(changes)
+
 # function for alphatical sorting of file/directory lists by label
 def label_sort(option_dict):
     return option_dict['label']
@@ -410,6 +420,7 @@ def createDir(dir):
         dir = root.working_directory + dir + '/'
         if not os.path.exists(dir):
             os.mkdir(dir)
+        directory_index.directory_added(dir)
         return time()
     else:
         raise PreventUpdate
@@ -437,6 +448,7 @@ def deleteDirectory(n_clicks):
         root.flush()
         if os.path.exists(str(root.working_directory)):
             shutil.rmtree(str(root.working_directory))
+            directory_index.directory_removed(str(root.working_directory))
             p_dir = str(root.working_directory).rstrip('/')
             root.working_directory = p_dir[0:p_dir.rfind('/')+1]
             root.flush()
@@ -460,14 +472,8 @@ def openDeleteFilesBox(n_clicks):
 def deleteFiles(n_clicks,files):
     if n_clicks != None:
         for file in files:
-            file_parameters=file.replace('.csv','')+'-parameters.txt'
-            file_plot=file.replace('.csv','')+'.png'
-            if os.path.exists(file):
-                os.remove(file)
-            if os.path.exists(file_parameters):
-                os.remove(file_parameters)
-            if os.path.exists(file_plot):
-                os.remove(file_plot)
+            scan_store.delete_scan(file)
+            directory_index.scan_removed(file)
         return time()
     else:
         raise PreventUpdate
@@ -513,7 +519,7 @@ def open_close_download_popup(placeholder1,placeholder2):
         
     if trigger_id == 'download_popup_placeholder1':
         root.flush()
-        directory_list = glob('{}*/'.format(root.working_directory))
+        directory_list = directory_index.list_directories(str(root.working_directory))
         
         #generate list of subdirectories in current working directory
         directory_options=[]
@@ -522,11 +528,11 @@ def open_close_download_popup(placeholder1,placeholder2):
             label = u"\U0001F5C1" + " " + label
             directory_options.append({'label':label,'value':directory})
         
-        #generate list of csv files for scan selector
-        file_list = glob('{}*.csv'.format(root.working_directory))
+        #generate list of scans for download
+        file_list = directory_index.list_scans(str(root.working_directory))
         file_options = []
         for file in file_list:
-            label=file.replace(str(root.working_directory),'').replace('.csv','')
+            label=scan_store.scan_name(file)
             file_options.append({'label':label,'value':file})
         
         label=str(root.working_directory).replace(str(root.parent_directory),'').strip('/')
@@ -588,7 +594,8 @@ def downloadDirectory(n_clicks):
     if n_clicks != None:
         filename=(str(root.working_directory).rstrip('/'))
         filename=filename[filename.rfind('/')+1:]
-        shutil.make_archive(str(root.download_directory)+filename, 'zip', str(root.working_directory))
+        # scans are exported as csv files
+        scan_store.archive_directory(str(root.working_directory), str(root.download_directory)+filename+'.zip')
         return ['open',filename+'.zip']
     else:
         raise PreventUpdate
@@ -606,17 +613,8 @@ def downloadFiles(n_clicks,files):
         filename=str(root.download_directory)+only_filename
         zipObj = ZipFile(filename, 'w')
         for file in files:
-            file_parameters=file.replace('.csv','')+'-parameters.txt'
-            file_peaks=file.replace('.csv','')+'-peaks.txt'
-            file_plot=file.replace('.csv','')+'.png'
-            if os.path.exists(file):
-                zipObj.write(file,file[file.rfind('/')+1:])
-            if os.path.exists(file_parameters):
-                zipObj.write(file_parameters,file_parameters[file_parameters.rfind('/')+1:])
-            if os.path.exists(file_plot):
-                zipObj.write(file_plot,file_plot[file_plot.rfind('/')+1:])
-            if os.path.exists(file_peaks):
-                zipObj.write(file_peaks,file_peaks[file_peaks.rfind('/')+1:])
+            # csv, parameters, peaks and plot of every scan
+            scan_store.add_to_zip(zipObj, file)
         zipObj.close()
         return ['open',only_filename]
     else:
@@ -694,6 +692,12 @@ def uploadFile(contents,filenames):
             filename = filenames[i]
             with open(os.path.join(str(root.working_directory), filename), 'wb') as f:
                 f.write(base64.b64decode(content_string))
+        # uploaded csv scans are converted to the binary format once their parameters are uploaded as well
+        for filename in filenames:
+            file = os.path.join(str(root.working_directory), filename)
+            if scan_store.is_scan(file):
+                directory_index.scan_added(scan_store.import_csv(file))
+                os.remove(file)
         return 'close'
     else:
         raise PreventUpdate
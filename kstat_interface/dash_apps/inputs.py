@@ -587,7 +587,7 @@ def samplefreq():
                     {'label':'500 Hz','value':'500Hz'},
                     {'label':'1 KHz','value':'1KHz'},
                     {'label':'2 KHz','value':'2KHz'},
-                    {'label':'3.75 KHz','value':'3.75Hz'},
+                    {'label':'3.75 KHz','value':'3.75KHz'},
                     {'label':'7.5 KHz','value':'7.5KHz'},
                     {'label':'15 KHz','value':'15KHz'},
                     {'label':'30 KHz','value':'30KHz'}
@@ -869,5 +869,113 @@ def update_n_electrode_tests(value, update, update_acknowledged):
         write_config([{'component':'n_electrode_tests_input',
                        'attribute':'value','value':value}])
         raise PreventUpdate
+    else:
+        return update
+
+# relative change between consecutive test scans below which the electrode is considered stable
+# 0 runs the full number of test scans
+def electrode_test_tolerance():
+    return html.Div(id='electrode_test_tolerance_input_container',
+        className='centered_row',
+        children=[
+            dcc.Input(id='electrode_test_tolerance_input',
+                type='number',
+                min=0,
+                max=100,
+                debounce=True,
+                style={'backgroundColor':'transparent','color':'rgb(200, 200, 200)','width':'65px'}
+                ),
+            dbc.Tooltip('stop the test series when peak height, peak position and scan change less than this between 3 consecutive scans (0 = run all test scans)',
+                target='electrode_test_tolerance_input'),
+            dcc.Store(id='electrode_test_tolerance_input_value_update', data=1),
+            dcc.Store(id='electrode_test_tolerance_input_value_update_acknowledged', data=2),
+            html.Div(style={'width':'10px'}),
+            html.Label(htmlFor='electrode_test_tolerance_input',
+                       children=['Test',html.Br(),'Tolerance [%]'],
+                       style={'width':'110px'}
+                       ),
+            ]
+        )
+@app.callback(
+    Output('electrode_test_tolerance_input_value_update_acknowledged','data'),
+    [Input('electrode_test_tolerance_input','value')],
+    [State('electrode_test_tolerance_input_value_update','data'),
+     State('electrode_test_tolerance_input_value_update_acknowledged','data')])
+def update_electrode_test_tolerance(value, update, update_acknowledged):
+    if update == update_acknowledged:
+        write_config([{'component':'electrode_test_tolerance_input',
+                       'attribute':'value','value':value}])
+        raise PreventUpdate
+    else:
+        return update
+
+def n_additions():
+    return html.Div(id='n_additions_input_container',
+        className='centered_row',
+        children=[
+            html.Div(
+                style={'width':'65px'},
+                children=daq.DarkThemeProvider(
+                    theme=light_theme,
+                    children=daq.NumericInput(
+                        id='n_additions_input',
+                        min=1,
+                        max=20,
+                        size=65
+                        )
+                    )
+                ),
+            dcc.Store(id='n_additions_input_value_update', data=1),
+            dcc.Store(id='n_additions_input_value_update_acknowledged', data=2),
+            html.Div(style={'width':'10px'}),
+            html.Label(htmlFor='n_additions_input',
+                       children=['Standard',html.Br(),'Additions'],
+                       style={'width':'110px'}
+                       ),
+            ]
+        )
+@app.callback(
+    Output('n_additions_input_value_update_acknowledged','data'),
+    [Input('n_additions_input','value')],
+    [State('n_additions_input_value_update','data'),
+     State('n_additions_input_value_update_acknowledged','data')])
+def update_n_additions(value, update, update_acknowledged):
+    if update == update_acknowledged:
+        write_config([{'component':'n_additions_input',
+                       'attribute':'value','value':value}])
+        raise PreventUpdate
+    else:
+        return update
+
+# concentration added with every standard addition (in the concentration unit of the result)
+def addition_concentration():
+    return html.Div(id='addition_concentration_input_container',
+        className='centered_row',
+        children=[
+            dcc.Input(id='addition_concentration_input',
+                type='number',
+                min=0,
+                debounce=True,
+                style={'backgroundColor':'transparent','color':'rgb(200, 200, 200)','width':'65px'}
+                ),
+            dcc.Store(id='addition_concentration_input_value_update', data=1),
+            dcc.Store(id='addition_concentration_input_value_update_acknowledged', data=2),
+            html.Div(style={'width':'10px'}),
+            html.Label(htmlFor='addition_concentration_input',
+                       children=['Added Conc.',html.Br(),'per Addition'],
+                       style={'width':'110px'}
+                       ),
+            ]
+        )
+@app.callback(
+    Output('addition_concentration_input_value_update_acknowledged','data'),
+    [Input('addition_concentration_input','value')],
+    [State('addition_concentration_input_value_update','data'),
+     State('addition_concentration_input_value_update_acknowledged','data')])
+def update_addition_concentration(value, update, update_acknowledged):
+    if update == update_acknowledged:
+        write_config([{'component':'addition_concentration_input',
+                       'attribute':'value','value':value}])
+        raise PreventUpdate
     else:
         return update
\ No newline at end of file
@@ -0,0 +1,157 @@
+# GUI Frontend for the KStat electrochemical analyzer
+# Job queue: series of measurements (method + measurement id) that are run back to back by the backend
+# jobs are stored in redis (see kstat_interface/job_queue.py), so they can be added, reordered
+# and removed while the queue is running
+# using Dash by Plotly (MIT licensed)
+
+import dash
+import dash_core_components as dcc
+import dash_html_components as html
+import dash_bootstrap_components as dbc
+from dash.dependencies import Input, Output, State, ALL
+from dash.exceptions import PreventUpdate
+from dash import no_update
+from time import time
+from redisworks import Root
+from glob import glob
+import json
+from .app import app, write_config
+from .. import redis_config
+from .. import job_queue as queue
+
+redis_host,redis_port = redis_config.get_config()
+root = Root(host=redis_host, port=redis_port, db=0)
+
+def job_queue():
+    return html.Div(id='job_queue_container',
+        style={'width':'100%'},
+        children=[
+            dcc.Interval(id='job_queue_interval', interval=1000, n_intervals=0),
+            # version of the queue shown in the list
+            dcc.Store(id='job_queue_version', data=-1),
+            dcc.Store(id='job_queue_changed1'),
+            dcc.Store(id='job_queue_changed2'),
+            dcc.Store(id='job_queue_button_placeholder'),
+            html.Div(
+                className='centered_row',
+                children=[
+                    dcc.Dropdown(id='job_queue_method_dropdown',
+                        style={'width':'100%','color':'black'},
+                        placeholder='Method',
+                        clearable=False),
+                    html.Div(style={'width':'100%','height':'10px'}),
+                    dcc.Input(id='job_queue_measurement_id',
+                        style={'width':'30%'},
+                        type='text',
+                        placeholder='Measurement ID'),
+                    html.Div(style={'width':'5%'}),
+                    html.Button(id='job_queue_add_button',
+                        children='Add Job',
+                        style={'width':'30%'}),
+                    html.Div(style={'width':'5%'}),
+                    html.Button(id='job_queue_button',
+                        children='Run Queue',
+                        style={'width':'30%'}),
+                    ]),
+            html.Div(style={'height':'10px'}),
+            html.Div(id='job_queue_list'),
+            ]
+        )
+
+def job_row(job, running=False):
+    if running:
+        buttons = [html.Div(style={'width':'30%'}, children='running')]
+    else:
+        buttons = [
+            html.Button(id={'type':'job_queue_up','index':job['id']}, children='Up', style={'width':'10%'}),
+            html.Div(style={'width':'1%'}),
+            html.Button(id={'type':'job_queue_down','index':job['id']}, children='Down', style={'width':'10%'}),
+            html.Div(style={'width':'1%'}),
+            html.Button(id={'type':'job_queue_remove','index':job['id']}, children='Remove', style={'width':'10%'}),
+            ]
+    return html.Div(
+        className='centered_row',
+        children=[
+            html.Div(style={'width':'34%'}, children=job['measurement_id']),
+            html.Div(style={'width':'34%'}, children=job['method']),
+            ] + buttons)
+
+def method_options():
+    method_list = []
+    for method_file in sorted(glob('{}*.txt'.format(root.methods_directory))):
+        method_list.append({'label':(method_file.replace(str((root.methods_directory)),'')).replace('.txt',''),'value':method_file})
+    return method_list
+
+# add the selected method with the measurement id to the end of the queue
+@app.callback(
+    Output('job_queue_changed1','data'),
+    [Input('job_queue_add_button','n_clicks')],
+    [State('job_queue_method_dropdown','value'),
+     State('job_queue_measurement_id','value')])
+def add_job(n_clicks, method, id):
+    if n_clicks != None and method != None and id != None and id != '':
+        queue.add_job(root.red, method, id)
+        return time()
+    else:
+        raise PreventUpdate
+
+# reorder and remove waiting jobs
+@app.callback(
+    Output('job_queue_changed2','data'),
+    [Input({'type':'job_queue_up','index':ALL},'n_clicks'),
+     Input({'type':'job_queue_down','index':ALL},'n_clicks'),
+     Input({'type':'job_queue_remove','index':ALL},'n_clicks')])
+def edit_job(up, down, remove):
+    ctx = dash.callback_context
+    if not ctx.triggered or ctx.triggered[0]['value'] is None:
+        raise PreventUpdate
+    trigger = json.loads(ctx.triggered[0]['prop_id'].rsplit('.', 1)[0])
+    if trigger['type'] == 'job_queue_up':
+        queue.move_job(root.red, trigger['index'], -1)
+    elif trigger['type'] == 'job_queue_down':
+        queue.move_job(root.red, trigger['index'], 1)
+    elif trigger['type'] == 'job_queue_remove':
+        queue.remove_job(root.red, trigger['index'])
+    return time()
+
+# the backend starts the worker on the queue, like a measurement started with the start button
+@app.callback(
+    Output('job_queue_button_placeholder','data'),
+    [Input('job_queue_button','n_clicks')])
+def start_job_queue(n_clicks):
+    if n_clicks != None:
+        write_config([{'component':'job_queue_button','attribute':'triggered','value':True},
+                      {'component':'job_queue_button','attribute':'disabled','value':True}])
+    raise PreventUpdate
+
+# the list is only rendered again if the queue or the available methods changed
+@app.callback(
+    [Output('job_queue_list','children'),
+     Output('job_queue_version','data'),
+     Output('job_queue_method_dropdown','options')],
+    [Input('job_queue_interval','n_intervals'),
+     Input('push_jobs','n_clicks'),
+     Input('job_queue_changed1','data'),
+     Input('job_queue_changed2','data')],
+    [State('job_queue_version','data'),
+     State('job_queue_method_dropdown','options')])
+def update_job_list(n_intervals, pushed, changed1, changed2, version, options):
+    try:
+        new_version = queue.queue_version(root.red)
+        methods = method_options()
+    except Exception as e:
+        print("Couldn't load job queue.", e)
+        raise PreventUpdate
+    if methods == options:
+        methods = no_update
+    if new_version == version:
+        if methods is no_update:
+            raise PreventUpdate
+        return [no_update, no_update, methods]
+    rows = []
+    running = queue.running_job(root.red)
+    if running is not None:
+        rows.append(job_row(running, running=True))
+    for job in queue.list_jobs(root.red):
+        rows.append(job_row(job))
+    return [rows, new_version, methods]
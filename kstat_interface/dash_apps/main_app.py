@@ -23,6 +23,7 @@ from .controls import *
 from .inputs import *
 from .program_selection import *
 from .stopandgo import *
+from .job_queue import job_queue
 from .plotting import plot_scan
 from .scan_parameters import scan_parameters
 import pandas as pd
@@ -63,6 +64,7 @@ def main():
                     children=[
                         start(),
                         stop(),
+                        addition_prompt(),
                         ]
                     ),
                 html.Div(style={'height':'10px'}),
@@ -85,6 +87,15 @@ def main():
                 ]
             ),
             
+        html.Div(id='job_queue',
+            className='sub_program',
+            style={'width':'100%'},
+            children=[
+                html.H5('Job Queue'),
+                job_queue(),
+                ]
+            ),
+            
         html.Div(id='scan_settings',
             className='sub_program',
             children=[
@@ -122,6 +133,9 @@ def main():
                         plating_potential(),
                         comment(),
                         n_electrode_tests(),
+                        electrode_test_tolerance(),
+                        n_additions(),
+                        addition_concentration(),
                         ]
                     )
             ]
@@ -13,15 +13,22 @@ from dash.dependencies import Input, Output, State
 from dash.exceptions import PreventUpdate
 from dash import no_update
 from time import time,sleep
+from collections import OrderedDict
+from threading import Lock
 from redisworks import Root
-from ast import literal_eval
+from ..config_store import read_config
 import json
 from .app import app, write_config
 from .. import redis_config
-from scipy import signal
-from numpy import mean, abs
+from ..live_scan import read_live_scan, read_live_scan_range, latest_live_scan, newer_id
+from ..scan_store import open_scan, scan_name, scan_base
+from .. import scan_catalog
+from ..derived_cache import cache, content_hash
+from ..decimation import decimate, lttb
+from ..noise_filter import notch_filter
+from numpy import abs
 import pandas as pd
-import peakutils as pu
+from .. import peaks
 
 redis_host,redis_port = redis_config.get_config()
 root = Root(host=redis_host, port=redis_port, db=0)
@@ -86,47 +93,321 @@ def plot_scan():
             dcc.Store(id='voltammogram_graph_file3'),
             dcc.Store(id='voltammogram_graph_file4'),
             dcc.Store(id='voltammogram_graph_file5'),
-            dcc.Store(id='voltammogram_graph_file6'),
             dcc.Store(id='voltammogram_graph_file7'),
+            dcc.Store(id='voltammogram_trace'),
+            dcc.Store(id='voltammogram_trace_key'),
+            dcc.Store(id='voltammogram_analysis'),
+            dcc.Store(id='voltammogram_analysis_key'),
+            dcc.Store(id='voltammogram_clicks'),
+            dcc.Store(id='voltammogram_view'),
+            dcc.Store(id='voltammogram_themes',data={'default':default_theme,'download':download_theme}),
             dcc.Store(id='voltammogram_point1',data='no point'),
             dcc.Store(id='voltammogram_point2',data='no point'),
             dcc.Store(id='clear_points'),
             dcc.Store(id='scan_settings_storage'),
             dcc.Store(id='copy_settings_placeholder'),
+            dcc.Interval(id='live_scan_interval',interval=500),
+            dcc.Store(id='live_scan_last_id'),
+            dcc.Store(id='live_scan_start'),
+            dcc.Store(id='live_scan_view'),
             ]
         )
    
+# the voltammogram is composed in the browser (compose_voltammogram) from three stores, so only the parts
+# that changed are sent: the trace of the scan, the analysis (baseline, peaks) and the clicked points
+# voltammogram_trace_key and voltammogram_analysis_key identify the parts shown in the browser
+# the trace is decimated to the width of the graph and decimated again when the user zooms in
+# (voltammogram_view), peaks and clicked points are determined with all data points
 @app.callback(
-    [Output('voltammogram_graph','figure'),
+    [Output('voltammogram_trace','data'),
+     Output('voltammogram_trace_key','data'),
+     Output('voltammogram_analysis','data'),
+     Output('voltammogram_analysis_key','data'),
+     Output('voltammogram_clicks','data'),
      Output('voltammogram_graph','config'),
      Output('scan_parameters_collapse','children'),
      Output('noise_filter_container','style'),
      Output('peak_file_data','data'),
-     Output('scan_settings_storage','data')],
+     Output('scan_settings_storage','data'),
+     Output('live_scan_view','data')],
     [Input('voltammogram_graph_file2','modified_timestamp'),
      Input('voltammogram_graph_file3','modified_timestamp'),
      Input('voltammogram_graph_file4','modified_timestamp'),
      Input('voltammogram_graph_file5','modified_timestamp'),
-     Input('voltammogram_graph_file6','modified_timestamp'),
-     Input('voltammogram_graph_file7','modified_timestamp')],
+     Input('voltammogram_graph_file7','modified_timestamp'),
+     Input('live_scan_start','data'),
+     Input('voltammogram_view','data')],
     [State('voltammogram_graph_file','data'),
      State('voltammogram_point1','data'),
      State('voltammogram_point2','data'),
      State('voltammogram_graph','config'),
-     State('theme_switch','on')])
-def update_plot_scan(file2,file3,file4,file5,file6,file7,file,point1,point2,graph_config,theme_switch):
+     State('voltammogram_trace_key','data'),
+     State('voltammogram_analysis_key','data')])
+def update_plot_scan(file2,file3,file4,file5,file7,live_start,view,file,point1,point2,graph_config,trace_key,analysis_key):
     ctx = dash.callback_context
     if ctx.triggered[0]['value'] is None:
         raise PreventUpdate
     trigger_id = ctx.triggered[0]['prop_id'].split('.')[0]
     
+    # the live voltammogram isn't decimated
+    if trigger_id == 'voltammogram_view' and (file in [None,''] or str(trace_key).startswith('live')):
+        raise PreventUpdate
+    
+    # new measurement started: show the points received so far, further points are added by update_live_scan
+    if trigger_id == 'live_scan_start':
+        graph_title = live_start['label'].replace(str(root.working_directory),'') + ' (live)'
+        potential = []
+        current = []
+        last_id = live_start['id']
+        for entry_id, fields in read_live_scan_range(root.red,live_start['id']):
+            last_id = entry_id
+            if fields['event'] == 'points':
+                potential += json.loads(fields['potential'])
+                current += json.loads(fields['current'])
+        # the current is filtered causally while scanning, the saved scan is filtered without phase shift
+        name = 'current'
+        if live_start.get('noise_filter'):
+            name = 'current ({:g} Hz filtered)'.format(float(live_start['noise_filter']))
+        trace = {'data':[{'x':potential,'y':current,'meta':'current','name':name}],
+                 'layouts':scan_layouts(graph_title,live_start['id'])}
+        return [trace,'live '+live_start['id'],{'data':[]},None,{'data':[]},
+                no_update,'',no_update,'','',{'start':live_start['id'],'last':last_id}]
+    
     if file == None:
         raise PreventUpdate
-    if theme_switch:
-        theme = download_theme
+    graph_title = scan_name(file)
+    
+    if file == '':
+        return [{'data':[],'layouts':scan_layouts(graph_title,file7)},'',{'data':[]},None,{'data':[]},
+                no_update,'',no_update,'','',None]
+    
+    params,scan_settings = get_parameters(file)
+    # columns are memory mapped, derived data (filtered current, baseline) are kept in the derived data cache
+    scan = open_scan(file)
+    config = read_config(root.red, ['noise_filter_button','noise_frequency_input','peak_detection_switch',
+                                    'baseline_switch','baseline_polynomial_input','peak_threshold_input',
+                                    'peak_threshold_range','peak_distance_input','peak_width_input'])
+    
+    if params['type']['value'] in ['Cyclic Voltammetry','Linear Sweep Voltammetry']:
+        noise_filter = {'display':'flex','alignItems':'center'}
+        source = {'column':'current'}
+        if config['noise_filter_button']['children'] == 'Noise Filter On':
+            source = {'column':'current','noise_frequency':config['noise_frequency_input']['value'],
+                      'samplerate':params['Samplerate']['value']}
+    else:
+        noise_filter = {'display':'none'}
+        source = {'column':'fbcurrent'}
+    
+    scan_key = json.dumps([file, content_hash(scan, cache.hashes), source])
+    x_data, y_data = cached_figure(scan_key, lambda: scan_trace(scan, source))
+    
+    # about two points per pixel, the zoomed range only applies to the scan it was selected on
+    n_points = max(500, 2*view['width']) if view else 2000
+    try:
+        shown = json.loads(trace_key)
+    except (TypeError, ValueError):
+        shown = {}
+    x_range = view['x_range'] if view and shown.get('scan') == scan_key else None
+    new_trace_key = json.dumps({'scan':scan_key,'points':n_points,'x_range':x_range})
+    
+    if config['peak_detection_switch']['on']:
+        settings = {'baseline_polynomial':config['baseline_polynomial_input']['value'],
+                    'peak_threshold':config['peak_threshold_input']['value']/config['peak_threshold_range']['value'],
+                    'peak_distance':config['peak_distance_input']['value'],
+                    'peak_width':config['peak_width_input']['value'],
+                    'baseline':config['baseline_switch']['on']}
+    else:
+        settings = None
+    new_analysis_key = json.dumps([scan_key, settings])
+    analysis = cached_figure(new_analysis_key,
+                             lambda: peak_analysis(scan, source, x_data, y_data, settings, graph_title))
+    
+    clicks, manual_peaks = click_traces(x_data, y_data, point1, point2, graph_title)
+    if not config['peak_detection_switch']['on'] and point1 == 'no point':
+        peakfile = ''
+    else:
+        peakfile = [scan_base(file) + '-peaks.txt',
+                    'ID,Detection Mode,Peak Potential [mV],Peak Current [A],\n' + analysis['peaks'] + manual_peaks]
+    
+    # trace and analysis are only sent if they differ from the ones shown
+    if new_trace_key == trace_key:
+        trace = no_update
     else:
-        theme = default_theme
-    graph_title = file.replace(str(root.working_directory),'').replace('.csv','')
+        indices = cached_figure(new_trace_key, lambda: decimate(x_data.values, y_data.values, n_points, x_range))
+        # customdata are the indices of the points in the full data, used by catch_click
+        trace = {'data':[{'x':x_data.values[indices],'y':y_data.values[indices],'customdata':indices,
+                          'meta':'current','name':'current'}],
+                 'layouts':scan_layouts(graph_title,file7)}
+    if shown.get('scan') == scan_key:
+        graph_config = collapse_params = noise_filter = scan_settings = no_update
+    else:
+        collapse_params = generate_param_components(params)
+        graph_config['toImageButtonOptions'] = {'format':'png','filename':graph_title,'width':900,'height':600,'scale':2}
+    analysis_data = no_update if new_analysis_key == analysis_key else {'data':analysis['data']}
+    
+    return [trace,new_trace_key,analysis_data,new_analysis_key,{'data':clicks},
+            graph_config,collapse_params,noise_filter,peakfile,scan_settings,None]
+
+# processed scans: (potential, current) of a trace and the analysis of a trace,
+# identified by the scan data and the processing parameters
+figure_cache = OrderedDict()
+figure_cache_size = 16
+figure_cache_lock = Lock()
+
+def cached_figure(key, compute):
+    with figure_cache_lock:
+        if key in figure_cache:
+            figure_cache.move_to_end(key)
+            return figure_cache[key]
+    value = compute()
+    with figure_cache_lock:
+        figure_cache[key] = value
+        while len(figure_cache) > figure_cache_size:
+            figure_cache.popitem(last=False)
+    return value
+
+def scan_trace(scan, source):
+    x_data = pd.Series(scan['potential'])
+    if 'noise_frequency' in source:
+        y_data = pd.Series(cache.get(scan, 'notch_filter', source,
+            lambda: notch_filter(scan['current'],source['samplerate'],source['noise_frequency'])))
+    else:
+        y_data = pd.Series(scan[source['column']])
+    return x_data, y_data
+
+def peak_analysis(scan, source, x_data, y_data, settings, graph_title):
+    """
+    automatic peak detection, returns the traces of the peaks (and baseline) and the lines of the peak file
+    """
+
+    if settings is None:
+        return {'data':[], 'peaks':''}
+    # the baseline is kept in the derived data cache, peak parameter changes only repeat the detection
+    def baseline(y_scaled, scale_factor):
+        return cache.get(scan, 'baseline',
+                         {'source':source,'polynomial':settings['baseline_polynomial'],'scale_factor':scale_factor},
+                         lambda: peaks.polynomial_baseline(y_scaled, settings['baseline_polynomial']))
+    indices, peak_heights, base, scale_factor = peaks.detect(x_data.values, y_data.values, settings, baseline)
+    peaks_x = x_data.values[indices]
+    peaks_y = y_data.values[indices]
+    peaks_labels = []
+    lines = ''
+    for i in range(len(peaks_x)):
+        peaks_labels.append('{0:.0f} mV<br>{1:.2E} A'.format(peaks_x[i],peak_heights[i]))
+        lines = lines + '{},automatic,{:.0f},{:.2E},\n'.format(graph_title,peaks_x[i],peak_heights[i])
+    # customdata: indices in the full data like the decimated scan trace (see catch_click)
+    data = [{'x':peaks_x,'y':peaks_y,'customdata':indices,
+             'mode':'markers+text',
+             'meta':'peak',
+             'text':peaks_labels,
+             'textposition':'top center',
+             'name':'peak'}]
+    if settings['baseline']:
+        # the baseline is smooth, a decimated line looks the same
+        shown = lttb(x_data.values, base, 1000)
+        data.append({'x':x_data.values[shown],'y':base[shown]*scale_factor,'customdata':shown,
+                     'meta':'baseline',
+                     'name':'baseline'})
+    return {'data':data, 'peaks':lines}
+
+def click_traces(x_data, y_data, point1, point2, graph_title):
+    """
+    traces of the manually selected points, returns the traces and the line of the peak file
+    """
+
+    if point1 == 'no point':
+        return [], ''
+    points = [point1]
+    if point2 != 'no point':
+        points.append(point2)
+    x_points = x_data.iloc[points]
+    y_points = y_data.iloc[points]
+    data = [{'x':x_points,'y':y_points,
+             'mode':'markers+text',
+             'meta':'click',
+             'name':'click'}]
+    if point2 == 'no point':
+        return data, ''
+    # lines to connect points and show horizontal and vertical distance
+    v_diff = abs(x_points.iloc[0]-x_points.iloc[1])
+    i_diff = abs(y_points.iloc[0]-y_points.iloc[1])
+    data.append({'x':[x_points.iloc[0],x_points.iloc[1],x_points.iloc[1]],
+                 'y':[y_points.iloc[0],y_points.iloc[0],y_points.iloc[1]],
+                 'mode':'lines','meta':'click'})
+    data.append({'x':[x_points.iloc[0]+((x_points.iloc[1]-x_points.iloc[0])/2),x_points.iloc[1]],
+                 'y':[y_points.iloc[0],y_points.iloc[0]+((y_points.iloc[1]-y_points.iloc[0])/2)],
+                 'text':['{:.0f} mV'.format(v_diff),'{:.2E} A'.format(i_diff)],
+                 'mode':'text','meta':'click',
+                 'textposition':['bottom center','middle right'],})
+    return data, '{},manual,{:.0f},{:.2E},\n'.format(graph_title,x_points.iloc[1],i_diff)
+
+# size of the graph and visible potential range, changed when the user zooms or the window is resized
+# the width is rounded to 100 px, so resizing doesn't request a new trace for every pixel
+app.clientside_callback(
+    """
+    function(relayout, view) {
+        var graph = document.getElementById('voltammogram_graph');
+        var width = graph ? Math.ceil(graph.clientWidth/100)*100 : 1000;
+        var x_range = view ? view['x_range'] : null;
+        if (relayout) {
+            if ('xaxis.range[0]' in relayout) {
+                x_range = [relayout['xaxis.range[0]'], relayout['xaxis.range[1]']];
+            } else if ('xaxis.range' in relayout) {
+                x_range = relayout['xaxis.range'];
+            } else if ('xaxis.autorange' in relayout) {
+                x_range = null;
+            }
+        }
+        if (view && view['width'] == width && JSON.stringify(view['x_range']) == JSON.stringify(x_range)) {
+            return window.dash_clientside.no_update;
+        }
+        return {'width':width, 'x_range':x_range};
+    }
+    """,
+    Output('voltammogram_view','data'),
+    [Input('voltammogram_graph','relayoutData')],
+    [State('voltammogram_view','data')])
+
+# compose the figure from trace, analysis and clicked points in the browser,
+# colors are taken from the selected theme by the role (meta) of every trace
+app.clientside_callback(
+    """
+    function(trace, analysis, clicks, theme_switch, themes) {
+        if (!trace) {
+            return window.dash_clientside.no_update;
+        }
+        var name = theme_switch ? 'download' : 'default';
+        var theme = themes[name];
+        var colors = {'current':theme['current_color'], 'baseline':theme['baseline_color'],
+                      'peak':theme['auto_peak_color'], 'click':theme['manual_peak_color']};
+        var data = [];
+        [trace, analysis, clicks].forEach(function(part) {
+            ((part && part['data']) || []).forEach(function(t) {
+                var styled = Object.assign({}, t);
+                styled['marker'] = {'color':colors[t['meta']]};
+                if (t['mode'] && t['mode'].indexOf('text') >= 0) {
+                    styled['textfont'] = {'color':t['meta'] == 'peak' ? theme['font_color'] : colors[t['meta']]};
+                }
+                data.push(styled);
+            });
+        });
+        return {'data':data, 'layout':trace['layouts'][name]};
+    }
+    """,
+    Output('voltammogram_graph','figure'),
+    [Input('voltammogram_trace','data'),
+     Input('voltammogram_analysis','data'),
+     Input('voltammogram_clicks','data'),
+     Input('theme_switch','on')],
+    [State('voltammogram_themes','data')])
+
+# layouts of the voltammogram for both themes
+def scan_layouts(graph_title,uirevision):
+    return {'default':scan_layout(graph_title,default_theme,uirevision),
+            'download':scan_layout(graph_title,download_theme,uirevision)}
+
+# layout of the voltammogram for the selected theme
+def scan_layout(graph_title,theme,uirevision):
     layout = {
             'title':{
                 'text':graph_title,
@@ -155,131 +436,9 @@ def update_plot_scan(file2,file3,file4,file5,file6,file7,file,point1,point2,grap
             'plot_bgcolor':theme['bg_color'],
             'showlegend':False,
             'autosize':True,
-            'uirevision':file7,#uirevision triggered only when file is changed using the dropdown
+            'uirevision':uirevision,#uirevision triggered only when file is changed using the dropdown
             }
-            
-    
-    if file == '':
-        return[{'data':'','layout':layout},no_update,'',no_update,'','']
-    
-    print('Plotting', file)
-    
-    params,scan_settings = get_parameters(file)
-    collapse_params = generate_param_components(params)
-    df = pd.read_csv(file)
-    root.flush()
-    config = literal_eval(str(root.config))
-    
-    graph_config['toImageButtonOptions'] = {'format':'png','filename':graph_title,'width':900,'height':600,'scale':2}
-    
-    x_data = df.potential
-    plot_data=[{'x':x_data,'marker':{'color':theme['current_color']},'name':'current'}]
-    
-    noise_filter_button = config['noise_filter_button']['children']
-    noise_frequency = config['noise_frequency_input']['value']
-    if params['type']['value'] in ['Cyclic Voltammetry','Linear Sweep Voltammetry']:
-        y_data = df.current
-        plot_data[0]['y'] = y_data
-        noise_filter = {'display':'flex','alignItems':'center'}
-        if noise_filter_button == 'Noise Filter On':
-            data_label = 'current_filtered_{}Hz'.format(noise_frequency)
-            if data_label in df.columns:
-                y_data = df[data_label]
-                plot_data[0]['y'] = y_data
-            else:
-                y_data = ac_noise_filter(noise_frequency,params['Samplerate']['value'],df.current)
-                plot_data[0]['y'] = y_data
-                df[data_label] = y_data
-                df.to_csv(file, index=False)
-    elif params['type']['value'] in ['Differential Pulse Voltammetry','Squarewave Voltammetry']:
-        y_data = df.fbcurrent
-        plot_data[0]['y'] = y_data
-        noise_filter = {'display':'none'}
-    
-    if not config['peak_detection_switch']['on'] and point1 == 'no point':
-        peakfile = ''
-    else:
-        peakfile = [file.replace('.csv','-peaks.txt')]
-        peakfile.append('ID,Detection Mode,Peak Potential [mV],Peak Current [A],\n')
-    
-    if config['peak_detection_switch']['on']:
-        baseline_polynomial = config['baseline_polynomial_input']['value']
-        peak_threshold = config['peak_threshold_input']['value']/config['peak_threshold_range']['value']
-        mv_step = (x_data.iloc[0]-x_data.iloc[9])/10
-        peak_dist = int(config['peak_distance_input']['value']/mv_step)
-        peak_width = int(config['peak_width_input']['value']/mv_step)
-        
-        # positive or negative current
-        if mean(y_data) < 0:
-            scale_factor = -1
-        else:
-            scale_factor = 1
-        
-        # Baseline determination
-        baselabel = 'basecurrent_{}'.format(baseline_polynomial)
-        if baselabel in df.columns:
-            base = df[baselabel]
-        else:
-            base = pu.baseline(y_data*scale_factor, baseline_polynomial)
-            df[baselabel] = base
-            df.to_csv(file, index=False)
-        
-        # Peak determination
-        peaks = pu.peak.indexes(y_data*scale_factor-base, thres=peak_threshold, min_dist=peak_dist, thres_abs=True)
-        peaks_gaussian = pu.peak.interpolate(x_data.values, (y_data*scale_factor-base).values, ind=peaks, width=peak_width)
-        peaks_gaussian_indices = []
-        for peak in peaks_gaussian:
-            peaks_gaussian_indices.append((abs(x_data.values - peak)).argmin())
-        peaks_x = x_data.iloc[peaks_gaussian_indices]
-        peaks_y = y_data.iloc[peaks_gaussian_indices]
-        y_base_removed = y_data*scale_factor-base
-        peak_heights = y_base_removed.iloc[peaks_gaussian_indices]
-        peaks_labels = []
-        for i in range(len(peaks_x)):
-            peaks_labels.append('{0:.0f} mV<br>{1:.2E} A'.format(peaks_x.iloc[i],peak_heights.iloc[i]))
-            peakfile[1] = peakfile[1] + '{},automatic,{:.0f},{:.2E},\n'.format(graph_title,peaks_x.iloc[i],peak_heights.iloc[i])
-        plot_data.append({'x':peaks_x,'y':peaks_y,
-                          'mode':'markers+text',
-                          'marker':{'color':theme['auto_peak_color']},
-                          'text':peaks_labels,
-                          'textfont':{'color':theme['font_color']},
-                          'textposition':'top center',
-                          'name':'peak'})
-        if config['baseline_switch']['on']:
-            plot_data.append({'x':x_data,'y':base*scale_factor,
-                              'marker':{'color':theme['baseline_color']},
-                              'name':'baseline'})
-    
-    # manual click points
-    if point1 != 'no point':
-        points = [point1]
-        if point2 != 'no point':
-            points.append(point2)
-        x_points = x_data.iloc[points]
-        y_points = y_data.iloc[points]
-        plot_data.append({'x':x_points,'y':y_points,
-                          'mode':'markers+text',
-                          'marker':{'color':theme['manual_peak_color']},
-                          'name':'click'})
-        if point2 != 'no point':
-            # lines to connect points and show horizontal and vertical distance
-            v_diff = abs(x_points.iloc[0]-x_points.iloc[1])
-            i_diff = abs(y_points.iloc[0]-y_points.iloc[1])
-            plot_data.append({'x':[x_points.iloc[0],x_points.iloc[1],x_points.iloc[1]],
-                              'y':[y_points.iloc[0],y_points.iloc[0],y_points.iloc[1]],
-                              'mode':'lines','marker':{'color':theme['manual_peak_color']}})
-            plot_data.append({'x':[x_points.iloc[0]+((x_points.iloc[1]-x_points.iloc[0])/2),x_points.iloc[1]],
-                              'y':[y_points.iloc[0],y_points.iloc[0]+((y_points.iloc[1]-y_points.iloc[0])/2)],
-                              'text':['{:.0f} mV'.format(v_diff),'{:.2E} A'.format(i_diff)],
-                              'mode':'text','textfont':{'color':theme['manual_peak_color']},
-                              'textposition':['bottom center','middle right'],})
-            peakfile[1] = peakfile[1] + '{},manual,{:.0f},{:.2E},\n'.format(graph_title,x_points.iloc[1],i_diff)
-    
-    figure={
-        'data':plot_data,
-        'layout':layout
-        }
-    return [figure,graph_config,collapse_params,noise_filter,peakfile,scan_settings]
+    return layout
 
 # if points on graph are clicked, get index. if already two points are selected, remove all
 # if graph file is changed, clear points
@@ -302,7 +461,11 @@ def catch_click(clickData,clear_points,point1,point2,switch):
     if trigger_id == 'clear_points':
         return ['no point', 'no point', no_update, time()]
     elif clickData != None and switch:
-        index = clickData['points'][0]['pointIndex']
+        # the traces are decimated, customdata is the index of the point in the full data,
+        # clicks on traces without it (clicked points, live data) are ignored
+        index = clickData['points'][0].get('customdata')
+        if index is None:
+            raise PreventUpdate
         if point1 == 'no point':
             return [index, no_update, time(), no_update]
         elif point2 == 'no point':
@@ -314,34 +477,52 @@ def catch_click(clickData,clear_points,point1,point2,switch):
 
 
 
-# remove AC noise (fixed frequency) from linear and cyclic voltammetric data
-# Filter: IIR notch
-Samplingrates = {"2.5Hz":2.5, "5Hz":5.0, "10Hz":10.0, "15Hz":15.0,
-                 "25Hz":25.0, "30Hz":30.0, "50Hz":50.0, "60Hz":60.0,
-                 "100Hz":100.0, "500Hz":500.0, "1KHz":1000.0, "2KHz":2000.0,
-                 "3.75KHz":3750.0, "7.5KHz":7500.0, "15KHz":1500.0, "30KHz":30000.0}
-
-def ac_noise_filter(noise_freq, sample_freq, data):
-    # constructing IIR notch filters
-    fs = Samplingrates[sample_freq]   # Sample frequency (Hz)
-    f0 = noise_freq  # Frequency to be removed from signal (Hz)
-    Q = 2.0  # Quality factor
+# append points sent by the backend during a measurement to the live voltammogram
+# live_scan_view is set by update_plot_scan while the live voltammogram is shown
+@app.callback(
+    [Output('voltammogram_graph','extendData'),
+     Output('live_scan_last_id','data'),
+     Output('live_scan_start','data')],
+    [Input('live_scan_interval','n_intervals'),
+     Input('push_live','n_clicks')],
+    [State('live_scan_last_id','data'),
+     State('live_scan_start','data'),
+     State('live_scan_view','data')])
+def update_live_scan(n_intervals,pushed,last_id,live_start,view):
+    entries = read_live_scan_range(root.red,'-',count=1)
+    if entries == []:
+        if last_id == None:
+            return [no_update,'0-0',no_update]
+        raise PreventUpdate
+    first_id, first = entries[0]
+    if last_id == None:
+        # page loaded: only follow a measurement that is still running
+        latest_id, latest = latest_live_scan(root.red)
+        if latest['event'] != 'end' and first['event'] == 'start':
+            return [no_update,first_id,{'id':first_id,'label':first['label'],'noise_filter':first.get('noise_filter')}]
+        return [no_update,latest_id,no_update]
     
-    # Design notch filter for base frequency and harmonics
-    b, a = signal.iirnotch(f0, Q, fs)
-    c, d = signal.iirnotch(f0*2, Q, fs)
-    e, f = signal.iirnotch(f0*4, Q, fs)
-    g, h = signal.iirnotch(f0*5, Q, fs)
-    i, j = signal.iirnotch(f0*6, Q, fs)
+    # a new measurement replaced the stream
+    if first['event'] == 'start' and newer_id(first_id,last_id) == first_id and first_id != last_id:
+        return [no_update,first_id,{'id':first_id,'label':first['label'],'noise_filter':first.get('noise_filter')}]
     
-    #apply filters
-    yf1 = signal.filtfilt(b,a,data)
-    yf2 = signal.filtfilt(c,d,yf1) 
-    yf3 = signal.filtfilt(e,f,yf2) 
-    yf4 = signal.filtfilt(g,h,yf3) 
-    yf5 = signal.filtfilt(i,j,yf4)
+    # wait until the live voltammogram of the current measurement is shown
+    if view == None or live_start == None or view['start'] != live_start['id']:
+        raise PreventUpdate
     
-    return pd.Series(yf5)
+    potential = []
+    current = []
+    entries = read_live_scan(root.red,newer_id(last_id,view['last']))
+    if entries == []:
+        raise PreventUpdate
+    for entry_id, fields in entries:
+        if fields['event'] == 'points':
+            potential += json.loads(fields['potential'])
+            current += json.loads(fields['current'])
+    if potential == []:
+        return [no_update,entries[-1][0],no_update]
+    return [[{'x':[potential],'y':[current]},[0]],entries[-1][0],no_update]
+
 
 factors={'Cyclic Voltammetry Experiment\n':
     ['Comment','Samplerate','t_preconditioning1','t_preconditioning2',
@@ -379,25 +560,22 @@ experiment_values={'Cyclic Voltammetry':'single_cv',
                   'Squarewave Voltammetry':'single_swv',
                   'Differential Pulse Voltammetry':'single_dpv'}
                   
-# read scan parameters from the .txt file generated by the KStat driver
+# scan parameters (from the .txt file generated by the KStat driver) are read from the scan catalog
 def get_parameters(file):
     # get parameter data
-    parafile = file.replace('.csv','-parameters.txt')
-    f = open(parafile,'r')
-    type = f.readline()
-    f.close()
-    parameters = pd.read_csv(parafile, delim_whitespace=True, engine='python', names=['0','1','2','3'], index_col=0)
+    entry = scan_catalog.get_scan(file)
+    type = entry['header'] + '\n'
+    parameters = entry['parameters']
     params = {}
     settings = [{'component':'category_selection','attribute':'value','value':'voltammetry_single'}] # to enable copying of scan parameters to current settings
     params['type'] = {'label':'Type','value':experiment_types[type]}
     settings.append({'component':'program_selection','attribute':'value','value':experiment_values[params['type']['value']]})
     for factor in factors[type]:
-        number = parameters['2'][factor]
+        number, unit = parameters[factor]
         try:
             number = int(number)
         except:
             pass
-        unit = parameters['3'][factor]
         settings.append({'component':components[factor],'attribute':'value','value':number})
         if unit != None:
             value = str(number) + ' ' + unit
@@ -15,7 +15,8 @@ from dash.exceptions import PreventUpdate
 from dash import no_update
 from time import time,sleep
 from redisworks import Root
-from ast import literal_eval
+from ..config_store import read_config
+from ..job_queue import read_method
 from .app import app, write_config
 from .. import redis_config
 import pandas as pd
@@ -64,6 +65,9 @@ visibility_controlled_components =[
     'plating_potential_input_container',
     'comment_input_container',
     'n_electrode_tests_input_container',
+    'electrode_test_tolerance_input_container',
+    'n_additions_input_container',
+    'addition_concentration_input_container',
     'start_button_container',
     'stop_button_container',
     ]
@@ -193,6 +197,8 @@ standard_addition_cv_components = [
     'stirr_speed_slider_container',
     'scan_progress_container',
     'series_progress_container',
+    'n_additions_input_container',
+    'addition_concentration_input_container',
     'file_management',
     'comment_input_container',
     'start_button_container',
@@ -219,6 +225,8 @@ standard_addition_lsv_components = [
     'stirr_speed_slider_container',
     'scan_progress_container',
     'series_progress_container',
+    'n_additions_input_container',
+    'addition_concentration_input_container',
     'file_management',
     'comment_input_container',
     'start_button_container',
@@ -247,6 +255,8 @@ standard_addition_dpv_components = [
     'stirr_speed_slider_container',
     'scan_progress_container',
     'series_progress_container',
+    'n_additions_input_container',
+    'addition_concentration_input_container',
     'file_management',
     'comment_input_container',
     'start_button_container',
@@ -275,6 +285,8 @@ standard_addition_swv_components = [
     'stirr_speed_slider_container',
     'scan_progress_container',
     'series_progress_container',
+    'n_additions_input_container',
+    'addition_concentration_input_container',
     'file_management',
     'comment_input_container',
     'start_button_container',
@@ -304,6 +316,7 @@ hg_au_electrode_testing_components = [
     'series_progress_container',
     'file_management',
     'n_electrode_tests_input_container',
+    'electrode_test_tolerance_input_container',
     'start_button_container',
     'stop_button_container',
     ]
@@ -434,20 +447,7 @@ def generate_method_download(file):
     [State('config_selection_dropdown','value')])
 def apply_method_selection(n_clicks,file):
     if n_clicks != None and file != None:
-        f = open(file,'r')
-        lines = f.readlines()
-        f.close()
-        output = []
-        for line in lines:
-            line = line.split(',')
-            component = line[0]
-            value = line[1]
-            try:
-                value = int(value)
-            except:
-                pass
-            output.append({'component':component,'attribute':'value','value':value})
-        write_config(output)
+        write_config(read_method(file))
         return True
     else:
         raise PreventUpdate
@@ -488,8 +488,7 @@ def open_update_method_confirmation(n_clicks,file):
     [State('config_selection_dropdown','value')])
 def update_method(n_clicks,file):
     if n_clicks != None:
-        root.flush()
-        config = literal_eval(str(root.config))
+        config = read_config(root.red)
         program = config['program_selection']['value']
         component_list = component_lists[program]
         components = []
@@ -513,8 +512,7 @@ def update_method(n_clicks,file):
     [State('new_method_input','value')])
 def create_new_method(n_clicks,id):
     if n_clicks != None and id != '':
-        root.flush()
-        config = literal_eval(str(root.config))
+        config = read_config(root.red)
         program = config['program_selection']['value']
         component_list = component_lists[program]
         components = []
@@ -0,0 +1,120 @@
+# GUI Frontend for the KStat electrochemical analyzer
+# Server push of changes to the browsers (Server-Sent Events on /events)
+# the server learns about changes once (config and status subscriptions in update_components, watcher
+# threads for the live scan stream and the job queue) and sends an event per changed channel to every
+# connected browser; assets/push.js clicks a hidden button per channel, which triggers the callback
+# that reads the change, so browsers only make requests when something changed
+# the dcc.Interval components are disabled while the event stream is connected and poll as a fallback
+# using Dash by Plotly (MIT licensed)
+
+import os
+from glob import glob
+from time import sleep
+from threading import Thread, Condition
+import flask
+import dash_html_components as html
+from dash.dependencies import Input, Output
+from redisworks import Root
+from .app import app
+from .. import redis_config
+from .. import job_queue as queue
+from ..live_scan import stream_key
+
+redis_host,redis_port = redis_config.get_config()
+root = Root(host=redis_host, port=redis_port, db=0)
+
+channels = ('config', 'status', 'live', 'jobs')
+# seconds between two events of a client (changes in the meantime are sent together)
+min_interval = 0.1
+# seconds until a comment is sent to keep idle connections open
+keepalive = 15
+
+class Broadcaster():
+    """
+    counts the changes of every channel, clients wait for counts that differ from the ones they sent
+    """
+
+    def __init__(self):
+        self.condition = Condition()
+        self.versions = dict.fromkeys(channels, 0)
+
+    def notify(self, channel):
+        with self.condition:
+            self.versions[channel] += 1
+            self.condition.notify_all()
+
+    def wait(self, known, timeout):
+        with self.condition:
+            self.condition.wait_for(lambda: self.versions != known, timeout)
+            return dict(self.versions)
+
+broadcaster = Broadcaster()
+
+def notify(channel):
+    broadcaster.notify(channel)
+
+@app.server.route('/events')
+def events():
+    def stream():
+        # every channel is sent once after connecting, so changes missed while disconnected are read
+        known = {}
+        yield 'retry: 2000\n\n'
+        while True:
+            versions = broadcaster.wait(known, keepalive)
+            changed = [channel for channel in channels if versions[channel] != known.get(channel)]
+            known = versions
+            if not changed:
+                yield ': keepalive\n\n'
+                continue
+            yield ''.join('event: {}\ndata: {}\n\n'.format(channel, versions[channel]) for channel in changed)
+            sleep(min_interval)
+    return flask.Response(stream(), mimetype='text/event-stream',
+                          headers={'Cache-Control':'no-cache', 'X-Accel-Buffering':'no'})
+
+def watch_live_scan():
+    # new entries of the live scan stream (blocking read, one connection for all browsers)
+    last_id = '$'
+    while True:
+        try:
+            for stream, messages in root.red.xread({stream_key:last_id}, block=keepalive*1000):
+                last_id = messages[-1][0]
+                notify('live')
+        except Exception as e:
+            print("Lost connection to live scan stream.", e)
+            sleep(1)
+
+def watch_job_queue(interval=0.5):
+    # the queue has a version counter, methods are files, both are checked on the server only
+    state = None
+    while True:
+        try:
+            methods = sorted(glob('{}*.txt'.format(root.methods_directory)))
+            new_state = (queue.queue_version(root.red), methods,
+                         [os.path.getmtime(method) for method in methods if os.path.exists(method)])
+            if new_state != state:
+                state = new_state
+                notify('jobs')
+        except Exception as e:
+            print("Couldn't check job queue.", e)
+        sleep(interval)
+
+Thread(target=watch_live_scan, daemon=True).start()
+Thread(target=watch_job_queue, daemon=True).start()
+
+def push_components():
+    # hidden buttons clicked by assets/push.js
+    return html.Div(style={'display':'none'},
+        children=[html.Button(id='push_' + channel) for channel in channels + ('state',)])
+
+# polling only while the event stream isn't connected
+app.clientside_callback(
+    """
+    function(n_clicks) {
+        var connected = Boolean(window.kstat_push && window.kstat_push.connected);
+        return [connected, connected, connected];
+    }
+    """,
+    [Output('update_interval','disabled'),
+     Output('live_scan_interval','disabled'),
+     Output('job_queue_interval','disabled')],
+    [Input('push_state','n_clicks')])
@@ -4,8 +4,12 @@
 # Nico Fröhberg, 2020
 # nico.froehberg@gmx.de
 
+import os, sys
+import subprocess
+from threading import Thread
 from time import time
 from datetime import datetime
+from shutil import copyfile
 import dash_bootstrap_components as dbc
 import dash_core_components as dcc
 import dash_html_components as html
@@ -15,8 +19,10 @@ from dash.exceptions import PreventUpdate
 from dash import no_update, callback_context
 from redisworks import Root
 from .. import redis_config
-from .app import app, write_config
-from ast import literal_eval
+from .app import app, write_config, set_status
+from ..config_store import read_config, read_config_value
+from .. import scan_catalog
+from ..batch_analysis import summary_file
 from time import time
 
 redis_host,redis_port = redis_config.get_config()
@@ -61,6 +67,14 @@ def scan_parameters():
                         target='save_peak_button'),
                     dcc.Store(id='peak_file_data',data=''),
                     dcc.Store(id='peak_file_placeholder'),
+                    html.Button(id='batch_analysis_button',children='Analyze Directory',
+                        style={'width':'225px'}),
+                    dbc.Tooltip('Automatic peak detection of all scans in the working directory and its subfolders '+
+                        'with the current settings, the peaks are saved to '+summary_file,
+                        target='batch_analysis_button'),
+                    html.Div(id='batch_analysis_result'),
+                    html.A(id='batch_analysis_download', download=summary_file),
+                    dcc.Store(id='batch_analysis_placeholder'),
                     ])
                 ])
 
@@ -86,6 +100,70 @@ def save_peak_data(n_clicks,data):
             f = open(data[0],'w')
             f.write(data[1])
             f.close()
+            scan_catalog.update_peaks(data[0])
+    raise PreventUpdate
+
+def batch_analysis_progress(process, summary):
+    # progress lines of the analysis are shown in the scan progress bar, the result and the
+    # summary for download are set in the config when the analysis finished
+    lines = []
+    for line in process.stdout:
+        line = line.strip()
+        if line.startswith('Progress: '):
+            done, total = line[len('Progress: '):].split('/')
+            set_status(scan_progress=int(done)/int(total)*100,
+                       scan_progress_label='Analysis {}/{}'.format(done, total))
+        elif line:
+            lines.append(line)
+    process.wait()
+    changes = [{'component':'batch_analysis_button','attribute':'disabled','value':False}]
+    if process.returncode != 0 or not os.path.exists(summary) or len(lines) < 2:
+        set_status(scan_progress=0, scan_progress_label='')
+        message = 'Analysis failed: ' + (lines[-1] if lines else 'no output')
+        changes += [{'component':'batch_analysis_result','attribute':'children','value':message},
+                    {'component':'batch_analysis_download','attribute':'children','value':''}]
+    else:
+        set_status(scan_progress=100, scan_progress_label='Analysis finished')
+        # served for download like methods and directories
+        filename = 'peak_summary_{}.csv'.format(datetime.now().strftime('%Y_%m_%d_%H-%M-%S'))
+        copyfile(summary, str(root.download_directory) + filename)
+        changes += [{'component':'batch_analysis_result','attribute':'children','value':lines[-2]},
+                    {'component':'batch_analysis_download','attribute':'href','value':'/user_downloads/' + filename},
+                    {'component':'batch_analysis_download','attribute':'children',
+                     'value':u"\U00002913" + ' ' + summary_file}]
+    write_config(changes)
+
+# the analysis runs in a separate process with a pool of worker processes (kstat_interface/batch_analysis.py)
+# started in the background, the button is disabled until it finished
+@app.callback(
+    Output('batch_analysis_placeholder','data'),
+    [Input('batch_analysis_button','n_clicks')])
+def analyze_directory(n_clicks):
+    if n_clicks == None:
+        raise PreventUpdate
+    config = read_config(root.red, ['noise_filter_button','noise_frequency_input','baseline_polynomial_input',
+                                    'peak_threshold_input','peak_threshold_range','peak_distance_input','peak_width_input'])
+    command = [sys.executable, '-m', 'kstat_interface.batch_analysis', str(root.working_directory),
+               '--polynomial', str(config['baseline_polynomial_input']['value']),
+               '--threshold', str(config['peak_threshold_input']['value']/config['peak_threshold_range']['value']),
+               '--distance', str(config['peak_distance_input']['value']),
+               '--width', str(config['peak_width_input']['value'])]
+    if config['noise_filter_button']['children'] == 'Noise Filter On':
+        command += ['--noise-frequency', str(config['noise_frequency_input']['value'])]
+    program_directory = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    write_config([{'component':'batch_analysis_button','attribute':'disabled','value':True},
+                  {'component':'batch_analysis_result','attribute':'children','value':'Analyzing '+str(root.working_directory)},
+                  {'component':'batch_analysis_download','attribute':'children','value':''}])
+    set_status(scan_progress=0, scan_progress_label='Analysis')
+    try:
+        process = subprocess.Popen(command, cwd=program_directory, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                   universal_newlines=True, bufsize=1)
+    except Exception as e:
+        write_config([{'component':'batch_analysis_button','attribute':'disabled','value':False},
+                      {'component':'batch_analysis_result','attribute':'children','value':'Analysis failed: '+str(e)}])
+        raise PreventUpdate
+    summary = os.path.join(str(root.working_directory), summary_file)
+    Thread(target=batch_analysis_progress, args=(process, summary), daemon=True).start()
     raise PreventUpdate
 
 def peak_threshold():
@@ -412,9 +490,7 @@ def noise_filter():
     [Input('noise_filter_button','n_clicks')],
     [State('voltammogram_graph_file','data')])
 def set_noise_filter(n_clicks,file):
-    root.flush()
-    config = literal_eval(str(root.config))
-    state = config['noise_filter_button']['children']
+    state = read_config_value(root.red, 'noise_filter_button', 'children')
     if n_clicks != None:
         if state == 'Noise Filter Off':
             write_config([{'component':'noise_filter_button',
@@ -436,9 +512,7 @@ def set_noise_filter(n_clicks,file):
      State('noise_frequency_input_value_update_acknowledged','data'),
      State('voltammogram_graph_file','data')])
 def update_noise_frequency(value, update, update_acknowledged, file):
-    root.flush()
-    config = literal_eval(str(root.config))
-    state = config['noise_filter_button']['children']
+    state = read_config_value(root.red, 'noise_filter_button', 'children')
     if update == update_acknowledged:
         write_config([{'component':'noise_frequency_input',
                        'attribute':'value','value':value}])
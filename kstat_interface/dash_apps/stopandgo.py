@@ -159,4 +159,34 @@ def cancelMeasurement(n_clicks):
         write_config([{'component':'stop_button','attribute':'triggered','value':True},
                         {'component':'stop_button','attribute':'disabled','value':True},
                         {'component':'start_button','attribute':'disabled','value':False},])
-    raise PreventUpdate 
\ No newline at end of file
+    raise PreventUpdate 
+
+
+# prompt to add the standard during standard addition measurements, opened and closed by the backend
+def addition_prompt():
+    return html.Div(id='addition_prompt_container',
+        children=[
+            dcc.Store(id='addition_prompt_placeholder'),
+            dbc.Modal(id='addition_prompt',
+                centered=True,
+                backdrop='static',
+                children=[
+                    dbc.ModalHeader('Standard Addition'),
+                    dbc.ModalBody(
+                        children=html.Div(id='addition_prompt_message')),
+                    dbc.ModalFooter(
+                        children=html.Button(id='addition_continue_button',
+                            children='Continue'))
+                    ]
+                )
+            ]
+        )
+
+# the backend continues with the next measurement after the addition was confirmed
+@app.callback(
+    Output('addition_prompt_placeholder','data'),
+    [Input('addition_continue_button','n_clicks')])
+def confirmAddition(n_clicks):
+    if n_clicks != None:
+        write_config([{'component':'addition_continue_button','attribute':'triggered','value':True}])
+    raise PreventUpdate
\ No newline at end of file
@@ -1,6 +1,7 @@
 # GUI Frontend for the KStat electrochemical analyzer
 # Script to provide update component that checks for changes from the backend 
 # to update the interface output
+# changes are pushed to the browsers (see push.py), the update interval only polls as a fallback
 # using Dash by Plotly (MIT licensed)
 # Nico Fröhberg, 2019
 # nico.froehberg@gmx.de
@@ -15,26 +16,58 @@ from dash.exceptions import PreventUpdate
 from dash import no_update
 from time import time,sleep
 from redisworks import Root
-from ast import literal_eval
 import json
+from threading import Thread
 from .app import app, write_config
 from .. import redis_config
+from ..config_store import last_change, read_changes, ConfigListener
+from ..status import StatusListener, status_fields
+from .push import notify, push_components
 import pandas as pd
 from glob import glob
 
 redis_host,redis_port = redis_config.get_config()
 root = Root(host=redis_host, port=redis_port, db=0)
 
+# id of the latest config change, kept up to date by a subscription to the change notifications
+# so checking for updates doesn't need a request to the redis server
+latest_change = {'id':None}
+
+def listen_config_changes():
+    while True:
+        try:
+            listener = ConfigListener(root.red)
+            latest_change['id'] = last_change(root.red)
+            for change in listener.listen():
+                latest_change['id'] = change
+                notify('config')
+        except Exception as e:
+            print("Lost connection to config notifications.", e)
+            latest_change['id'] = None
+            sleep(1)
+
+Thread(target=listen_config_changes, daemon=True).start()
+
+# progress bars and labels are received through the status channel apart from the config
+status_listener = {'listener':None}
+
+def listen_status():
+    while True:
+        try:
+            status_listener['listener'] = StatusListener(root.red)
+            status_listener['listener'].listen(lambda: notify('status'))
+        except Exception as e:
+            print("Lost connection to status channel.", e)
+            sleep(1)
+
+Thread(target=listen_status, daemon=True).start()
+
 # (<component>,<parameter>,<user updatable>)
 update_list=[
     ('purge_switch','on',True),
     ('purge_switch','disabled',False),
     ('stirr_switch','on',True),
     ('stirr_switch','disabled',False),
-    ('scan_progress','value',False),
-    ('scan_progress_label','children',False),
-    ('series_progress','value',False),
-    ('series_progress_label','children',False),
     ('stirr_speed_slider','value',True),
     ('cleaning_potential_input','value',True),
     ('deposition_potential_input','value',True),
@@ -61,12 +94,22 @@ update_list=[
     ('plating_potential_input','value',True),
     ('comment_input','value',True),
     ('n_electrode_tests_input','value',True),
+    ('electrode_test_tolerance_input','value',True),
+    ('n_additions_input','value',True),
+    ('addition_concentration_input','value',True),
+    ('addition_prompt','is_open',False),
+    ('addition_prompt_message','children',False),
     ('start_button','disabled',False),
     ('stop_button','disabled',False),
+    ('job_queue_button','disabled',False),
     ('change_directory_button','disabled',False),
     ('upload_button','disabled',False),
     ('download_button','disabled',False),
     ('noise_filter_button','children',False),
+    ('batch_analysis_button','disabled',False),
+    ('batch_analysis_result','children',False),
+    ('batch_analysis_download','href',False),
+    ('batch_analysis_download','children',False),
     ('noise_frequency_input','value',True),
     ('peak_detection_switch','on',True),
     ('baseline_switch','on',True),
@@ -88,7 +131,12 @@ def update_components():
                 interval=100, # in milliseconds
                 n_intervals=0
             ),
-            dcc.Store(id='update_timestamp', data=1)
+            push_components(),
+            dcc.Store(id='update_timestamp', data=1),
+            # id of the last config change applied to the components
+            dcc.Store(id='config_change_applied', data=None),
+            # number of the last status change applied to the progress bars
+            dcc.Store(id='status_applied', data=-1)
             ])
         
         
@@ -96,19 +144,15 @@ def update_components():
 # Getting Changes from Backend
 ####################################################################
 
-# check if timestamp of redis server changed to trigger config update
+# check if the id of the last config change in the redis server changed to trigger config update
 @app.callback(
     Output('update_timestamp','data'),
-    [Input('update_interval','n_intervals')],
+    [Input('update_interval','n_intervals'),
+     Input('push_config','n_clicks')],
     [State('update_timestamp','data')])
-def check_update(n_intervals, stored_stamp):
-    # get time stamp of config in redis server
-    try:
-        root.flush()
-        config_stamp = str(root['update_timestamp'])
-    except Exception as e:
-        print("Couldn't load config time stamp.", e)
-        raise PreventUpdate
+def check_update(n_intervals, pushed, stored_stamp):
+    # get id of the last config change notified by the redis server
+    config_stamp = str(latest_change['id'])
     # if stored time stamp matches config, no update is necessary
     # otherwise get config from redis server
     if config_stamp == str(stored_stamp):
@@ -136,19 +180,20 @@ for parameter in update_list:
 factor_labels=factors
 
 
+# only fields changed since the last applied change are loaded and compared
 @app.callback(
-    update_outputs,
+    update_outputs + [Output('config_change_applied','data')],
     [Input('update_timestamp','modified_timestamp')],
-    update_states)
+    update_states + [State('config_change_applied','data')])
 def update_config(timestamp,*factors):
+    applied = factors[-1]
     try:
-        root.flush()
-        config = literal_eval(str(root.config))
+        applied, config = read_changes(root.red, applied)
     except Exception as e:   
         print("Couldn't load config.", e)
         raise PreventUpdate
         
-    factors = list(factors)
+    factors = list(factors[:-1])
     output_factors = []
     for i in range(len(factors)):
         if 'update' in factor_labels[i]:
@@ -156,6 +201,11 @@ def update_config(timestamp,*factors):
         else:
             component = factor_labels[i][:factor_labels[i].find('.')]
             parameter = factor_labels[i][factor_labels[i].find('.')+1:]
+            if parameter not in config.get(component, {}):
+                output_factors.append(no_update)
+                if user_updatable[i]:
+                    output_factors.append(no_update)
+                continue
             config_value = config[component][parameter]
             component_value = factors[i]
             if config_value != component_value:
@@ -166,4 +216,23 @@ def update_config(timestamp,*factors):
                 output_factors.append(no_update)
                 if user_updatable[i]:
                     output_factors.append(no_update)
-    return tuple(output_factors)
+    return tuple(output_factors + [applied])
+
+
+# update progress bars and labels if the status changed
+status_outputs = []
+for component in status_fields:
+    status_outputs.append(Output(component, 'children' if component.endswith('label') else 'value'))
+
+@app.callback(
+    status_outputs + [Output('status_applied','data')],
+    [Input('update_interval','n_intervals'),
+     Input('push_status','n_clicks')],
+    [State('status_applied','data')])
+def update_status(n_intervals, pushed, applied):
+    listener = status_listener['listener']
+    if listener is None or listener.seq == applied:
+        raise PreventUpdate
+    seq = listener.seq
+    return [listener.status[key] for key in status_fields.values()] + [seq]
+
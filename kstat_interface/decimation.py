@@ -0,0 +1,56 @@
+# Decimation of voltammograms for display (Largest-Triangle-Three-Buckets)
+# the points are split into equally sized buckets and from every bucket the point forming the largest
+# triangle with the point chosen from the previous bucket and the average of the next bucket is kept,
+# so peaks and the shape of the curve are preserved with a few points per pixel of the graph
+# functions return indices of the kept points, so selections can be mapped to the full data
+
+import numpy as np
+
+def lttb(x, y, n_out):
+    """
+    indices of n_out points of (x, y) chosen by Largest-Triangle-Three-Buckets
+    all indices are returned if there are less than n_out points
+    """
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    # first and last point are kept, the others are split into n_out - 2 buckets
+    edges = np.append(np.linspace(1, n - 1, n_out - 1).astype(np.int64), n)
+    # average of every bucket (the last 'bucket' is the last point)
+    sums_x = np.add.reduceat(x, edges[:-1])
+    sums_y = np.add.reduceat(y, edges[:-1])
+    counts = np.diff(edges)
+    avg_x = sums_x/counts
+    avg_y = sums_y/counts
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # twice the area of the triangles (a, point of this bucket, average of the next bucket)
+        area = np.abs((x[a] - avg_x[i + 1])*(y[start:end] - y[a]) - (x[a] - x[start:end])*(avg_y[i + 1] - y[a]))
+        a = start + int(np.argmax(area))
+        indices[i + 1] = a
+    return indices
+
+def decimate(x, y, n_out, x_range=None):
+    """
+    indices of the points shown in a graph with n_out points
+    x_range: visible range of x (zoomed in), additional n_out points are chosen from the visible points,
+    the points outside of it are kept at the overview resolution, so lines stay connected
+    """
+
+    indices = lttb(x, y, n_out)
+    if x_range is None or len(indices) == len(x):
+        return indices
+    x = np.asarray(x)
+    low, high = min(x_range), max(x_range)
+    visible = np.flatnonzero((x >= low) & (x <= high))
+    if len(visible) == 0:
+        return indices
+    detail = visible[lttb(x[visible], np.asarray(y)[visible], n_out)]
+    return np.union1d(indices, detail)
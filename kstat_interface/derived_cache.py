@@ -0,0 +1,169 @@
+# Cache of data derived from scans (noise filtered current, baselines, ...)
+# results are identified by a hash of the scan data and the processing parameters, so scans stay
+# unchanged and a result is never used for other data (e.g. after a scan was replaced or reprocessed)
+# the most recently used results are kept in memory, results evicted from memory are spilled to disk
+# and the least recently used files are removed when the disk cache is full
+# hits and misses are counted, see stats()
+
+import os, json, hashlib
+from collections import OrderedDict
+from threading import Lock
+import numpy as np
+from . import scan_store
+
+cache_directory = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'derived_cache')
+
+class DerivedCache():
+    """
+    get(scan, name, parameters, compute) returns the cached result of compute() for a scan,
+    name and parameters (json serializable), compute() is only called on a miss
+    memory_size, disk_size: bytes kept in memory and on disk
+    """
+
+    def __init__(self, directory=cache_directory, memory_size=64*2**20, disk_size=512*2**20):
+        self.directory = directory
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self.lock = Lock()
+        self.memory = OrderedDict()
+        self.memory_used = 0
+        self.disk = None
+        self.disk_used = 0
+        # content hashes of scans by path, valid as long as the files didn't change
+        self.hashes = {}
+        self.counters = {'memory_hits':0, 'disk_hits':0, 'misses':0, 'spilled':0, 'removed':0}
+
+    def key(self, scan, name, parameters):
+        description = json.dumps([content_hash(scan, self.hashes), name, parameters], sort_keys=True)
+        return hashlib.sha1(description.encode()).hexdigest()
+
+    def get(self, scan, name, parameters, compute):
+        key = self.key(scan, name, parameters)
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.counters['memory_hits'] += 1
+                return self.memory[key]
+            values = self._load(key)
+            if values is not None:
+                self.counters['disk_hits'] += 1
+                self._store(key, values)
+                return values
+            self.counters['misses'] += 1
+        values = np.asarray(compute())
+        with self.lock:
+            self._store(key, values)
+        return values
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats.update(memory_items=len(self.memory), memory_bytes=self.memory_used,
+                         disk_items=len(self.disk or ()), disk_bytes=self.disk_used)
+            return stats
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+            self.memory_used = 0
+            for key in list(self._disk()):
+                self._remove(key)
+
+    def _store(self, key, values):
+        # results are shared by all callers
+        values.setflags(write=False)
+        self.memory[key] = values
+        self.memory_used += values.nbytes
+        while self.memory_used > self.memory_size and len(self.memory) > 1:
+            old_key, old_values = self.memory.popitem(last=False)
+            self.memory_used -= old_values.nbytes
+            self._spill(old_key, old_values)
+
+    def _disk(self):
+        # files of the disk cache from the least to the most recently used
+        if self.disk is None:
+            self.disk = OrderedDict()
+            os.makedirs(self.directory, exist_ok=True)
+            files = [os.path.join(self.directory, f) for f in os.listdir(self.directory) if f.endswith('.npy')]
+            for file in sorted(files, key=os.path.getmtime):
+                self.disk[os.path.basename(file)[:-4]] = os.path.getsize(file)
+            self.disk_used = sum(self.disk.values())
+        return self.disk
+
+    def _file(self, key):
+        return os.path.join(self.directory, key + '.npy')
+
+    def _spill(self, key, values):
+        disk = self._disk()
+        if key in disk:
+            disk.move_to_end(key)
+            return
+        try:
+            tmp = os.path.join(self.directory, '.' + key + '.npy')
+            np.save(tmp, values)
+            os.replace(tmp, self._file(key))
+        except OSError as e:
+            print("Couldn't write to the derived data cache.", e)
+            return
+        disk[key] = os.path.getsize(self._file(key))
+        self.disk_used += disk[key]
+        self.counters['spilled'] += 1
+        while self.disk_used > self.disk_size and len(disk) > 1:
+            self._remove(next(iter(disk)))
+
+    def _load(self, key):
+        disk = self._disk()
+        if key not in disk:
+            return None
+        try:
+            values = np.load(self._file(key))
+        except (OSError, ValueError):
+            self._remove(key)
+            return None
+        disk.move_to_end(key)
+        os.utime(self._file(key))
+        return values
+
+    def _remove(self, key):
+        size = self.disk.pop(key, 0)
+        self.disk_used -= size
+        if os.path.exists(self._file(key)):
+            os.remove(self._file(key))
+        self.counters['removed'] += 1
+
+def data_files(path):
+    # files holding the measured data of a scan (not derived columns)
+    path = path.rstrip('/')
+    if not path.endswith(scan_store.extension):
+        return [path]
+    files = []
+    for file in sorted(os.listdir(path)):
+        name = file[:-4] if file.endswith('.npy') else None
+        if file == scan_store.conversion_file or (name is not None and
+                (name.startswith(scan_store.raw_prefix) or name in scan_store.measured_columns)):
+            files.append(os.path.join(path, file))
+    return files
+
+def content_hash(scan, hashes=None):
+    """
+    hash of the measured data and conversion metadata of a scan (Scan or path)
+    hashes: {path:(file signature, hash)}, the data are only hashed again if a file changed
+    """
+
+    path = scan.path if isinstance(scan, scan_store.Scan) else scan.rstrip('/')
+    files = data_files(path)
+    signature = [(f, os.stat(f).st_mtime_ns, os.stat(f).st_size) for f in files]
+    if hashes is not None and path in hashes and hashes[path][0] == signature:
+        return hashes[path][1]
+    digest = hashlib.sha1()
+    for file in files:
+        digest.update(os.path.basename(file).encode())
+        with open(file, 'rb') as f:
+            for block in iter(lambda: f.read(2**20), b''):
+                digest.update(block)
+    if hashes is not None:
+        hashes[path] = (signature, digest.hexdigest())
+    return digest.hexdigest()
+
+# cache of the interface
+cache = DerivedCache()
@@ -0,0 +1,328 @@
+# In-memory index of the directories and scans of the data directory
+# the index is loaded from the scan catalog and kept up to date by a watcher thread using inotify
+# (polling of the directories if inotify isn't available), so directory listings are served from
+# memory and changes are reported per scan: on_change(directory, added, removed) is called with the
+# paths of added and removed scans, e.g. to update the options of the scan selector one by one
+# changes are written to the scan catalog as well, so scans copied into the data directory, deleted
+# or changed outside of the interface are cataloged while it is running
+
+import os, sys, struct, ctypes, ctypes.util
+from glob import glob, escape
+from threading import Thread, Lock
+from time import sleep
+from . import scan_store, scan_catalog
+
+# inotify event flags (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+watch_mask = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+event_header = struct.Struct('iIII')
+
+# seconds between two scans of the data directory if inotify isn't available
+poll_interval = 5
+
+folder = scan_catalog.folder
+
+class DirectoryIndex():
+    """
+    directories and scans of a data directory, scans(directory) and directories(directory)
+    return the paths of the scans and subdirectories of a directory
+    """
+
+    def __init__(self, data_directory, on_change=None):
+        self.data_directory = folder(data_directory)
+        self.on_change = on_change
+        self.lock = Lock()
+        # directory: {'directories':set of paths, 'scans':{base:path}}
+        self.tree = {}
+        self.watches = {}
+        self.fd = None
+        self.thread = None
+        self.load()
+
+    ##############################################################
+    # listings
+    ##############################################################
+
+    def scans(self, directory):
+        with self.lock:
+            node = self.tree.get(folder(directory))
+            return sorted(node['scans'].values()) if node else []
+
+    def directories(self, directory):
+        with self.lock:
+            node = self.tree.get(folder(directory))
+            return sorted(node['directories']) if node else []
+
+    def _node(self, directory):
+        # node of a directory, created with all its parents inside the data directory
+        directory = folder(directory)
+        if directory not in self.tree:
+            self.tree[directory] = {'directories':set(), 'scans':{}}
+            if directory != self.data_directory and directory.startswith(self.data_directory):
+                self._node(os.path.dirname(directory.rstrip('/')))['directories'].add(directory)
+        return self.tree[directory]
+
+    def load(self):
+        # directories and scans known to the catalog
+        with self.lock:
+            self.tree = {}
+            self._node(self.data_directory)
+            pending = [self.data_directory]
+            while pending:
+                directory = pending.pop()
+                node = self._node(directory)
+                for subdirectory in scan_catalog.list_directories(directory):
+                    self._node(subdirectory)
+                    pending.append(subdirectory)
+                for path in scan_catalog.list_scans(directory):
+                    node['scans'][scan_store.scan_base(path)] = path
+
+    ##############################################################
+    # changes
+    ##############################################################
+
+    def add_scan(self, path):
+        base = scan_store.scan_base(path)
+        directory = folder(os.path.dirname(base))
+        with self.lock:
+            scans = self._node(directory)['scans']
+            # a csv scan converted to the binary format keeps its entry
+            new = base not in scans
+            scans[base] = path
+        try:
+            scan_catalog.index_scan(path)
+        except Exception as e:
+            print("Couldn't add scan to catalog.", path, e)
+        if new:
+            self.notify(directory, [path], [])
+
+    def remove_scan(self, path):
+        base = scan_store.scan_base(path)
+        directory = folder(os.path.dirname(base))
+        with self.lock:
+            removed = self.tree.get(directory, {'scans':{}})['scans'].pop(base, None)
+        scan_catalog.remove_scan(path)
+        if removed is not None:
+            self.notify(directory, [], [removed])
+
+    def add_directory(self, directory):
+        # a directory created (or moved) into the data directory, including its content
+        with self.lock:
+            self._node(directory)
+        scan_catalog.add_directory(directory)
+        self.watch(directory)
+        self.sync(directory)
+
+    def remove_directory(self, directory):
+        directory = folder(directory)
+        with self.lock:
+            removed = [d for d in self.tree if d.startswith(directory)]
+            for d in removed:
+                del self.tree[d]
+            parent = self.tree.get(folder(os.path.dirname(directory.rstrip('/'))))
+            if parent is not None:
+                parent['directories'].discard(directory)
+        for d in removed:
+            wd = self.watches.pop(d, None)
+            if wd is not None and self.fd is not None:
+                libc.inotify_rm_watch(self.fd, wd)
+        scan_catalog.remove_directory(directory)
+
+    def sync(self, directory=None):
+        """
+        compare the index with the file system below directory (the data directory by default)
+        and apply all differences, used by polling and after lost inotify events
+        """
+
+        directory = folder(directory or self.data_directory)
+        for current, subfolders, files in os.walk(directory):
+            subfolders[:] = [s for s in subfolders if not s.endswith(scan_store.extension)]
+            current = folder(current)
+            found = {folder(os.path.join(current, s)) for s in subfolders}
+            with self.lock:
+                node = self._node(current)
+                known_directories = set(node['directories'])
+                known_scans = dict(node['scans'])
+            for d in found - known_directories:
+                with self.lock:
+                    self._node(d)
+                scan_catalog.add_directory(d)
+                self.watch(d)
+            for d in known_directories - found:
+                self.remove_directory(d)
+            scans = {scan_store.scan_base(path):path.rstrip('/') for path in scan_store.list_scans(current)}
+            for base in scans.keys() - known_scans.keys():
+                self.add_scan(scans[base])
+            for base in known_scans.keys() - scans.keys():
+                self.remove_scan(known_scans[base])
+            for base in scans.keys() & known_scans.keys():
+                if scans[base] != known_scans[base]:
+                    self.add_scan(scans[base])
+
+    def notify(self, directory, added, removed):
+        if self.on_change is not None:
+            try:
+                self.on_change(directory, added, removed)
+            except Exception as e:
+                print('Directory index: change not reported.', e)
+
+    ##############################################################
+    # watcher
+    ##############################################################
+
+    def start(self):
+        if libc is not None and hasattr(libc, 'inotify_init1'):
+            self.fd = libc.inotify_init1(IN_CLOEXEC)
+        if self.fd is not None and self.fd >= 0:
+            with self.lock:
+                directories = list(self.tree)
+            for directory in directories:
+                self.watch(directory)
+            target = self.read_events
+        else:
+            self.fd = None
+            print('inotify not available, polling the data directory')
+            target = self.poll
+        # changes made before the watches were added
+        self.sync()
+        self.thread = Thread(target=target, daemon=True)
+        self.thread.start()
+
+    def watch(self, directory):
+        directory = folder(directory)
+        if self.fd is None or directory in self.watches:
+            return
+        wd = libc.inotify_add_watch(self.fd, directory.encode(), watch_mask)
+        if wd >= 0:
+            self.watches[directory] = wd
+
+    def poll(self):
+        while True:
+            sleep(poll_interval)
+            try:
+                self.sync()
+            except Exception as e:
+                print('Directory index: polling failed.', e)
+
+    def read_events(self):
+        while True:
+            data = os.read(self.fd, 65536)
+            directories = {wd:directory for directory, wd in self.watches.items()}
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = event_header.unpack_from(data, offset)
+                name = data[offset + event_header.size:offset + event_header.size + length].rstrip(b'\0').decode()
+                offset += event_header.size + length
+                try:
+                    if mask & IN_Q_OVERFLOW:
+                        self.sync()
+                    elif wd in directories:
+                        self.handle(directories[wd], name, mask)
+                except Exception as e:
+                    print('Directory index: event not handled.', name, e)
+
+    def handle(self, directory, name, mask):
+        path = os.path.join(directory, name)
+        if mask & IN_IGNORED or mask & IN_DELETE_SELF:
+            if not name and not os.path.exists(directory):
+                self.remove_directory(directory)
+            return
+        added = mask & (IN_CREATE | IN_MOVED_TO | IN_CLOSE_WRITE)
+        if mask & IN_ISDIR:
+            if name.endswith(scan_store.extension):
+                # scans are written to <name>.tmp.scan and renamed
+                if name.endswith('.tmp' + scan_store.extension):
+                    return
+                if added and scan_store.is_scan(path):
+                    self.add_scan(path)
+                elif not added:
+                    self.remove_scan(path)
+            elif added:
+                self.add_directory(path)
+            else:
+                self.remove_directory(path)
+            return
+        if name.endswith('.csv'):
+            base = scan_store.scan_base(path)
+            if os.path.isdir(base + scan_store.extension):
+                return
+            if added and scan_store.is_scan(path):
+                self.add_scan(path)
+            elif not added:
+                self.remove_scan(path)
+        elif name.endswith('-parameters.txt') and added:
+            # csv scans are listed once their parameters exist, changed parameters are cataloged again
+            base = path[:-len('-parameters.txt')]
+            for scan in (base + scan_store.extension, base + '.csv'):
+                if scan_store.is_scan(scan):
+                    self.add_scan(scan)
+                    break
+            else:
+                # scans of a measurement with several scans share its parameters
+                for scan in glob(escape(base) + '-scan*' + scan_store.extension):
+                    if scan_store.is_scan(scan):
+                        self.add_scan(scan)
+        elif name.endswith('-peaks.txt') and added:
+            scan_catalog.update_peaks(path)
+
+libc_name = ctypes.util.find_library('c')
+libc = ctypes.CDLL(libc_name, use_errno=True) if sys.platform.startswith('linux') and libc_name else None
+
+# index of the running interface
+directory_index = None
+
+def start(data_directory, on_change=None):
+    """
+    start watching the data directory (only once per process)
+    """
+
+    global directory_index
+    if directory_index is None:
+        directory_index = DirectoryIndex(data_directory, on_change)
+        directory_index.start()
+    return directory_index
+
+def list_scans(directory):
+    # from memory if the index was started, from the catalog otherwise
+    if directory_index is not None:
+        return directory_index.scans(directory)
+    return scan_catalog.list_scans(directory)
+
+def list_directories(directory):
+    if directory_index is not None:
+        return directory_index.directories(directory)
+    return scan_catalog.list_directories(directory)
+
+# changes made by the interface are applied right away, the watcher sees them again later
+def scan_added(path):
+    if directory_index is not None:
+        directory_index.add_scan(path)
+    else:
+        scan_catalog.index_scan(path)
+
+def scan_removed(path):
+    if directory_index is not None:
+        directory_index.remove_scan(path)
+    else:
+        scan_catalog.remove_scan(path)
+
+def directory_added(directory):
+    if directory_index is not None:
+        directory_index.add_directory(directory)
+    else:
+        scan_catalog.add_directory(directory)
+
+def directory_removed(directory):
+    if directory_index is not None:
+        directory_index.remove_directory(directory)
+    else:
+        scan_catalog.remove_directory(directory)
@@ -0,0 +1,175 @@
+# Queue of measurement jobs stored in redis, so it persists like the config
+# a job is a method (settings loaded from a method file) and a measurement id
+# the list job_queue holds the ids of the waiting jobs in the order they are run,
+# the jobs themselves are stored as json in the hash jobs
+# the measurement worker takes the next job as soon as the previous one finished, the frontend can
+# add, remove and reorder waiting jobs at any time
+# every change of the queue increments job_queue_version, so readers can tell if the queue changed
+
+import json
+import os
+
+queue_key = 'job_queue'
+jobs_key = 'jobs'
+counter_key = 'job_counter'
+running_key = 'job_running'
+version_key = 'job_queue_version'
+
+def _text(value):
+    if isinstance(value, bytes):
+        return value.decode()
+    return value
+
+def read_method(file):
+    """
+    load a method file (lines component,value,) as list of config changes
+    """
+
+    output = []
+    with open(file, 'r') as f:
+        for line in f.readlines():
+            line = line.split(',')
+            if len(line) < 2:
+                continue
+            component = line[0]
+            value = line[1]
+            try:
+                value = int(value)
+            except:
+                pass
+            output.append({'component':component,'attribute':'value','value':value})
+    return output
+
+def add_job(red, method_file, measurement_id):
+    """
+    append a job to the queue, the method file is read now, so later changes of the file
+    don't change waiting jobs
+    returns the id of the job
+    """
+
+    job_id = str(red.incr(counter_key))
+    job = {'id':job_id,
+           'method':os.path.basename(method_file).replace('.txt',''),
+           'measurement_id':measurement_id,
+           'changes':read_method(method_file)}
+    pipe = red.pipeline()
+    pipe.hset(jobs_key, job_id, json.dumps(job))
+    pipe.rpush(queue_key, job_id)
+    pipe.incr(version_key)
+    pipe.execute()
+    return job_id
+
+def list_jobs(red):
+    """
+    waiting jobs in the order they are run
+    """
+
+    ids = [_text(i) for i in red.lrange(queue_key, 0, -1)]
+    if not ids:
+        return []
+    return [json.loads(job) for job in red.hmget(jobs_key, ids) if job is not None]
+
+def running_job(red):
+    job = red.get(running_key)
+    if job is None:
+        return None
+    return json.loads(job)
+
+def queue_version(red):
+    return int(red.get(version_key) or 0)
+
+def remove_job(red, job_id):
+    """
+    remove a waiting job, returns False if the job already started or was removed
+    """
+
+    pipe = red.pipeline()
+    pipe.lrem(queue_key, 0, job_id)
+    pipe.hdel(jobs_key, job_id)
+    pipe.incr(version_key)
+    removed = pipe.execute()[0]
+    return removed > 0
+
+# KEYS: queue, version
+# ARGV: job id, number of places to move the job (negative = earlier)
+_move_script = """
+local ids = redis.call('LRANGE', KEYS[1], 0, -1)
+local from
+for i, id in ipairs(ids) do
+    if id == ARGV[1] then
+        from = i
+    end
+end
+if not from then
+    return 0
+end
+local to = math.max(1, math.min(#ids, from + tonumber(ARGV[2])))
+table.remove(ids, from)
+table.insert(ids, to, ARGV[1])
+redis.call('DEL', KEYS[1])
+redis.call('RPUSH', KEYS[1], unpack(ids))
+redis.call('INCR', KEYS[2])
+return 1
+"""
+
+# KEYS: queue, jobs, running job, version
+_pop_script = """
+local id = redis.call('LPOP', KEYS[1])
+if not id then
+    return nil
+end
+local job = redis.call('HGET', KEYS[2], id)
+redis.call('HDEL', KEYS[2], id)
+redis.call('SET', KEYS[3], job)
+redis.call('INCR', KEYS[4])
+return job
+"""
+_scripts = {}
+
+def _script(red, name, script):
+    if name not in _scripts:
+        _scripts[name] = red.register_script(script)
+    return _scripts[name]
+
+def move_job(red, job_id, places):
+    """
+    move a waiting job by places positions (negative = run earlier)
+    the queue is reordered on the server, so jobs taken by the worker in the meantime aren't lost
+    """
+
+    move = _script(red, 'move', _move_script)
+    return bool(move(keys=[queue_key, version_key], args=[job_id, places], client=red))
+
+def pop_job(red):
+    """
+    take the next job from the queue and mark it as running, None if the queue is empty
+    """
+
+    pop = _script(red, 'pop', _pop_script)
+    job = pop(keys=[queue_key, jobs_key, running_key, version_key], client=red)
+    if job is None:
+        return None
+    return json.loads(job)
+
+def finish_job(red):
+    pipe = red.pipeline()
+    pipe.delete(running_key)
+    pipe.incr(version_key)
+    pipe.execute()
+
+def requeue_running(red):
+    """
+    put a job that was interrupted (e.g. by a restart of the backend) back to the front of the queue
+    """
+
+    job = red.get(running_key)
+    if job is None:
+        return None
+    job_id = json.loads(job)['id']
+    pipe = red.pipeline()
+    pipe.hset(jobs_key, job_id, job)
+    pipe.lpush(queue_key, job_id)
+    pipe.delete(running_key)
+    pipe.incr(version_key)
+    pipe.execute()
+    return job_id
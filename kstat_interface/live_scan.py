@@ -0,0 +1,117 @@
+# Live transfer of data points from the backend to the voltammogram during measurements
+# points are collected into batches and sent through a redis stream
+# the current can be noise filtered while scanning (causal notch filter, noise_filter.StreamingNotchFilter)
+
+import json
+from time import time
+
+stream_key = 'live_scan'
+
+class LiveScan():
+    """
+    collects data points decoded during a measurement and publishes them in batches
+    at most every interval seconds and with at most max_points points per batch
+    noise_filter: StreamingNotchFilter applied to all points before they are thinned out
+    """
+
+    def __init__(self, red, interval=0.25, max_points=500, noise_filter=None):
+        self.red = red
+        self.interval = interval
+        self.max_points = max_points
+        self.noise_filter = noise_filter
+        self.potential = []
+        self.current = []
+        self.scan = 0
+        self.last_flush = 0
+
+    def start(self, label):
+        """
+        remove data of the previous measurement and announce a new one
+        """
+
+        self.red.delete(stream_key)
+        fields = {'event':'start', 'label':label}
+        if self.noise_filter is not None:
+            self.noise_filter.reset()
+            fields['noise_filter'] = self.noise_filter.noise_freq
+        self.red.xadd(stream_key, fields)
+        self.last_flush = time()
+
+    def add(self, scan, potential, current):
+        """
+        add points of a scan, the batch is sent if the interval has passed
+        """
+
+        if scan != self.scan:
+            self.flush()
+            self.scan = scan
+        if self.noise_filter is not None:
+            current = self.noise_filter(current).tolist()
+        self.potential.extend(potential)
+        self.current.extend(current)
+        if time() - self.last_flush >= self.interval:
+            self.flush()
+
+    def flush(self):
+        if self.potential:
+            # thin out points at high sample rates, the final scan is plotted from file anyway
+            step = len(self.potential)//self.max_points + 1
+            self.red.xadd(stream_key, {'event':'points', 'scan':self.scan,
+                'potential':json.dumps(self.potential[::step]),
+                'current':json.dumps(self.current[::step])})
+            self.potential = []
+            self.current = []
+        self.last_flush = time()
+
+    def end(self):
+        """
+        send the remaining points and mark the end of the measurement
+        """
+
+        self.flush()
+        self.red.xadd(stream_key, {'event':'end'})
+
+def read_live_scan(red, last_id, count=100):
+    """
+    get all entries of the live stream after last_id
+    returns list of (id, fields) with decoded strings
+    """
+
+    entries = []
+    for stream, messages in red.xread({stream_key:last_id}, count=count):
+        entries += _decode(messages)
+    return entries
+
+def read_live_scan_range(red, first_id, count=None):
+    """
+    get entries of the live stream starting with first_id ('-' for the first entry)
+    """
+
+    return _decode(red.xrange(stream_key, min=first_id, count=count))
+
+def latest_live_scan(red):
+    """
+    get the last entry of the live stream as (id, fields), None if there is none
+    """
+
+    entries = _decode(red.xrevrange(stream_key, count=1))
+    if entries:
+        return entries[0]
+    return None
+
+def _decode(messages):
+    entries = []
+    for entry_id, fields in messages:
+        fields = {k.decode():v.decode() for k, v in fields.items()}
+        entries.append((entry_id.decode(), fields))
+    return entries
+
+def newer_id(id1, id2):
+    # return the later of two stream ids, None if both are unknown
+    if id1 is None:
+        return id2
+    if id2 is None:
+        return id1
+    if tuple(map(int, id1.split('-'))) >= tuple(map(int, id2.split('-'))):
+        return id1
+    return id2
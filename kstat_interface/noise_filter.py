@@ -0,0 +1,85 @@
+# Removal of AC noise (mains frequency and harmonics) from voltammetric data
+# Filter: bank of IIR notch filters at the mains frequency and its harmonics, combined into one cascade
+# of second-order sections and applied forward and backward (zero phase) in a single pass
+# designs are cached per sample rate, mains frequency, Q and harmonics; data can be a single scan or
+# a 2D array with one scan per row (e.g. all scans of a multi-scan CV)
+# StreamingNotchFilter applies the same filters causally to data arriving during a measurement
+
+from functools import lru_cache
+import numpy as np
+from scipy import signal
+from .sample_rates import frequency
+
+# harmonics of the mains frequency removed by default
+default_harmonics = (1, 2, 4, 5, 6)
+default_Q = 2.0
+
+@lru_cache(maxsize=64)
+def notch_bank(fs, f0, Q=default_Q, harmonics=default_harmonics):
+    """
+    second-order sections of the notch filters at f0*harmonic for sample rate fs [Hz]
+    harmonics at or above the Nyquist frequency are left out, None if none is left
+    """
+
+    sections = [signal.tf2sos(*signal.iirnotch(f0*h, Q, fs)) for h in harmonics if 0 < f0*h < fs/2]
+    if not sections:
+        return None
+    return np.concatenate(sections)
+
+def notch_filter(data, sample_rate, noise_freq, Q=default_Q, harmonics=default_harmonics):
+    """
+    data filtered along the last axis
+    sample_rate: name ("15KHz") or samples per second
+    """
+
+    fs = frequency(sample_rate) if isinstance(sample_rate, str) else float(sample_rate)
+    sos = notch_bank(fs, float(noise_freq), float(Q), tuple(harmonics))
+    data = np.asarray(data, dtype=np.float64)
+    if sos is None or data.shape[-1] < 2:
+        return data.copy()
+    # default padding of sosfiltfilt, shortened for short scans
+    padlen = min(3*(2*len(sos) + 1), data.shape[-1] - 1)
+    return signal.sosfiltfilt(sos, data, axis=-1, padlen=padlen)
+
+def notch_filter_scans(scans, sample_rate, noise_freq, Q=default_Q, harmonics=default_harmonics):
+    """
+    filter a list of scans, scans of the same length are filtered together as one 2D array
+    returns the filtered scans in the same order
+    """
+
+    scans = [np.asarray(scan, dtype=np.float64) for scan in scans]
+    filtered = [None]*len(scans)
+    lengths = {}
+    for i, scan in enumerate(scans):
+        lengths.setdefault(len(scan), []).append(i)
+    for indices in lengths.values():
+        batch = notch_filter(np.stack([scans[i] for i in indices]), sample_rate, noise_freq, Q, harmonics)
+        for row, i in enumerate(indices):
+            filtered[i] = batch[row]
+    return filtered
+
+class StreamingNotchFilter():
+    """
+    causal notch filter for data arriving in batches (live voltammogram during measurements)
+    the state of the second-order sections is kept between batches, so every batch costs the same
+    independent of the points received before; the saved scan is filtered with the zero-phase notch_filter
+    """
+
+    def __init__(self, sample_rate, noise_freq, Q=default_Q, harmonics=default_harmonics):
+        fs = frequency(sample_rate) if isinstance(sample_rate, str) else float(sample_rate)
+        self.noise_freq = float(noise_freq)
+        self.sos = notch_bank(fs, self.noise_freq, float(Q), tuple(harmonics))
+        self.zi = None
+
+    def reset(self):
+        self.zi = None
+
+    def __call__(self, batch):
+        batch = np.asarray(batch, dtype=np.float64)
+        if self.sos is None or len(batch) == 0:
+            return batch
+        if self.zi is None:
+            # steady state for the first value, so the filter doesn't start with a step
+            self.zi = signal.sosfilt_zi(self.sos)*batch[0]
+        filtered, self.zi = signal.sosfilt(self.sos, batch, zi=self.zi)
+        return filtered
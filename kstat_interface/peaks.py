@@ -0,0 +1,188 @@
+# Baseline and peak detection for voltammograms
+# baselines: iterative polynomial fit (same algorithm as peakutils.baseline) or asymmetric least squares
+# (Eilers & Boelens) solved as a banded system, peaks: local maxima above a threshold with a minimum
+# distance (scipy.signal.find_peaks), refined by a Gaussian fit of all peaks at once (weighted least
+# squares of the logarithm, Guo 2011) and snapped to the nearest data point of their own neighbourhood
+# all steps are vectorized, only the baseline iterations loop in Python
+
+import numpy as np
+from scipy import signal, linalg
+
+def polynomial_baseline(y, deg=3, max_it=100, tol=1e-3):
+    """
+    baseline by repeated polynomial fits of degree deg, points above the fit are lowered to it
+    until the coefficients change less than tol (relative)
+    """
+
+    y = np.array(y, dtype=np.float64)
+    order = int(deg) + 1
+    # too few points for a fit (e.g. a scan cancelled right after the start)
+    if len(y) < order:
+        return y
+    # x scaled like peakutils to avoid numerical issues, so results are the same
+    cond = np.abs(y).max()**(1./order)
+    if cond == 0:
+        return np.zeros_like(y)
+    vander = np.vander(np.linspace(0., cond, len(y)), order)
+    # least squares by QR, the projection is reused in every iteration
+    q, r = np.linalg.qr(vander)
+    coeffs = np.ones(order)
+    base = y.copy()
+    for i in range(max_it):
+        coeffs_new = linalg.solve_triangular(r, q.T @ y)
+        if np.linalg.norm(coeffs_new - coeffs)/np.linalg.norm(coeffs) < tol:
+            break
+        coeffs = coeffs_new
+        base = vander @ coeffs
+        np.minimum(y, base, out=y)
+    return base
+
+def als_baseline(y, lam=1e5, p=0.01, n_iter=10):
+    """
+    asymmetric least squares baseline: smoothness lam (second differences), points above the
+    baseline are weighted with p, points below with 1 - p
+    """
+
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n < 3:
+        return y.copy()
+    # lam*D'D of the second difference matrix D in upper banded form (pentadiagonal, symmetric):
+    # every row of D (1, -2, 1 at columns r, r+1, r+2) adds its products to the diagonals
+    d = np.array([1., -2., 1.])
+    bands = np.zeros((3, n))
+    for k in range(3):
+        for a in range(3 - k):
+            bands[2 - k, a + k:a + k + n - 2] += lam*d[a]*d[a + k]
+    weights = np.ones(n)
+    for i in range(n_iter):
+        system = bands.copy()
+        system[2] += weights
+        z = linalg.solveh_banded(system, weights*y, check_finite=False)
+        new_weights = np.where(y > z, p, 1 - p)
+        if np.array_equal(new_weights, weights):
+            break
+        weights = new_weights
+    return z
+
+def baseline(y, method='polynomial', **parameters):
+    # baseline by method name ('polynomial' or 'als')
+    if method == 'als':
+        return als_baseline(y, **parameters)
+    return polynomial_baseline(y, **parameters)
+
+def find_peaks(y, threshold, min_dist=1):
+    """
+    indices of local maxima higher than threshold, of peaks closer than min_dist points
+    only the highest is kept
+    """
+
+    indices, properties = signal.find_peaks(np.asarray(y, dtype=np.float64), height=threshold,
+                                            distance=max(int(min_dist), 0) + 1)
+    return indices
+
+def windows(n, peaks, width):
+    # indices of the neighbourhood (width points on both sides) of every peak, clipped to the data
+    # and a mask of the indices inside the data
+    index = np.asarray(peaks)[:, None] + np.arange(-width, width + 1)
+    inside = (index >= 0) & (index < n)
+    return np.clip(index, 0, n - 1), inside
+
+def refine_peaks(x, y, peaks, width):
+    """
+    positions (x) of the peaks from a Gaussian fitted to width points on both sides of each peak
+    the x value of the peak is kept if the fit fails
+    """
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    peaks = np.asarray(peaks, dtype=np.int64)
+    if len(peaks) == 0:
+        return np.zeros(0)
+    width = max(int(width), 1)
+    index, inside = windows(len(x), peaks, width)
+    x0 = x[peaks]
+    # x relative to the peak and scaled to [-1, 1] for the conditioning of the fit
+    dx = x[index] - x0[:, None]
+    scale = np.abs(np.where(inside, dx, 0)).max(axis=1)
+    scale[scale == 0] = 1
+    u = dx/scale[:, None]
+    values = y[index]
+    # ln(y) = a + b*u + c*u^2 weighted with y^2, points <= 0 are left out
+    used = inside & (values > 0)
+    w = np.where(used, values**2, 0)
+    log_values = np.log(np.where(used, values, 1))
+    terms = np.stack([np.ones_like(u), u, u**2], axis=2)
+    normal = np.einsum('pi,pij,pik->pjk', w, terms, terms)
+    rhs = np.einsum('pi,pij,pi->pj', w, terms, log_values)
+    solvable = np.abs(np.linalg.det(normal)) > 1e-12*np.abs(normal).max(axis=(1, 2))**3
+    normal[~solvable] = np.eye(3)
+    a, b, c = np.linalg.solve(normal, rhs[..., None])[..., 0].T
+    with np.errstate(divide='ignore', invalid='ignore'):
+        center = -b/(2*c)
+    # only maxima inside the neighbourhood are used
+    valid = solvable & (c < 0) & np.isfinite(center) & (np.abs(center) <= 1)
+    return np.where(valid, x0 + center*scale, x0)
+
+def snap(x, peaks, positions, width):
+    """
+    indices of the data points closest to the refined positions, searched in the neighbourhood of each
+    peak only, so peaks of a backward sweep aren't moved to the forward sweep of a cyclic voltammogram
+    """
+
+    x = np.asarray(x, dtype=np.float64)
+    peaks = np.asarray(peaks, dtype=np.int64)
+    if len(peaks) == 0:
+        return peaks
+    width = max(int(width), 1)
+    index, inside = windows(len(x), peaks, width)
+    # sweeps are monotonic around a peak: row-wise searchsorted in the ascending direction
+    direction = np.where(x[index[:, -1]] >= x[index[:, 0]], 1., -1.)
+    before = np.arange(2*width + 1) < width
+    window_x = np.where(inside, x[index]*direction[:, None], np.where(before, -np.inf, np.inf))
+    target = (np.asarray(positions)*direction)[:, None]
+    right = np.minimum((window_x < target).sum(axis=1), 2*width)
+    left = np.maximum(right - 1, 0)
+    rows = np.arange(len(peaks))
+    nearer_left = np.abs(window_x[rows, left] - target[:, 0]) <= np.abs(window_x[rows, right] - target[:, 0])
+    return index[rows, np.where(nearer_left, left, right)]
+
+def analyze(x, y, threshold, min_dist, width, base=None):
+    """
+    peak detection of y above a baseline (y with the peaks positive)
+    returns the indices and heights (baseline removed) of the peaks
+    """
+
+    y = np.asarray(y, dtype=np.float64)
+    corrected = y - base if base is not None else y
+    peaks = find_peaks(corrected, threshold, min_dist)
+    positions = refine_peaks(x, corrected, peaks, width)
+    indices = snap(x, peaks, positions, width)
+    return indices, corrected[indices]
+
+def detect(x, y, settings, get_baseline=None):
+    """
+    peak detection with the settings of the interface: baseline_polynomial, peak_threshold [A],
+    peak_distance and peak_width [mV], y as measured (reduction peaks are detected if the mean is negative)
+    get_baseline(y_scaled, scale_factor): returns the baseline (e.g. cached), polynomial_baseline by default
+    returns the indices and heights of the peaks, the baseline and the scale factor (1 or -1) of y
+    """
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if len(x) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0), 1
+    mv_step = abs(x[0] - x[min(9, len(x) - 1)])/10
+    if mv_step == 0:
+        mv_step = 1
+    peak_dist = int(settings['peak_distance']/mv_step)
+    peak_width = int(settings['peak_width']/mv_step)
+    # positive or negative current
+    scale_factor = -1 if np.mean(y) < 0 else 1
+    y_scaled = y*scale_factor
+    if get_baseline is None:
+        base = polynomial_baseline(y_scaled, settings['baseline_polynomial'])
+    else:
+        base = get_baseline(y_scaled, scale_factor)
+    indices, heights = analyze(x, y_scaled, settings['peak_threshold'], peak_dist, peak_width, base)
+    return indices, heights, base, scale_factor
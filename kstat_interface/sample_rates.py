@@ -0,0 +1,26 @@
+# ADC sample rates of the KStat, used by the driver (ADS1255 data rate codes), the noise filter
+# and the virtual KStat, so all of them agree on the rate of a scan
+# name used in the interface and parameter files: (ADS1255 data rate code, samples per second)
+
+sample_rates = {"2.5Hz":("3", 2.5), "5Hz":("13", 5.0), "10Hz":("23", 10.0), "15Hz":("33", 15.0),
+                "25Hz":("43", 25.0), "30Hz":("53", 30.0), "50Hz":("63", 50.0), "60Hz":("72", 60.0),
+                "100Hz":("82", 100.0), "500Hz":("92", 500.0), "1KHz":("A1", 1000.0), "2KHz":("B0", 2000.0),
+                "3.75KHz":("C0", 3750.0), "7.5KHz":("D0", 7500.0), "15KHz":("E0", 15000.0),
+                # the ADC is set to 15 kSPS for 30KHz as well
+                "30KHz":("E0", 15000.0)}
+
+# names written by older versions of the interface
+aliases = {"3.75Hz":"3.75KHz"}
+
+def adc_code(name):
+    return sample_rates[aliases.get(name, name)][0]
+
+def frequency(name):
+    # samples per second of a sample rate name
+    return sample_rates[aliases.get(name, name)][1]
+
+def code_frequency(code):
+    # samples per second of an ADS1255 data rate code (as sent by setupADC)
+    rates = {c.upper().zfill(2):f for c, f in sample_rates.values()}
+    rates['F0'] = 30000.0
+    return rates.get(code.upper().zfill(2))
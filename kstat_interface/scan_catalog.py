@@ -0,0 +1,297 @@
+# Catalog of all scans and directories in the data directory (SQLite)
+# every scan is indexed with its technique, parameters (from -parameters.txt), timestamp,
+# number of data points and saved peaks, so listing, filtering and searching scans
+# doesn't walk the file system or parse parameter files
+# the catalog is updated when scans are saved, uploaded or deleted and brought up to date
+# incrementally at startup (only new or modified scans are indexed again)
+# results of the batch peak analysis are kept with a signature of the scan files and settings
+
+import os, json, sqlite3
+from glob import glob
+from contextlib import contextmanager
+import numpy as np
+from . import scan_store
+
+catalog_file = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scan_catalog.sqlite')
+
+schema = """
+CREATE TABLE IF NOT EXISTS scans (
+    base TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    directory TEXT NOT NULL,
+    name TEXT NOT NULL,
+    technique TEXT,
+    header TEXT,
+    parameters TEXT,
+    comment TEXT,
+    timestamp REAL,
+    n_points INTEGER,
+    peaks TEXT,
+    modified REAL);
+CREATE INDEX IF NOT EXISTS scans_directory ON scans (directory, name);
+CREATE INDEX IF NOT EXISTS scans_technique ON scans (technique, timestamp);
+CREATE TABLE IF NOT EXISTS directories (
+    path TEXT PRIMARY KEY,
+    parent TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS directories_parent ON directories (parent);
+CREATE TABLE IF NOT EXISTS peak_analyses (
+    base TEXT PRIMARY KEY,
+    signature TEXT NOT NULL,
+    peaks TEXT);
+"""
+
+# first line of the parameter files written by the KStat driver
+techniques = {'Cyclic Voltammetry Experiment':'Cyclic Voltammetry',
+              'Linear Sweep Voltammetry Experiment':'Linear Sweep Voltammetry',
+              'Squarewave Voltammetry Experiment':'Squarewave Voltammetry',
+              'Differential Pulse Voltammetry Experiment':'Differential Pulse Voltammetry'}
+
+def connect(file=None):
+    connection = sqlite3.connect(file or catalog_file, timeout=10)
+    connection.row_factory = sqlite3.Row
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.executescript(schema)
+    return connection
+
+@contextmanager
+def transaction(file=None):
+    # connection committed at the end of the block (rolled back on errors) and closed
+    connection = connect(file)
+    try:
+        with connection:
+            yield connection
+    finally:
+        connection.close()
+
+def like_prefix(directory):
+    # LIKE pattern for all paths in a directory
+    return folder(directory).replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+def folder(path):
+    # directories are stored with a trailing slash like root.working_directory
+    return path.rstrip('/') + '/'
+
+def parse_parameters(file):
+    """
+    read a -parameters.txt file
+    returns the first line and {name:[value, unit]} for every 'name = value unit' line
+    """
+
+    with open(file, 'r') as f:
+        header = f.readline().strip()
+        parameters = {}
+        for line in f:
+            if '=' not in line:
+                continue
+            name, value = line.split('=', 1)
+            name = name.strip()
+            value = value.split()
+            if name in ('Comment', 'Localtime', 'UTC'):
+                parameters[name] = [' '.join(value), None]
+            else:
+                parameters[name] = [value[0] if value else '', value[1] if len(value) > 1 else None]
+    return header, parameters
+
+def count_points(path):
+    # number of data points without reading the data
+    if path.endswith(scan_store.extension):
+        files = glob(os.path.join(path, '*.npy'))
+        return np.load(files[0], mmap_mode='r').shape[0] if files else 0
+    with open(path, 'rb') as f:
+        return max(sum(1 for line in f) - 1, 0)
+
+def modified(path):
+    # latest modification of the scan or its parameter and peak files
+    base = scan_store.scan_base(path)
+    files = [path, scan_store.parameters_file(path), base + '-peaks.txt']
+    times = [os.path.getmtime(file) for file in files if os.path.exists(file)]
+    return max(times) if times else 0
+
+def read_peaks(base):
+    if os.path.exists(base + '-peaks.txt'):
+        with open(base + '-peaks.txt', 'r') as f:
+            return f.read()
+    return None
+
+def scan_entry(path):
+    base = scan_store.scan_base(path)
+    parameters_file = scan_store.parameters_file(path)
+    header, parameters = parse_parameters(parameters_file)
+    try:
+        timestamp = float(parameters['Timestamp'][0])
+    except (KeyError, ValueError):
+        timestamp = os.path.getmtime(parameters_file)
+    return {'base':base, 'path':path.rstrip('/'), 'directory':folder(os.path.dirname(base)),
+            'name':os.path.basename(base), 'technique':techniques.get(header, header), 'header':header,
+            'parameters':json.dumps(parameters), 'comment':parameters.get('Comment', [''])[0],
+            'timestamp':timestamp, 'n_points':count_points(path.rstrip('/')), 'peaks':read_peaks(base),
+            'modified':modified(path.rstrip('/'))}
+
+def _index(connection, path):
+    entry = scan_entry(path)
+    connection.execute('INSERT OR REPLACE INTO scans VALUES (:base, :path, :directory, :name, :technique, :header,'
+                       ' :parameters, :comment, :timestamp, :n_points, :peaks, :modified)', entry)
+    connection.execute('INSERT OR IGNORE INTO directories VALUES (?, ?)',
+                       (entry['directory'], folder(os.path.dirname(entry['directory'].rstrip('/')))))
+
+def index_scan(path, file=None):
+    """
+    add or update a scan (path of the .scan directory or csv file)
+    """
+
+    with transaction(file) as connection:
+        _index(connection, path)
+
+def remove_scan(path, file=None):
+    with transaction(file) as connection:
+        connection.execute('DELETE FROM scans WHERE base = ?', (scan_store.scan_base(path),))
+        connection.execute('DELETE FROM peak_analyses WHERE base = ?', (scan_store.scan_base(path),))
+
+def update_peaks(path, file=None):
+    # peaks were saved (path of the scan or its -peaks.txt file)
+    base = scan_store.scan_base(path)
+    if base.endswith('-peaks.txt'):
+        base = base[:-len('-peaks.txt')]
+    with transaction(file) as connection:
+        row = connection.execute('SELECT path FROM scans WHERE base = ?', (base,)).fetchone()
+        if row is not None:
+            connection.execute('UPDATE scans SET peaks = ?, modified = ? WHERE base = ?',
+                               (read_peaks(base), modified(row['path']), base))
+
+def add_directory(directory, file=None):
+    with transaction(file) as connection:
+        connection.execute('INSERT OR IGNORE INTO directories VALUES (?, ?)',
+                           (folder(directory), folder(os.path.dirname(directory.rstrip('/')))))
+
+def remove_directory(directory, file=None):
+    # the directory with all subdirectories and scans
+    pattern = like_prefix(directory)
+    with transaction(file) as connection:
+        connection.execute("DELETE FROM scans WHERE directory LIKE ? ESCAPE '\\'", (pattern,))
+        connection.execute("DELETE FROM directories WHERE path LIKE ? ESCAPE '\\'", (pattern,))
+
+def list_scans(directory, file=None):
+    """
+    paths of all scans in a directory, sorted by name
+    """
+
+    with transaction(file) as connection:
+        rows = connection.execute('SELECT path FROM scans WHERE directory = ? ORDER BY name', (folder(directory),))
+        return [row['path'] for row in rows]
+
+def list_directories(directory, file=None):
+    # subdirectories of a directory
+    with transaction(file) as connection:
+        rows = connection.execute('SELECT path FROM directories WHERE parent = ? AND path != ? ORDER BY path',
+                                  (folder(directory), folder(directory)))
+        return [row['path'] for row in rows]
+
+def get_scan(path, file=None):
+    """
+    catalog entry of a scan with the parameters as dictionary, the scan is indexed if it is missing
+    """
+
+    base = scan_store.scan_base(path)
+    with transaction(file) as connection:
+        row = connection.execute('SELECT * FROM scans WHERE base = ?', (base,)).fetchone()
+        if row is None:
+            _index(connection, path)
+            row = connection.execute('SELECT * FROM scans WHERE base = ?', (base,)).fetchone()
+    entry = dict(row)
+    entry['parameters'] = json.loads(entry['parameters'])
+    return entry
+
+def search(directory=None, recursive=False, technique=None, text=None, since=None, until=None, file=None):
+    """
+    catalog entries matching all given filters, newest first
+    text is searched in the name and comment of the scans
+    """
+
+    conditions, values = [], []
+    if directory is not None:
+        if recursive:
+            conditions.append("directory LIKE ? ESCAPE '\\'")
+            values.append(like_prefix(directory))
+        else:
+            conditions.append('directory = ?')
+            values.append(folder(directory))
+    if technique is not None:
+        conditions.append('technique = ?')
+        values.append(technique)
+    if text:
+        conditions.append('(name LIKE ? OR comment LIKE ?)')
+        values += ['%' + text + '%']*2
+    if since is not None:
+        conditions.append('timestamp >= ?')
+        values.append(since)
+    if until is not None:
+        conditions.append('timestamp <= ?')
+        values.append(until)
+    query = 'SELECT * FROM scans'
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    with transaction(file) as connection:
+        rows = connection.execute(query + ' ORDER BY timestamp DESC', values).fetchall()
+    entries = [dict(row) for row in rows]
+    for entry in entries:
+        entry['parameters'] = json.loads(entry['parameters'])
+    return entries
+
+def rebuild(data_directory, file=None):
+    """
+    bring the catalog up to date with the data directory:
+    new and modified scans are indexed, missing scans and directories are removed
+    returns the number of indexed and removed scans
+    """
+
+    data_directory = folder(data_directory)
+    with transaction(file) as connection:
+        known = {row['path']:row['modified'] for row in connection.execute('SELECT path, modified FROM scans')}
+        directories = set()
+        found = set()
+        indexed = 0
+        for current, subfolders, files in os.walk(data_directory):
+            subfolders[:] = [s for s in subfolders if not s.endswith(scan_store.extension)]
+            directories.add(folder(current))
+            for path in scan_store.list_scans(current):
+                path = path.rstrip('/')
+                found.add(path)
+                if known.get(path) != modified(path):
+                    try:
+                        _index(connection, path)
+                        indexed += 1
+                    except Exception as e:
+                        print("Couldn't index scan", path, e)
+        removed = [path for path in known if path not in found and path.startswith(data_directory)]
+        connection.executemany('DELETE FROM scans WHERE path = ?', [(path,) for path in removed])
+        missing = [row['path'] for row in connection.execute('SELECT path FROM directories')
+                   if row['path'].startswith(data_directory) and row['path'] not in directories]
+        connection.executemany('DELETE FROM directories WHERE path = ?', [(path,) for path in missing])
+        connection.executemany('INSERT OR IGNORE INTO directories VALUES (?, ?)',
+                               [(d, folder(os.path.dirname(d.rstrip('/')))) for d in directories])
+    return indexed, len(removed)
+
+def read_analyses(bases, file=None):
+    """
+    saved batch peak analyses of scans (by base), {base:(signature, peaks as json)}
+    """
+
+    bases = list(bases)
+    analyses = {}
+    with transaction(file) as connection:
+        # in chunks below the SQLite limit of variables
+        for i in range(0, len(bases), 500):
+            chunk = bases[i:i + 500]
+            rows = connection.execute('SELECT * FROM peak_analyses WHERE base IN ({})'.format(','.join('?'*len(chunk))), chunk)
+            analyses.update({row['base']:(row['signature'], row['peaks']) for row in rows})
+    return analyses
+
+def save_analyses(analyses, file=None):
+    # [(base, signature, peaks as json)]
+    with transaction(file) as connection:
+        connection.executemany('INSERT OR REPLACE INTO peak_analyses VALUES (?, ?, ?)', analyses)
+
+def delete_scan(path, file=None):
+    # delete the files of a scan and its catalog entry
+    scan_store.delete_scan(path)
+    remove_scan(path, file)
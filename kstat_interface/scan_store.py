@@ -0,0 +1,246 @@
+# Binary columnar storage of scans
+# a scan <name> is stored as directory <name>.scan with one numpy file (.npy) per column
+# (potential, current, ...), next to <name>-parameters.txt written by the KStat driver
+# columns are read memory mapped, so plotting doesn't parse text, additional columns can be
+# added as new files without rewriting the scan (derived data of the interface are kept in derived_cache)
+# csv files are only generated for downloads; csv files of older versions or uploads are
+# still listed and are converted to the binary format when they are opened
+# measurements are stored as raw KStat codes (raw_potential, raw_current, ...) with their conversion
+# metadata (conversion.json), they are converted to mV and A when read (see calibration.py)
+
+import os, re, shutil, json
+from glob import glob
+from zipfile import ZipFile
+import numpy as np
+import pandas as pd
+from . import calibration
+
+extension = '.scan'
+# columns written by the KStat driver, listed before derived columns
+measured_columns = ['potential', 'current', 'forwardcurrent', 'backwardcurrent', 'fbcurrent']
+raw_prefix = 'raw_'
+conversion_file = 'conversion.json'
+
+def scan_base(path):
+    """
+    path of a scan without extension, e.g. for the -parameters.txt and -peaks.txt files
+    """
+
+    path = path.rstrip('/')
+    for ext in (extension, '.csv'):
+        if path.endswith(ext):
+            return path[:-len(ext)]
+    return path
+
+def parameters_file(path):
+    """
+    -parameters.txt file of a scan, the scans of a measurement with several scans (<name>-scanN)
+    share the parameters of the measurement (<name>-parameters.txt)
+    """
+
+    base = scan_base(path)
+    file = base + '-parameters.txt'
+    measurement = re.match(r'(.*)-scan\d+$', base)
+    if not os.path.exists(file) and measurement and os.path.exists(measurement.group(1) + '-parameters.txt'):
+        return measurement.group(1) + '-parameters.txt'
+    return file
+
+def scan_name(path):
+    return os.path.basename(scan_base(path))
+
+def is_scan(path):
+    path = path.rstrip('/')
+    if path.endswith(extension):
+        return os.path.isdir(path)
+    # csv files are scans if the driver wrote parameters for them (e.g. not peak or evaluation tables)
+    return path.endswith('.csv') and os.path.exists(parameters_file(path))
+
+class Scan():
+    """
+    columns of a stored scan, scan['current'] returns a read-only memory mapped array
+    columns stored as raw codes are converted on first access and kept in memory
+    """
+
+    def __init__(self, path):
+        self.path = path.rstrip('/')
+        self._converted = {}
+        self._metadata = None
+
+    def _file(self, column):
+        return os.path.join(self.path, column + '.npy')
+
+    @property
+    def metadata(self):
+        # conversion metadata of scans stored as raw codes, None for scans stored as floats
+        if self._metadata is None and os.path.exists(os.path.join(self.path, conversion_file)):
+            with open(os.path.join(self.path, conversion_file)) as f:
+                self._metadata = json.load(f)
+        return self._metadata
+
+    @property
+    def columns(self):
+        names = [os.path.basename(f)[:-4] for f in glob(os.path.join(self.path, '*.npy'))]
+        names = [name[len(raw_prefix):] if name.startswith(raw_prefix) else name for name in names]
+        names += [name for name, parts in calibration.derived_columns.items()
+                  if all(part in names for part in parts)]
+        measured = [name for name in measured_columns if name in names]
+        return measured + sorted(set(name for name in names if name not in measured_columns))
+
+    def __contains__(self, column):
+        if os.path.exists(self._file(column)) or os.path.exists(self._file(raw_prefix + column)):
+            return True
+        return column in calibration.derived_columns and all(part in self for part in calibration.derived_columns[column])
+
+    def __getitem__(self, column):
+        if os.path.exists(self._file(column)):
+            return np.load(self._file(column), mmap_mode='r')
+        if column not in self._converted:
+            if os.path.exists(self._file(raw_prefix + column)):
+                codes = np.load(self._file(raw_prefix + column), mmap_mode='r')
+                self._converted[column] = calibration.convert(column, codes, self.metadata)
+            elif column in calibration.derived_columns and column in self:
+                forward, backward = calibration.derived_columns[column]
+                self._converted[column] = self[forward] - self[backward]
+            else:
+                raise KeyError(column)
+        return self._converted[column]
+
+    def __len__(self):
+        columns = self.columns
+        return len(self[columns[0]]) if columns else 0
+
+    def add_column(self, column, values):
+        # the file is written under a temporary name, so readers never see a partial column
+        tmp = os.path.join(self.path, '.' + column + '.npy')
+        np.save(tmp, np.ascontiguousarray(values))
+        os.replace(tmp, self._file(column))
+
+    def to_dataframe(self):
+        return pd.DataFrame({column:self[column] for column in self.columns})
+
+    def to_csv(self, target):
+        self.to_dataframe().to_csv(target, index=False)
+
+def write_scan(base, columns, metadata=None):
+    """
+    store columns {name:array} as scan base.scan, an existing scan of that name is replaced
+    raw columns (raw_<name>) are stored with their conversion metadata
+    returns the path of the scan
+    """
+
+    path = base + extension
+    tmp = base + '.tmp' + extension
+    if os.path.exists(tmp):
+        shutil.rmtree(tmp)
+    os.makedirs(tmp)
+    for column, values in columns.items():
+        np.save(os.path.join(tmp, column + '.npy'), np.ascontiguousarray(values))
+    if metadata is not None:
+        with open(os.path.join(tmp, conversion_file), 'w') as f:
+            json.dump(metadata, f)
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(tmp, path)
+    return path
+
+def import_csv(file):
+    # convert a csv scan to the binary format, returns the path of the scan
+    df = pd.read_csv(file)
+    return write_scan(scan_base(file), {column:df[column].values for column in df.columns})
+
+def open_scan(path):
+    """
+    open a scan by the path of its .scan directory or csv file (converted on first access)
+    """
+
+    base = scan_base(path)
+    if not os.path.isdir(base + extension):
+        if not os.path.exists(base + '.csv'):
+            raise FileNotFoundError(path)
+        import_csv(base + '.csv')
+    return Scan(base + extension)
+
+def list_scans(directory):
+    """
+    paths of all scans in a directory, csv files are only listed if they weren't converted yet
+    """
+
+    scans = [path for path in glob(os.path.join(directory, '*' + extension)) if is_scan(path)]
+    bases = {scan_base(path) for path in scans}
+    for file in glob(os.path.join(directory, '*.csv')):
+        if scan_base(file) not in bases and is_scan(file):
+            scans.append(file)
+    return scans
+
+def list_directories(directory):
+    # subdirectories except the scans
+    return [d for d in glob(os.path.join(directory, '*/')) if not d.rstrip('/').endswith(extension)]
+
+def scan_files(path):
+    # all files belonging to a scan besides its data
+    base = scan_base(path)
+    return [base + suffix for suffix in ('-parameters.txt', '-peaks.txt', '.png')]
+
+def delete_scan(path):
+    base = scan_base(path)
+    if os.path.isdir(base + extension):
+        shutil.rmtree(base + extension)
+    for file in [base + '.csv'] + scan_files(path):
+        if os.path.exists(file):
+            os.remove(file)
+
+def add_to_zip(zip_file, path, folder=''):
+    # add a scan as csv with its parameters, peaks and plot to an open ZipFile
+    name = scan_name(path)
+    zip_file.writestr(os.path.join(folder, name + '.csv'), open_scan(path).to_dataframe().to_csv(index=False))
+    for file in scan_files(path):
+        if os.path.exists(file):
+            zip_file.write(file, os.path.join(folder, os.path.basename(file)))
+
+def archive_directory(directory, target):
+    """
+    zip a directory with all subdirectories, scans are exported as csv
+    """
+
+    directory = directory.rstrip('/')
+    with ZipFile(target, 'w') as zip_file:
+        for folder, subfolders, files in os.walk(directory):
+            relative = os.path.relpath(folder, directory)
+            relative = '' if relative == '.' else relative
+            scans = [os.path.join(folder, s) for s in subfolders if s.endswith(extension)]
+            # scans are not walked as directories
+            subfolders[:] = [s for s in subfolders if not s.endswith(extension)]
+            added = set()
+            for scan in scans:
+                add_to_zip(zip_file, scan, relative)
+                added.update([scan_base(scan) + '.csv'] + scan_files(scan))
+            for file in files:
+                path = os.path.join(folder, file)
+                if path not in added:
+                    zip_file.write(path, os.path.join(relative, file))
+
+def reprocess(directory, new_calibration):
+    """
+    apply new calibration constants to all scans stored as raw codes in a directory and its subdirectories
+    only the metadata are rewritten, derived columns calculated with the old values are removed
+    returns the number of reprocessed scans
+    """
+
+    n = 0
+    for folder, subfolders, files in os.walk(directory):
+        for scan in [os.path.join(folder, s) for s in subfolders if s.endswith(extension)]:
+            metadata_file = os.path.join(scan, conversion_file)
+            if not os.path.exists(metadata_file):
+                continue
+            with open(metadata_file) as f:
+                metadata = json.load(f)
+            metadata['calibration'] = new_calibration
+            with open(metadata_file + '.tmp', 'w') as f:
+                json.dump(metadata, f)
+            os.replace(metadata_file + '.tmp', metadata_file)
+            for file in glob(os.path.join(scan, '*.npy')):
+                if not os.path.basename(file).startswith(raw_prefix):
+                    os.remove(file)
+            n += 1
+        subfolders[:] = [s for s in subfolders if not s.endswith(extension)]
+    return n
@@ -0,0 +1,104 @@
+# Progress and status of running programs (progress bars and their labels)
+# the status changes often and is only of interest while it is displayed, so it is sent through
+# the redis channel status instead of the config, which is saved to the SD card by redis
+# messages are json objects with the changed fields only:
+#   p  = scan progress [%]      l  = scan progress label
+#   s  = series progress [%]    sl = series progress label
+
+import json
+from time import time
+from threading import Lock, Timer
+
+status_channel = 'status'
+status_fields = {'scan_progress':'p', 'scan_progress_label':'l',
+                 'series_progress':'s', 'series_progress_label':'sl'}
+initial_status = {'p':0, 'l':'', 's':0, 'sl':''}
+
+class StatusPublisher():
+    """
+    publishes status changes, progress values are rounded to resolution percent and
+    sent at most every interval seconds unless they reach 0 or 100 %, deferred changes are sent
+    by a timer after the interval if no other change sends them
+    the complete status is repeated every refresh seconds for newly started subscribers
+    """
+
+    def __init__(self, red, interval=0.1, resolution=1, refresh=5):
+        self.red = red
+        self.interval = interval
+        self.resolution = resolution
+        self.refresh = refresh
+        # unknown until set, so the first value is always sent
+        self.status = dict.fromkeys(initial_status)
+        self.pending = {}
+        self.last_sent = 0
+        self.last_refresh = 0
+        self.timer = None
+        self.lock = Lock()
+
+    def set(self, **fields):
+        """
+        set status fields, e.g. set(scan_progress=50, scan_progress_label='Scan')
+        """
+
+        with self.lock:
+            changes = {}
+            for name, value in fields.items():
+                key = status_fields[name]
+                if key in ('p', 's'):
+                    value = min(max(round(value/self.resolution)*self.resolution, 0), 100)
+                if value != self.status[key]:
+                    changes[key] = value
+            if not changes:
+                return
+            self.status.update(changes)
+            now = time()
+            labels = 'l' in changes or 'sl' in changes
+            bounds = any(changes.get(k) in (0, 100) for k in ('p', 's'))
+            self.pending.update(changes)
+            if not labels and not bounds and now - self.last_sent < self.interval:
+                if self.timer is None:
+                    self.timer = Timer(self.interval - (now - self.last_sent), self.flush)
+                    self.timer.daemon = True
+                    self.timer.start()
+                return
+            self.publish(now)
+
+    def flush(self):
+        # sends the deferred changes
+        with self.lock:
+            self.timer = None
+            if self.pending:
+                try:
+                    self.publish(time())
+                except Exception as e:
+                    print("Couldn't send status.", e)
+
+    def publish(self, now):
+        changes = self.pending
+        if now - self.last_refresh >= self.refresh:
+            changes = {k:v for k, v in self.status.items() if v is not None}
+            self.last_refresh = now
+        self.red.publish(status_channel, json.dumps(changes, separators=(',', ':')))
+        self.pending = {}
+        self.last_sent = now
+
+class StatusListener():
+    """
+    subscription to the status channel, keeps the current status
+    seq counts the received changes so readers can tell if the status changed
+    """
+
+    def __init__(self, red):
+        self.pubsub = red.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.subscribe(status_channel)
+        self.status = dict(initial_status)
+        self.seq = 0
+
+    def listen(self, on_change=None):
+        # on_change() is called after every received change
+        for message in self.pubsub.listen():
+            if message['type'] == 'message':
+                self.status.update(json.loads(message['data']))
+                self.seq += 1
+                if on_change is not None:
+                    on_change()